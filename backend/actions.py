@@ -0,0 +1,947 @@
+# backend/actions.py
+# 所有 client 可呼叫的 action；以 @action 註冊到 dispatcher 的查表
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from psycopg import Connection
+
+from analytics import log_search, top_keywords
+from db import use_conn, after_commit, pool_stats, run_in_savepoint
+from dispatcher import action, dispatch, metrics_snapshot
+from event_actors import event_actors
+from lifecycle import scheduler
+from match_worker import match_worker
+from recommend import recommender
+from search_cache import search_cache
+from search_index import search_index
+from sessions import sessions
+from signup_batch import signup_batcher
+from staffing import staff_events
+from volunteer import (
+    register_user,
+    search_tasks,
+    search_facets,
+    join_task,
+    join_task_batch,
+    cancel_participation,
+    cancel_participation_batch,
+    get_waitlist_position,
+    get_user_history,
+    get_user_roles,
+    users_with_role,
+    list_users_with_roles,
+    stream_users_with_roles,
+    count_users,
+    add_role,
+    remove_role,
+    create_skill,
+    set_user_skill,
+    update_user_profile,
+    get_event_participants,
+    stream_event_participants,
+    get_venue_bookings,
+    is_venue_available,
+    get_user_active_participation,
+)
+from organizer import (
+    create_org,
+    create_venue,
+    create_event,
+    set_event_periods,
+    set_required_skills,
+    list_my_events,
+    list_venues,
+    list_skills,
+    get_or_create_default_org,
+    list_all_events_with_counts,
+    stream_all_events_with_counts,
+)
+
+REGISTRATION_ROLES = {"Volunteer", "Organizer"}
+MAX_BATCH_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_RECOMMENDATIONS = 100
+MAX_ROSTER_SIZE = 1000
+# 可分頁/串流的列表 action 共用的參數
+PAGING_PARAMS = {
+    "after_id": (int, None),
+    "limit": (int, None),
+    "stream": (bool, False),
+}
+
+
+def serialize(obj: Any) -> Any:
+    """把 date/datetime 轉成字串，方便丟回給 client"""
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    if isinstance(obj, dict):
+        return {k: serialize(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [serialize(v) for v in obj]
+    return obj
+
+
+def login_user(user_name: str, password: str, conn: Optional[Connection] = None):
+    """
+    用 user_name + password 登入：
+    回傳 (user_id, roles)；找不到就回傳 None
+    """
+    sql = 'SELECT user_id FROM "USER" WHERE user_name = %s AND password = %s'
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (user_name, password))
+            row = cur.fetchone()
+        if row:
+            user_id = row[0]
+            roles = get_user_roles(user_id, conn=conn)
+            return user_id, roles
+    return None
+
+
+def _list_response(
+    ctx,
+    p: Dict,
+    fetch_page: Callable[[Optional[int], Optional[int]], List[Dict]],
+    fetch_stream: Callable[[Optional[int]], Iterable[List[Dict]]],
+    id_key: str,
+) -> Dict:
+    """
+    列表 action 共用的分頁/串流邏輯：
+      - 有 limit：回傳一頁，next_after_id 為下一頁要帶的 after_id（沒有下一頁為 None）
+      - stream=True：以 server-side cursor 邊讀邊送，每批一個 {"more": true} 的 response，
+        最後以 {"more": false, "count": 總筆數} 結尾
+      - 都沒給：照舊回傳全部
+    """
+    if p["stream"]:
+        if ctx.emit is None:
+            return {"status": "error", "message": "此請求無法使用串流模式"}
+        count = 0
+        for chunk in fetch_stream(p["after_id"]):
+            count += len(chunk)
+            ctx.emit({"status": "ok", "data": serialize(chunk), "more": True})
+        return {"status": "ok", "data": [], "more": False, "count": count}
+
+    limit = p["limit"]
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = fetch_page(p["after_id"], limit)
+    resp = {"status": "ok", "data": serialize(rows)}
+    if limit is not None:
+        resp["next_after_id"] = rows[-1][id_key] if len(rows) == limit else None
+    return resp
+
+
+def _resolve_refs(value: Any, results: List[Dict]) -> Any:
+    """
+    批次內引用前面子請求的結果：{"$ref": "0.event_id"} 會換成
+    第 0 筆回應 data 裡的 event_id（例如先 create_event 再設定時間/技能）
+    """
+    if isinstance(value, dict):
+        if set(value) == {"$ref"}:
+            ref = str(value["$ref"])
+            index_str, _, field = ref.partition(".")
+            try:
+                resp = results[int(index_str)]
+            except (ValueError, IndexError):
+                raise ValueError(f"無法解析參照: {ref}") from None
+            if resp.get("status") != "ok":
+                raise ValueError(f"參照的請求失敗: {ref}")
+            data = resp.get("data")
+            if field:
+                if not isinstance(data, dict) or field not in data:
+                    raise ValueError(f"無法解析參照: {ref}")
+                data = data[field]
+            return data
+        return {k: _resolve_refs(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve_refs(v, results) for v in value]
+    return value
+
+
+# ---------- 批次 ----------
+
+@action("batch", params={"requests": list, "atomic": (bool, False)})
+def handle_batch(ctx, p):
+    """
+    一次送多個子請求，依序在同一個交易內執行，回傳每一筆的結果陣列
+      - atomic=True：任一筆失敗就整批 rollback（回傳 error，results 為到失敗為止的結果）
+      - atomic=False：每筆各自包在 SAVEPOINT 裡，失敗的那筆 rollback，其餘照常 commit
+    子請求的 params 可用 {"$ref": "<第幾筆>.<欄位>"} 引用前面成功的結果。
+    不能在 batch 內登入：session 要等交易 commit 後才綁到連線上，後面的子請求看不到
+    """
+    requests = p["requests"]
+    if len(requests) > MAX_BATCH_SIZE:
+        return {"status": "error", "message": f"批次最多 {MAX_BATCH_SIZE} 筆請求"}
+
+    results: List[Dict] = []
+    for index, sub in enumerate(requests):
+        name = sub.get("action") if isinstance(sub, dict) else None
+        if name == "batch":
+            resp = {"status": "error", "message": "batch 內不可再包 batch"}
+        elif name == "login":
+            resp = {"status": "error", "message": "batch 內不可登入，請先單獨送出 login"}
+        else:
+            try:
+                params = _resolve_refs(sub.get("params") or {}, results)
+            except (AttributeError, ValueError) as e:
+                resp = {"status": "error", "message": str(e) or "子請求格式錯誤"}
+            else:
+                if p["atomic"]:
+                    resp = dispatch(name, params, ctx.conn, ctx.conn_state, nested=True)
+                else:
+                    resp = run_in_savepoint(
+                        ctx.conn,
+                        lambda: dispatch(name, params, ctx.conn, ctx.conn_state, nested=True),
+                    )
+        results.append(resp)
+        if p["atomic"] and resp.get("status") != "ok":
+            return {
+                "status": "error",
+                "message": f"批次第 {index + 1} 筆失敗：{resp.get('message')}",
+                "results": results,
+            }
+    return {"status": "ok", "data": results}
+
+
+# ---------- 帳號 ----------
+
+@action(
+    "register_user",
+    params={
+        "user_name": str,
+        "email": (str, ""),
+        "phone": int,
+        "password": str,
+        "role": (str, "Volunteer"),
+    },
+)
+def handle_register_user(ctx, p):
+    role = p["role"].strip().lower().capitalize()
+    if role not in REGISTRATION_ROLES:
+        return {
+            "status": "error",
+            "message": "註冊角色僅支援 Volunteer 或 Organizer。",
+        }
+    user_name, email = p["user_name"], p["email"]
+    user_id = register_user(user_name, email, p["phone"], p["password"], role, conn=ctx.conn)
+    # 如果是 Organizer，自動建立一個同名 ORG 並綁定
+    if role == "Organizer":
+        create_org(
+            f"{user_name} Org", email or f"{user_name}@example.org", user_id, conn=ctx.conn
+        )
+    data = {"user_id": user_id, "roles": [role]}
+    # 尚未登入的連線，註冊完直接以新帳號登入（batch 內只註冊，理由同 login）
+    if ctx.session is None and not ctx.nested:
+        data["token"] = ctx.start_session(user_id, user_name, [role])
+    return {"status": "ok", "data": data}
+
+
+@action("login", params={"user_name": str, "password": str})
+def handle_login(ctx, p):
+    login_result = login_user(p["user_name"], p["password"], conn=ctx.conn)
+    if login_result is None:
+        # 帳號或密碼錯誤
+        return {
+            "status": "error",
+            "message": "帳號或密碼錯誤，請重新確認。",
+        }
+    user_id, roles = login_result
+    if not roles:
+        return {
+            "status": "error",
+            "message": "此帳號尚未被指派任何角色，請聯絡管理員。",
+        }
+    token = ctx.start_session(user_id, p["user_name"], roles)
+    return {
+        "status": "ok",
+        "data": {
+            "user_id": user_id,
+            "user_name": p["user_name"],
+            "roles": roles,
+            "token": token,
+        },
+    }
+
+
+@action("logout")
+def handle_logout(ctx, p):
+    ctx.end_session()
+    return {"status": "ok", "data": True}
+
+
+@action(
+    "update_profile",
+    login=True,
+    params={
+        "user_id": int,
+        "user_name": (str, None),
+        "email": (str, None),
+        "phone": (int, None),
+        "password": (str, None),
+    },
+)
+def handle_update_profile(ctx, p):
+    update_user_profile(
+        p["user_id"],
+        user_name=p["user_name"],
+        email=p["email"],
+        phone=p["phone"],
+        password=p["password"],
+        conn=ctx.conn,
+    )
+    return {"status": "ok", "data": True}
+
+
+# ---------- Organizer 功能 ----------
+
+@action(
+    "create_venue",
+    role="Organizer",
+    params={"user_id": int, "name": str, "address": str, "capacity": int},
+)
+def handle_create_venue(ctx, p):
+    venue_id = create_venue(p["name"], p["address"], p["capacity"], conn=ctx.conn)
+    return {"status": "ok", "data": {"venue_id": venue_id}}
+
+
+@action(
+    "create_org",
+    role="Organizer",
+    params={
+        "user_id": int,
+        "org_name": str,
+        "contact_email": str,
+        "owner_user_id": (int, None),
+    },
+)
+def handle_create_org(ctx, p):
+    owner_user_id = p["owner_user_id"] or p["user_id"]
+    org_id = create_org(p["org_name"], p["contact_email"], owner_user_id, conn=ctx.conn)
+    return {"status": "ok", "data": {"org_id": org_id}}
+
+
+@action(
+    "create_event",
+    role="Organizer",
+    params={
+        "user_id": int,
+        "org_id": (int, None),
+        "venue_id": int,
+        "event_date": date,
+        "start_hour": int,
+        "end_hour": int,
+        "capacity": int,
+        "title": (str, ""),
+        "description": (str, ""),
+        "status": (str, "Planned"),
+    },
+)
+def handle_create_event(ctx, p):
+    owner_id = p["user_id"]  # 以自己為 owner
+    org_id = p["org_id"]
+    if org_id is None:
+        org_id = get_or_create_default_org(owner_id, conn=ctx.conn)
+    # 場地是否可用
+    # 鎖住場地再檢查，與後面的 INSERT 在同一個交易內完成
+    if not is_venue_available(
+        p["venue_id"], p["event_date"], p["start_hour"], p["end_hour"],
+        conn=ctx.conn, for_update=True,
+    ):
+        return {"status": "error", "message": "該場地該時段已被預約，請換時間"}
+    event_id = create_event(
+        owner_id,
+        org_id,
+        p["venue_id"],
+        p["event_date"],
+        p["start_hour"],
+        p["end_hour"],
+        p["capacity"],
+        p["title"],
+        p["description"],
+        p["status"],
+        conn=ctx.conn,
+    )
+    after_commit(lambda: scheduler.refresh(event_id))
+    after_commit(lambda: search_index.refresh(event_id))
+    after_commit(search_cache.clear)
+    return {"status": "ok", "data": {"event_id": event_id}}
+
+
+@action(
+    "set_event_periods",
+    role="Organizer",
+    params={
+        "user_id": int,
+        "event_id": int,
+        "start_hour": (int, None),
+        "end_hour": (int, None),
+        "hours": (list, []),
+    },
+)
+def handle_set_event_periods(ctx, p):
+    event_id = p["event_id"]
+    if p["start_hour"] is not None and p["end_hour"] is not None:
+        hours = list(range(p["start_hour"], p["end_hour"]))
+    else:
+        hours = [int(h) for h in p["hours"]]
+    set_event_periods(event_id, hours, conn=ctx.conn)
+    after_commit(lambda: scheduler.refresh(event_id))
+    after_commit(lambda: search_index.refresh(event_id))
+    after_commit(search_cache.clear)
+    after_commit(lambda: recommender.event_changed(event_id))
+    return {"status": "ok", "data": True}
+
+
+@action(
+    "set_required_skills",
+    role="Organizer",
+    params={"user_id": int, "event_id": int, "skill_weights": (dict, {})},
+)
+def handle_set_required_skills(ctx, p):
+    event_id = p["event_id"]
+    set_required_skills(event_id, p["skill_weights"], conn=ctx.conn)
+    after_commit(lambda: search_index.refresh(event_id))
+    after_commit(search_cache.clear)
+    after_commit(lambda: match_worker.event_changed(event_id))
+    return {"status": "ok", "data": True}
+
+
+@action(
+    "staff_events",
+    role="Organizer",
+    params={"user_id": int, "event_ids": (list, None), "apply": (bool, False)},
+)
+def handle_staff_events(ctx, p):
+    event_ids = None
+    if p["event_ids"]:
+        try:
+            event_ids = sorted({int(e) for e in p["event_ids"]})
+        except (TypeError, ValueError):
+            return {"status": "error", "message": "參數格式錯誤: event_ids"}
+    # 只會排自己建立、尚未開始的任務
+    result = staff_events(p["user_id"], event_ids, apply=p["apply"], conn=ctx.conn)
+    if p["apply"] and result["assignments"]:
+        changed = [e["event_id"] for e in result["events"] if e["assigned"]]
+
+        def refresh():
+            for event_id in changed:
+                search_index.refresh(event_id)
+                recommender.event_changed(event_id)
+            search_cache.clear()
+
+        after_commit(refresh)
+    return {"status": "ok", "data": serialize(result)}
+
+
+def _roster(ctx, p) -> Optional[Dict]:
+    """bulk_join / bulk_cancel 共用的檢查：自己的任務、user_ids 轉成 int 並去掉重複"""
+    try:
+        user_ids = list(dict.fromkeys(int(u) for u in p["user_ids"]))
+    except (TypeError, ValueError):
+        return {"status": "error", "message": "參數格式錯誤: user_ids"}
+    if not user_ids:
+        return {"status": "error", "message": "名單不可為空"}
+    if len(user_ids) > MAX_ROSTER_SIZE:
+        return {"status": "error", "message": f"名單最多 {MAX_ROSTER_SIZE} 人"}
+    events = list_my_events(p["user_id"], conn=ctx.conn)
+    if not any(e["event_id"] == p["event_id"] for e in events):
+        return {"status": "error", "message": "僅能處理自己建立的任務"}
+    p["user_ids"] = user_ids
+    return None
+
+
+@action(
+    "bulk_join",
+    role="Organizer",
+    params={"user_id": int, "event_id": int, "user_ids": list},
+)
+def handle_bulk_join(ctx, p):
+    """
+    匯入名單：一次鎖定任務，依名單順序分配名額，其餘排入候補；
+    名單上已在候補的人輪到時有名額就直接報名並移出候補（和逐筆 join_task 相同）
+    """
+    err = _roster(ctx, p)
+    if err:
+        return err
+    event_id = p["event_id"]
+    volunteers = set(users_with_role(p["user_ids"], "Volunteer", conn=ctx.conn))
+    eligible = [u for u in p["user_ids"] if u in volunteers]
+    outcome = dict(zip(eligible, join_task_batch(event_id, eligible, conn=ctx.conn)))
+    results = [
+        {"user_id": u, "result": outcome.get(u, "not_volunteer")} for u in p["user_ids"]
+    ]
+    if "joined" in outcome.values():
+        after_commit(lambda: search_index.refresh(event_id))
+        after_commit(lambda: search_cache.invalidate_event(event_id))
+        after_commit(lambda: recommender.event_changed(event_id))
+    return {"status": "ok", "data": results}
+
+
+@action(
+    "bulk_cancel",
+    role="Organizer",
+    params={"user_id": int, "event_id": int, "user_ids": list},
+)
+def handle_bulk_cancel(ctx, p):
+    """批次取消：取消的名額一次由候補依序遞補"""
+    err = _roster(ctx, p)
+    if err:
+        return err
+    event_id = p["event_id"]
+    result = cancel_participation_batch(event_id, p["user_ids"], conn=ctx.conn)
+    results = [
+        {"user_id": u, "result": r} for u, r in zip(p["user_ids"], result["results"])
+    ]
+    if "cancelled" in result["results"]:
+        after_commit(lambda: search_index.refresh(event_id))
+        after_commit(lambda: search_cache.invalidate_availability(event_id))
+        after_commit(lambda: recommender.event_changed(event_id))
+    return {"status": "ok", "data": {"results": results, "promoted": result["promoted"]}}
+
+
+@action("list_my_events", role="Organizer", params={"user_id": int})
+def handle_list_my_events(ctx, p):
+    events = list_my_events(p["user_id"], conn=ctx.conn)
+    return {"status": "ok", "data": serialize(events)}
+
+
+@action("list_venues")
+def handle_list_venues(ctx, p):
+    return {"status": "ok", "data": list_venues(conn=ctx.conn)}
+
+
+@action("list_skills")
+def handle_list_skills(ctx, p):
+    return {"status": "ok", "data": list_skills(conn=ctx.conn)}
+
+
+@action(
+    "get_event_participants",
+    role="Organizer",
+    params={"user_id": int, "event_id": int, **PAGING_PARAMS},
+)
+def handle_get_event_participants(ctx, p):
+    event_id = p["event_id"]
+    # 確認是自己的任務
+    events = list_my_events(p["user_id"], conn=ctx.conn)
+    if not any(e["event_id"] == event_id for e in events):
+        return {"status": "error", "message": "僅能查看自己建立的任務"}
+    return _list_response(
+        ctx,
+        p,
+        lambda after_id, limit: get_event_participants(
+            event_id, after_id, limit, conn=ctx.conn
+        ),
+        lambda after_id: stream_event_participants(event_id, after_id, conn=ctx.conn),
+        "user_id",
+    )
+
+
+@action(
+    "check_venue_availability",
+    role="Organizer",
+    params={
+        "user_id": int,
+        "venue_id": int,
+        "event_date": date,
+        "start_hour": int,
+        "end_hour": int,
+    },
+)
+def handle_check_venue_availability(ctx, p):
+    available = is_venue_available(
+        p["venue_id"], p["event_date"], p["start_hour"], p["end_hour"], conn=ctx.conn
+    )
+    conflicts = (
+        get_venue_bookings(p["venue_id"], p["event_date"], conn=ctx.conn)
+        if not available
+        else []
+    )
+    return {"status": "ok", "data": {"available": available, "conflicts": conflicts}}
+
+
+@action("list_venue_bookings", params={"venue_id": int, "event_date": date})
+def handle_list_venue_bookings(ctx, p):
+    bookings = get_venue_bookings(p["venue_id"], p["event_date"], conn=ctx.conn)
+    return {"status": "ok", "data": serialize(bookings)}
+
+
+# ---------- Admin 功能（簡化） ----------
+
+@action(
+    "admin_list_users",
+    role="Admin",
+    params={
+        "user_id": int,
+        "role": (str, None),
+        "prefix": (str, None),
+        "sort": (str, "user_id"),
+        "desc": (bool, False),
+        "with_total": (bool, False),
+        **PAGING_PARAMS,
+    },
+)
+def handle_admin_list_users(ctx, p):
+    role = p["role"].strip().lower().capitalize() if p["role"] else None
+    prefix = p["prefix"].strip() if p["prefix"] else None
+    filters = {"role": role, "prefix": prefix, "sort": p["sort"], "descending": p["desc"]}
+    resp = _list_response(
+        ctx,
+        p,
+        lambda after_id, limit: list_users_with_roles(
+            after_id, limit, conn=ctx.conn, **filters
+        ),
+        lambda after_id: stream_users_with_roles(after_id, conn=ctx.conn, **filters),
+        "user_id",
+    )
+    if p["with_total"] and resp["status"] == "ok":
+        resp["total"] = count_users(role, prefix, conn=ctx.conn)
+    return resp
+
+
+@action(
+    "admin_add_role",
+    role="Admin",
+    params={"user_id": int, "target_user_id": int, "role": str},
+)
+def handle_admin_add_role(ctx, p):
+    target_user_id = p["target_user_id"]
+    add_role(target_user_id, p["role"], conn=ctx.conn)
+    after_commit(lambda: sessions.invalidate_user(target_user_id))
+    # 有沒有 Volunteer 身分決定是否計算契合度
+    after_commit(lambda: match_worker.user_changed(target_user_id))
+    return {"status": "ok", "data": True}
+
+
+@action(
+    "admin_remove_role",
+    role="Admin",
+    params={"user_id": int, "target_user_id": int, "role": str},
+)
+def handle_admin_remove_role(ctx, p):
+    target_user_id = p["target_user_id"]
+    remove_role(target_user_id, p["role"], conn=ctx.conn)
+    after_commit(lambda: sessions.invalidate_user(target_user_id))
+    # 有沒有 Volunteer 身分決定是否計算契合度
+    after_commit(lambda: match_worker.user_changed(target_user_id))
+    return {"status": "ok", "data": True}
+
+
+@action("admin_create_skill", role="Admin", params={"user_id": int, "skill_name": str})
+def handle_admin_create_skill(ctx, p):
+    skill_id = create_skill(p["skill_name"], conn=ctx.conn)
+    return {"status": "ok", "data": {"skill_id": skill_id}}
+
+
+@action("admin_delete_event", role="Admin", params={"user_id": int, "event_id": int})
+def handle_admin_delete_event(ctx, p):
+    event_id = p["event_id"]
+    with ctx.conn.cursor() as cur:
+        cur.execute("DELETE FROM TASK_EVENT WHERE event_id = %s;", (event_id,))
+    after_commit(lambda: scheduler.unschedule(event_id))
+    after_commit(lambda: search_index.remove(event_id))
+    after_commit(lambda: search_cache.invalidate_event(event_id))
+    after_commit(lambda: recommender.event_removed(event_id))
+    return {"status": "ok", "data": True}
+
+
+@action("admin_delete_venue", role="Admin", params={"user_id": int, "venue_id": int})
+def handle_admin_delete_venue(ctx, p):
+    with ctx.conn.cursor() as cur:
+        cur.execute("DELETE FROM VENUE WHERE venue_id = %s;", (p["venue_id"],))
+    # 場地上的任務會被連帶刪除
+    after_commit(search_index.rebuild)
+    after_commit(search_cache.clear)
+    after_commit(recommender.clear)
+    return {"status": "ok", "data": True}
+
+
+@action("admin_delete_skill", role="Admin", params={"user_id": int, "skill_id": int})
+def handle_admin_delete_skill(ctx, p):
+    with ctx.conn.cursor() as cur:
+        cur.execute("DELETE FROM SKILL WHERE skill_id = %s;", (p["skill_id"],))
+    after_commit(search_index.rebuild)
+    after_commit(search_cache.clear)
+    # 志工技能與任務需求會被連帶刪除，影響範圍不限於單一志工或任務
+    after_commit(match_worker.rebuild_all)
+    return {"status": "ok", "data": True}
+
+
+@action("admin_top_keywords", role="Admin", params={"user_id": int, "limit": (int, 10)})
+def handle_admin_top_keywords(ctx, p):
+    return {"status": "ok", "data": top_keywords(p["limit"])}
+
+
+@action("admin_pool_stats", role="Admin", params={"user_id": int})
+def handle_admin_pool_stats(ctx, p):
+    return {"status": "ok", "data": pool_stats()}
+
+
+@action("admin_metrics", role="Admin", params={"user_id": int})
+def handle_admin_metrics(ctx, p):
+    return {
+        "status": "ok",
+        "data": {
+            "actions": metrics_snapshot(),
+            "sessions": sessions.stats(),
+            "lifecycle": scheduler.stats(),
+            "search_index": search_index.stats(),
+            "search_cache": search_cache.stats(),
+            "match_worker": match_worker.stats(),
+            "recommender": recommender.stats(),
+            "signup_batcher": signup_batcher.stats(),
+            "event_actors": event_actors.stats(),
+        },
+    }
+
+
+@action("admin_list_events", role="Admin", params={"user_id": int, **PAGING_PARAMS})
+def handle_admin_list_events(ctx, p):
+    return _list_response(
+        ctx,
+        p,
+        lambda after_id, limit: list_all_events_with_counts(after_id, limit, conn=ctx.conn),
+        lambda after_id: stream_all_events_with_counts(after_id, conn=ctx.conn),
+        "event_id",
+    )
+
+
+@action(
+    "admin_event_participants",
+    role="Admin",
+    params={"user_id": int, "event_id": int, **PAGING_PARAMS},
+)
+def handle_admin_event_participants(ctx, p):
+    event_id = p["event_id"]
+    return _list_response(
+        ctx,
+        p,
+        lambda after_id, limit: get_event_participants(
+            event_id, after_id, limit, conn=ctx.conn
+        ),
+        lambda after_id: stream_event_participants(event_id, after_id, conn=ctx.conn),
+        "user_id",
+    )
+
+
+# ---------- 志工功能 ----------
+
+@action(
+    "search_tasks",
+    params={
+        "event_date": (date, None),
+        "location_keyword": (str, None),
+        "skill_keyword": (str, None),
+        "title_keyword": (str, None),
+        "keyword": (str, None),
+        "only_available": (bool, True),
+        "include_finished": (bool, False),
+        "only_finished": (bool, False),
+        "future_only": (bool, False),
+        "past_only": (bool, False),
+        "date_from": (date, None),
+        "date_to": (date, None),
+        "hour_from": (int, None),
+        "hour_to": (int, None),
+        "weekdays": (list, None),
+        "order": (str, None),
+        "limit": (int, None),
+        "offset": (int, 0),
+        "facets": (bool, False),
+    },
+)
+def handle_search_tasks(ctx, p):
+    title_keyword = p["title_keyword"] or p["keyword"]
+    weekdays = None
+    if p["weekdays"]:
+        try:
+            weekdays = sorted({int(d) for d in p["weekdays"]})
+        except (TypeError, ValueError):
+            return {"status": "error", "message": "參數格式錯誤: weekdays"}
+        if not all(1 <= d <= 7 for d in weekdays):
+            return {"status": "error", "message": "weekdays 需為 1（週一）到 7（週日）"}
+    limit = max(1, min(p["limit"], MAX_PAGE_SIZE)) if p["limit"] is not None else None
+    criteria = dict(
+        event_date=p["event_date"],
+        location_keyword=p["location_keyword"],
+        skill_keyword=p["skill_keyword"],
+        title_keyword=title_keyword,
+        only_available=p["only_available"],
+        include_finished=p["include_finished"],
+        only_finished=p["only_finished"],
+        future_only=p["future_only"],
+        past_only=p["past_only"],
+        date_from=p["date_from"],
+        date_to=p["date_to"],
+        hour_from=p["hour_from"],
+        hour_to=p["hour_to"],
+        weekdays=weekdays,
+        order=p["order"],
+        limit=limit,
+        offset=max(p["offset"], 0),
+    )
+
+    def run_search():
+        # 未結束任務的查詢由記憶體索引回答，其餘（歷史紀錄等）才查 DB
+        result = {"tasks": search_index.search(**criteria)}
+        if result["tasks"] is None:
+            result["tasks"] = search_tasks(**criteria, conn=ctx.conn)
+        if p["facets"]:
+            # 分類統計不分頁、不排序，條件相同
+            filters = {
+                k: v for k, v in criteria.items() if k not in ("order", "limit", "offset")
+            }
+            result["facets"] = search_index.facets(**filters)
+            if result["facets"] is None:
+                result["facets"] = search_facets(**filters, conn=ctx.conn)
+        return serialize(result)
+
+    if ctx.nested:
+        # batch 內的查詢可能看得到同一交易未 commit（之後也可能 rollback）的寫入：
+        # 不讀也不寫快取，也不和其他 request 合併，結果只給自己用
+        result = run_search()
+    else:
+        result = search_cache.get_or_compute(
+            dict(criteria, facets=p["facets"]), run_search, defer=after_commit
+        )
+    is_history = p["only_finished"] or p["past_only"]
+    try:
+        # 搜尋紀錄以登入者為準
+        log_search(
+            ctx.session.user_id if ctx.session is not None else 0,
+            title_keyword or "",
+            {
+                "event_date": p["event_date"].isoformat() if p["event_date"] else "",
+                "location": p["location_keyword"] or "",
+                "skill": p["skill_keyword"] or "",
+                "only_available": p["only_available"],
+                "history": is_history,
+            },
+            is_history=is_history,
+        )
+    except Exception:
+        pass
+    resp = {"status": "ok", "data": result["tasks"]}
+    if p["facets"]:
+        resp["facets"] = result["facets"]
+    return resp
+
+
+@action(
+    "recommend_tasks",
+    role="Volunteer",
+    role_message="需具備 Volunteer 身分才能取得推薦任務。",
+    params={"user_id": int, "limit": (int, 10)},
+)
+def handle_recommend_tasks(ctx, p):
+    limit = max(1, min(p["limit"], MAX_RECOMMENDATIONS))
+    tasks = recommender.recommend(p["user_id"], limit, conn=ctx.conn)
+    return {"status": "ok", "data": serialize(tasks)}
+
+
+@action(
+    "join_task",
+    role="Volunteer",
+    role_message="需具備 Volunteer 身分才能報名任務。",
+    params={"user_id": int, "event_id": int},
+)
+def handle_join_task(ctx, p):
+    event_id = p["event_id"]
+    committed = not ctx.nested and (event_actors.running or signup_batcher.enabled)
+    if event_actors.running and not ctx.nested:
+        # 交給負責這個任務的 owner 執行（已由 owner commit）
+        result = event_actors.join(p["user_id"], event_id)
+    elif signup_batcher.enabled and not ctx.nested:
+        # 和同一任務同時到的報名合併成一個交易（已在這裡 commit）
+        result = signup_batcher.join(p["user_id"], event_id, ctx.conn)
+    else:
+        result = join_task(p["user_id"], event_id, conn=ctx.conn)
+    # result 可能是 "joined" 或 "waitlisted"；只有 joined 會改變報名人數
+    if result == "joined":
+        after_commit(lambda: search_index.refresh(event_id))
+        after_commit(lambda: search_cache.invalidate_event(event_id))
+        # 額滿時從推薦清單移除
+        after_commit(lambda: recommender.event_changed(event_id))
+        return {"status": "ok", "data": {"result": result}}
+    try:
+        position = get_waitlist_position(p["user_id"], event_id, conn=ctx.conn)
+    except Exception:
+        if not committed:
+            raise
+        # 報名已經 commit，順位查不到也要回報成功（client 可再用 get_waitlist_position 查）；
+        # 這條連線上沒有未 commit 的寫入，rollback 讓 request_scope 能正常結束
+        ctx.conn.rollback()
+        return {"status": "ok", "data": {"result": result}}
+    return {"status": "ok", "data": {"result": result, **position}}
+
+
+@action(
+    "get_waitlist_position",
+    role="Volunteer",
+    role_message="需具備 Volunteer 身分才能查看候補順位。",
+    params={"user_id": int, "event_id": int},
+)
+def handle_get_waitlist_position(ctx, p):
+    data = get_waitlist_position(p["user_id"], p["event_id"], conn=ctx.conn)
+    return {"status": "ok", "data": data}
+
+
+@action(
+    "cancel_participation",
+    role="Volunteer",
+    role_message="需具備 Volunteer 身分才能取消報名。",
+    params={"user_id": int, "event_id": int},
+)
+def handle_cancel_participation(ctx, p):
+    event_id = p["event_id"]
+    if event_actors.running and not ctx.nested:
+        success = event_actors.cancel(p["user_id"], event_id)
+    else:
+        success = cancel_participation(p["user_id"], event_id, conn=ctx.conn)
+    if success:
+        after_commit(lambda: search_index.refresh(event_id))
+        after_commit(lambda: search_cache.invalidate_availability(event_id))
+        after_commit(lambda: recommender.event_changed(event_id))
+    return {"status": "ok", "data": {"success": success}}
+
+
+@action(
+    "set_user_skill",
+    role="Volunteer",
+    role_message="需具備 Volunteer 身分才能設定技能。",
+    params={"user_id": int, "skill_name": str, "level": int},
+)
+def handle_set_user_skill(ctx, p):
+    user_id = p["user_id"]
+    skill_name = p["skill_name"].strip()
+    if not skill_name:
+        return {"status": "error", "message": "技能名稱不可為空"}
+    if not 1 <= p["level"] <= 5:
+        return {"status": "error", "message": "技能等級需為 1~5"}
+    skill_id = create_skill(skill_name, conn=ctx.conn)
+    set_user_skill(user_id, skill_id, p["level"], conn=ctx.conn)
+    # 契合度由背景 worker 重算，不拖慢這個請求
+    after_commit(lambda: match_worker.user_changed(user_id))
+    return {"status": "ok", "data": {"skill_id": skill_id}}
+
+
+@action(
+    "get_user_history",
+    role="Volunteer",
+    role_message="需具備 Volunteer 身分才能查看參與紀錄。",
+    params={"user_id": int},
+)
+def handle_get_user_history(ctx, p):
+    history = get_user_history(p["user_id"], conn=ctx.conn)
+    return {"status": "ok", "data": serialize(history)}
+
+
+@action(
+    "get_user_active_participation",
+    role="Volunteer",
+    role_message="需具備 Volunteer 身分才能查看報名列表。",
+    params={"user_id": int},
+)
+def handle_get_user_active_participation(ctx, p):
+    data = get_user_active_participation(p["user_id"], conn=ctx.conn)
+    return {"status": "ok", "data": serialize(data)}
@@ -7,27 +7,19 @@
   - 管理基礎資料：ORG / VENUE / SKILL
 """
 import socket
-import json
+
+from protocol import ClientChannel
 
 HOST = "127.0.0.1"
 PORT = 5050
+USER_PAGE_SIZE = 20
 
 
-def send_request(sock: socket.socket, action: str, params: dict):
-    req = {"action": action, "params": params}
-    sock.sendall((json.dumps(req) + "\n").encode("utf-8"))
-    buf = ""
-    while True:
-        chunk = sock.recv(4096)
-        if not chunk:
-            print("[ERROR] 與伺服器連線中斷。請確認 server 有在執行。")
-            return None
-        buf += chunk.decode("utf-8")
-        if "\n" in buf:
-            line, _ = buf.split("\n", 1)
-            line = line.strip()
-            break
-    resp = json.loads(line)
+def send_request(channel: ClientChannel, action: str, params: dict):
+    resp = channel.request({"action": action, "params": params})
+    if resp is None:
+        print("[ERROR] 與伺服器連線中斷。請確認 server 有在執行。")
+        return None
     if resp.get("status") != "ok":
         msg = resp.get("message", "unknown error")
         print(f"[ERROR] {msg}")
@@ -35,15 +27,54 @@ def send_request(sock: socket.socket, action: str, params: dict):
     return resp.get("data")
 
 
+def stream_request(channel: ClientChannel, action: str, params: dict):
+    """串流模式：server 邊讀邊送，這裡逐筆產出資料列；發生錯誤時印出訊息後結束"""
+    for resp in channel.stream({"action": action, "params": {**params, "stream": True}}):
+        if resp.get("status") != "ok":
+            print(f"[ERROR] {resp.get('message', 'unknown error')}")
+            return
+        yield from resp.get("data") or []
+
+
+def browse_users(channel: ClientChannel, payload: dict):
+    """一頁一頁瀏覽使用者（keyset 分頁），Enter 下一頁、q 離開"""
+    shown = 0
+    while True:
+        resp = channel.request({"action": "admin_list_users", "params": payload})
+        if resp is None:
+            print("[ERROR] 與伺服器連線中斷。請確認 server 有在執行。")
+            return
+        if resp.get("status") != "ok":
+            print(f"[ERROR] {resp.get('message', 'unknown error')}")
+            return
+        if "total" in resp:
+            print(f"\n符合條件的使用者共 {resp['total']} 位")
+            # 總數只需要算一次
+            payload = {**payload, "with_total": False}
+        for u in resp["data"]:
+            roles = ", ".join(u["roles"])
+            print(f"{u['user_id']} | {u['user_name']} | {u['email']} | 角色: {roles}")
+        shown += len(resp["data"])
+        next_after_id = resp.get("next_after_id")
+        if next_after_id is None:
+            print(f"(已顯示 {shown} 位，沒有更多了)")
+            return
+        if input(f"(已顯示 {shown} 位) Enter 下一頁，q 離開: ").strip().lower() == "q":
+            return
+        payload = {**payload, "after_id": next_after_id}
+
+
 def main():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.connect((HOST, PORT))
+    with socket.create_connection((HOST, PORT)) as sock:
+        channel = ClientChannel(sock)
+        # 改用長度前綴的二進位 frame（server 不支援就維持 JSON 行）
+        channel.negotiate()
         print("=== Admin CLI ===")
         user_name = input("請輸入 Admin 帳號: ").strip()
         password = input("請輸入密碼: ").strip()
 
         login_data = send_request(
-            sock, "login", {"user_name": user_name, "password": password}
+            channel, "login", {"user_name": user_name, "password": password}
         )
         if not login_data:
             print("登入失敗")
@@ -68,40 +99,34 @@ def main():
             print("10) 查看熱門搜尋關鍵字")
             print("11) 查看所有任務")
             print("12) 查看任務報名名單")
-            print("13) 離開")
+            print("13) 查看 DB 連線池狀態")
+            print("14) 查看各 action 延遲統計")
+            print("15) 離開")
             cmd = input("請輸入選項: ").strip()
 
             if cmd == "1":
                 role_filter = input("要查哪一類？(all/Volunteer/Organizer/Admin，Enter=all): ").strip()
-                payload = {"user_id": user_id}
+                prefix = input("名稱或 email 開頭 (Enter 不限): ").strip()
+                sort = input("排序 (user_id/user_name/email，Enter=user_id): ").strip() or "user_id"
+                desc = input("由大到小？(y/N): ").strip().lower() == "y"
+                payload = {
+                    "user_id": user_id,
+                    "sort": sort,
+                    "desc": desc,
+                    "limit": USER_PAGE_SIZE,
+                    "with_total": True,
+                }
                 if role_filter and role_filter.lower() != "all":
                     payload["role"] = role_filter
-                data = send_request(sock, "admin_list_users", payload)
-                if data is not None:
-                    print("\n全部使用者：")
-                    for u in data:
-                        roles = ", ".join(u["roles"])
-                        print(f"{u['user_id']} | {u['user_name']} | {u['email']} | 角色: {roles}")
-
-                    def print_by_role(role: str):
-                        print(f"\n=== {role} 列表 ===")
-                        found = False
-                        for u in data:
-                            if role in u["roles"]:
-                                found = True
-                                print(f"{u['user_id']} | {u['user_name']} | {u['email']}")
-                        if not found:
-                            print("(無)")
-
-                    print_by_role("Volunteer")
-                    print_by_role("Organizer")
-                    print_by_role("Admin")
+                if prefix:
+                    payload["prefix"] = prefix
+                browse_users(channel, payload)
 
             elif cmd == "2":
                 target_id = input("目標 user_id: ").strip()
                 role = input("角色 (Volunteer/Organizer/Admin): ").strip()
                 data = send_request(
-                    sock,
+                    channel,
                     "admin_add_role",
                     {"user_id": user_id, "target_user_id": target_id, "role": role},
                 )
@@ -112,7 +137,7 @@ def main():
                 target_id = input("目標 user_id: ").strip()
                 role = input("要移除的角色: ").strip()
                 data = send_request(
-                    sock,
+                    channel,
                     "admin_remove_role",
                     {"user_id": user_id, "target_user_id": target_id, "role": role},
                 )
@@ -125,7 +150,7 @@ def main():
                 owner = input("綁定的 organizer user_id (Enter 跳過): ").strip()
                 owner_user_id = owner or None
                 data = send_request(
-                    sock,
+                    channel,
                     "create_org",
                     {
                         "user_id": user_id,
@@ -142,7 +167,7 @@ def main():
                 address = input("地址: ").strip()
                 capacity = input("容量: ").strip()
                 data = send_request(
-                    sock,
+                    channel,
                     "create_venue",
                     {"user_id": user_id, "name": name, "address": address, "capacity": capacity},
                 )
@@ -152,7 +177,7 @@ def main():
             elif cmd == "6":
                 skill_name = input("技能名稱: ").strip()
                 data = send_request(
-                    sock,
+                    channel,
                     "admin_create_skill",
                     {"user_id": user_id, "skill_name": skill_name},
                 )
@@ -162,7 +187,7 @@ def main():
             elif cmd == "7":
                 event_id = input("event_id: ").strip()
                 data = send_request(
-                    sock, "admin_delete_event", {"user_id": user_id, "event_id": event_id}
+                    channel, "admin_delete_event", {"user_id": user_id, "event_id": event_id}
                 )
                 if data:
                     print("✅ 已刪除任務")
@@ -170,7 +195,7 @@ def main():
             elif cmd == "8":
                 venue_id = input("venue_id: ").strip()
                 data = send_request(
-                    sock, "admin_delete_venue", {"user_id": user_id, "venue_id": venue_id}
+                    channel, "admin_delete_venue", {"user_id": user_id, "venue_id": venue_id}
                 )
                 if data:
                     print("✅ 已刪除場地")
@@ -178,7 +203,7 @@ def main():
             elif cmd == "9":
                 skill_id = input("skill_id: ").strip()
                 data = send_request(
-                    sock, "admin_delete_skill", {"user_id": user_id, "skill_id": skill_id}
+                    channel, "admin_delete_skill", {"user_id": user_id, "skill_id": skill_id}
                 )
                 if data:
                     print("✅ 已刪除技能")
@@ -188,37 +213,56 @@ def main():
                 payload = {"user_id": user_id}
                 if limit:
                     payload["limit"] = limit
-                data = send_request(sock, "admin_top_keywords", payload)
+                data = send_request(channel, "admin_top_keywords", payload)
                 if data is not None:
                     print("\n=== 熱門關鍵字 ===")
                     for kw, cnt in data:
                         print(f"{kw}: {cnt}")
 
             elif cmd == "11":
-                data = send_request(sock, "admin_list_events", {"user_id": user_id})
-                if data is not None:
-                    print("\n=== 任務列表 ===")
-                    for e in data:
-                        print(
-                            f"Event {e['event_id']} | {e['title']} | {e['event_date']} "
-                            f"{e['start_hour']}:00-{e['end_hour']}:00 | "
-                            f"狀態:{e['status']} | 名額:{e['capacity']} | 已報名:{e['active']} | 候補:{e['waitlist']}"
-                        )
+                print("\n=== 任務列表 ===")
+                for e in stream_request(channel, "admin_list_events", {"user_id": user_id}):
+                    print(
+                        f"Event {e['event_id']} | {e['title']} | {e['event_date']} "
+                        f"{e['start_hour']}:00-{e['end_hour']}:00 | "
+                        f"狀態:{e['status']} | 名額:{e['capacity']} | 已報名:{e['active']} | 候補:{e['waitlist']}"
+                    )
 
             elif cmd == "12":
                 event_id = input("event_id: ").strip()
-                data = send_request(
-                    sock, "admin_event_participants", {"user_id": user_id, "event_id": event_id}
-                )
+                print("\n=== 報名名單 ===")
+                for p in stream_request(
+                    channel, "admin_event_participants", {"user_id": user_id, "event_id": event_id}
+                ):
+                    print(
+                        f"{p['user_id']} | {p['user_name']} | {p['email']} | "
+                        f"{p['phone']} | {p['role']} | {p['status']} | {p['join_time']}"
+                    )
+
+            elif cmd == "13":
+                data = send_request(channel, "admin_pool_stats", {"user_id": user_id})
                 if data is not None:
-                    print("\n=== 報名名單 ===")
-                    for p in data:
+                    print("\n=== DB 連線池 ===")
+                    if not data.get("enabled"):
+                        print("未啟用連線池（每次請求直接連線）")
+                    for k, v in data.items():
+                        if k != "enabled":
+                            print(f"{k}: {v}")
+
+            elif cmd == "14":
+                data = send_request(channel, "admin_metrics", {"user_id": user_id})
+                if data is not None:
+                    print("\n=== Action 統計 ===")
+                    print("action | calls | errors | avg_ms | max_ms | avg_queries")
+                    for name, m in data["actions"].items():
                         print(
-                            f"{p['user_id']} | {p['user_name']} | {p['email']} | "
-                            f"{p['phone']} | {p['role']} | {p['status']} | {p['join_time']}"
+                            f"{name} | {m['calls']} | {m['errors']} | {m['avg_ms']} | "
+                            f"{m['max_ms']} | {m['avg_queries']}"
                         )
+                    print(f"sessions: {data['sessions']}")
+                    print(f"lifecycle: {data['lifecycle']}")
 
-            elif cmd == "13":
+            elif cmd == "15":
                 print("Bye")
                 break
             else:
@@ -0,0 +1,172 @@
+# backend/bench_search.py
+"""
+search_tasks 效能比較：舊版（LEFT JOIN PARTICIPATION × 技能後 GROUP BY、Python 過濾額滿）
+與新版（EXISTS + LATERAL 計數、SQL 內過濾/排序/分頁）
+
+在獨立的 schema（bench_search）建立同結構的表並灌入假資料，不會動到正式資料，
+跑完會整個刪掉。用法：
+    python3 bench_search.py                     # 10k 與 1M 筆報名
+    python3 bench_search.py --participations 50000 --events 500
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List
+
+import psycopg
+
+from db import DB_CONFIG
+from volunteer import search_tasks
+
+BENCH_SCHEMA = "bench_search"
+TABLES = ["VENUE", "TASK_EVENT", "PARTICIPATION", "SKILL", "TASK_REQUIRED_SKILL"]
+
+# 改寫前的查詢，留作對照
+LEGACY_SQL = """
+    SELECT
+        e.event_id, e.title, e.event_date, e.start_hour, e.end_hour, e.status,
+        v.name AS venue_name, v.address, e.capacity,
+        COALESCE(SUM(CASE WHEN p.status = 'Active' THEN 1 ELSE 0 END), 0) AS active_volunteers
+    FROM TASK_EVENT e
+    JOIN VENUE v ON v.venue_id = e.venue_id
+    LEFT JOIN PARTICIPATION p ON p.event_id = e.event_id
+    LEFT JOIN TASK_REQUIRED_SKILL trs ON trs.event_id = e.event_id
+    LEFT JOIN SKILL s ON s.skill_id = trs.skill_id
+    WHERE e.status <> 'Finished' {extra}
+    GROUP BY e.event_id, e.title, e.event_date, e.start_hour, e.end_hour, e.status,
+             v.name, v.address, e.capacity
+    ORDER BY e.event_date, e.event_id;
+"""
+
+
+SEED_SQL = [
+    """
+    INSERT INTO VENUE (venue_id, name, address, capacity)
+    SELECT g, '場地' || g, '台南市測試路 ' || g || ' 號', 100
+    FROM generate_series(1, 50) g;
+    """,
+    """
+    INSERT INTO SKILL (skill_id, skill_name)
+    SELECT g, 'Skill ' || g FROM generate_series(1, 12) g;
+    """,
+    # 每 4 個任務有 1 個名額剛好等於報名人數（額滿）
+    """
+    INSERT INTO TASK_EVENT (event_id, owner_id, venue_id, event_date, start_hour,
+                            end_hour, capacity, duration_hours, status, title)
+    SELECT g, 1, 1 + g %% 50, CURRENT_DATE + (g %% 90), 9, 11,
+           CASE WHEN g %% 4 = 0 THEN %(per_event)s ELSE %(per_event)s * 2 END,
+           2, 'Planned', '淨灘任務 ' || g
+    FROM generate_series(1, %(events)s) g;
+    """,
+    """
+    INSERT INTO TASK_REQUIRED_SKILL (event_id, skill_id, weight)
+    SELECT e, 1 + (e + k) %% 12, 1
+    FROM generate_series(1, %(events)s) e, generate_series(0, 1) k;
+    """,
+    """
+    INSERT INTO PARTICIPATION (user_id, event_id, join_time, role, status)
+    SELECT u, e, now(), 'Volunteer', 'Active'
+    FROM generate_series(1, %(events)s) e, generate_series(1, %(per_event)s) u;
+    """,
+    "UPDATE TASK_EVENT SET active_count = %(per_event)s;",
+]
+
+
+def legacy_search(conn, skill_keyword=None, only_available=True) -> List:
+    extra, params = "", []
+    if skill_keyword:
+        extra, params = "AND s.skill_name ILIKE %s", [f"%{skill_keyword}%"]
+    with conn.cursor() as cur:
+        cur.execute(LEGACY_SQL.format(extra=extra), params)
+        rows = cur.fetchall()
+    return [r for r in rows if not only_available or r[8] - r[9] > 0]
+
+
+def setup(conn, events: int, participations: int) -> None:
+    """建立 bench schema 並灌資料：每個任務 2 個需求技能，報名平均分散、約 1/4 的任務額滿"""
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+        cur.execute(f"CREATE SCHEMA {BENCH_SCHEMA};")
+        for table in TABLES:
+            cur.execute(
+                f"CREATE TABLE {BENCH_SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL);"
+            )
+        cur.execute(f"SET search_path TO {BENCH_SCHEMA};")
+        per_event = max(participations // events, 1)
+        params = {"events": events, "per_event": per_event}
+        for statement in SEED_SQL:
+            cur.execute(statement, params)
+        cur.execute("ANALYZE;")
+    conn.commit()
+
+
+def timed(func: Callable[[], List], repeat: int) -> Dict:
+    samples = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(func())
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(samples), 2), "rows": rows}
+
+
+def run(events: int, participations: int, repeat: int) -> None:
+    with psycopg.connect(**DB_CONFIG) as conn:
+        try:
+            started = time.perf_counter()
+            setup(conn, events, participations)
+            print(
+                f"\n=== {events} 個任務 / {participations} 筆報名 "
+                f"(建資料 {time.perf_counter() - started:.1f}s) ==="
+            )
+            cases = [
+                (
+                    "全部未結束任務",
+                    lambda: legacy_search(conn, only_available=False),
+                    lambda: search_tasks(only_available=False, conn=conn),
+                ),
+                (
+                    "只看未額滿",
+                    lambda: legacy_search(conn),
+                    lambda: search_tasks(conn=conn),
+                ),
+                (
+                    "技能關鍵字",
+                    lambda: legacy_search(conn, skill_keyword="Skill 3"),
+                    lambda: search_tasks(skill_keyword="Skill 3", conn=conn),
+                ),
+                (
+                    "未額滿前 20 筆",
+                    lambda: legacy_search(conn)[:20],
+                    lambda: search_tasks(limit=20, conn=conn),
+                ),
+            ]
+            print(f"{'情境':<14}{'舊版 ms':>10}{'新版 ms':>10}{'筆數(舊/新)':>14}")
+            for name, legacy, new in cases:
+                old_result = timed(legacy, repeat)
+                new_result = timed(new, repeat)
+                print(
+                    f"{name:<14}{old_result['median_ms']:>10}{new_result['median_ms']:>10}"
+                    f"{old_result['rows']:>8}/{new_result['rows']}"
+                )
+        finally:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+            conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="search_tasks benchmark")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument(
+        "--participations", type=int, nargs="*", default=[10_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for participations in args.participations:
+        run(args.events, participations, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
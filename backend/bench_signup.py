@@ -0,0 +1,169 @@
+# backend/bench_signup.py
+"""
+熱門任務搶報名的效能比較：逐筆 join_task（每筆各自搶 TASK_EVENT 列鎖、各自 commit）、
+signup_batch 的合併報名（同一任務同時到的報名一個交易處理）
+與 event_actors（依 event_id 分給 N 個 owner thread，各自批次 commit）
+
+在獨立的 schema（bench_signup）建立同結構的表，用多條 thread（各自一條連線，
+模擬 server 的 handler）同時報名同一批任務，跑完會整個刪掉。用法：
+    python3 bench_signup.py                          # 1 個任務、16 / 64 條 thread
+    python3 bench_signup.py --events 4 --signups 4000 --threads 32
+    python3 bench_signup.py --events 64 --signups 6400 --threads 64 --owners 1 2 4 8
+"""
+import argparse
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+import psycopg
+
+from db import DB_CONFIG
+from event_actors import EventActors
+from signup_batch import SignupBatcher
+from volunteer import join_task
+
+BENCH_SCHEMA = "bench_signup"
+TABLES = ["TASK_EVENT", "PARTICIPATION", "WAITLIST"]
+
+
+def setup(events: int, capacity: int) -> None:
+    with psycopg.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+            cur.execute(f"CREATE SCHEMA {BENCH_SCHEMA};")
+            for table in TABLES:
+                cur.execute(
+                    f"CREATE TABLE {BENCH_SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL);"
+                )
+            cur.execute(
+                f"""
+                INSERT INTO {BENCH_SCHEMA}.TASK_EVENT
+                    (event_id, owner_id, venue_id, event_date, start_hour, end_hour,
+                     capacity, duration_hours, status, title)
+                SELECT g, 1, 1, CURRENT_DATE + 7, 9, 11, %s, 2, 'Planned', '熱門任務 ' || g
+                FROM generate_series(1, %s) g;
+                """,
+                (capacity, events),
+            )
+
+
+def teardown() -> None:
+    with psycopg.connect(**DB_CONFIG) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+
+
+def check(events: int, capacity: int, signups: int) -> str:
+    """確認沒有超額、計數欄位和實際筆數一致、每個人恰好在報名或候補其中之一"""
+    with psycopg.connect(**DB_CONFIG) as conn:
+        conn.execute(f"SET search_path TO {BENCH_SCHEMA};")
+        rows = conn.execute(
+            """
+            SELECT e.event_id, e.capacity, e.active_count, e.waitlist_count,
+                   (SELECT COUNT(*) FROM PARTICIPATION p
+                    WHERE p.event_id = e.event_id AND p.status = 'Active'),
+                   (SELECT COUNT(*) FROM WAITLIST w WHERE w.event_id = e.event_id)
+            FROM TASK_EVENT e
+            ORDER BY e.event_id;
+            """
+        ).fetchall()
+    per_event = signups // events
+    for event_id, cap, active_count, waitlist_count, active, waiting in rows:
+        if active > cap:
+            return f"任務 {event_id} 超額：{active}/{cap}"
+        if (active_count, waitlist_count) != (active, waiting):
+            return f"任務 {event_id} 計數不一致"
+        if active != min(capacity, per_event) or active + waiting != per_event:
+            return f"任務 {event_id} 人數不對：{active} + {waiting}"
+    return "OK"
+
+
+def run(
+    mode: str, events: int, capacity: int, signups: int, threads: int, owners: int = 0
+) -> Dict:
+    setup(events, capacity)
+    batcher = SignupBatcher()
+    actors = EventActors({**DB_CONFIG, "options": f"-c search_path={BENCH_SCHEMA}"})
+    if mode == "actors":
+        actors.start(owners)
+    # 第 i 筆報名：user_id = i，任務輪流分配
+    jobs = iter(range(signups))
+    jobs_lock = threading.Lock()
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    def join(user_id: int, event_id: int, conn) -> None:
+        if mode == "group":
+            batcher.join(user_id, event_id, conn)
+        elif mode == "actors":
+            actors.join(user_id, event_id)
+        else:
+            join_task(user_id, event_id, conn=conn)
+        conn.commit()
+
+    def worker() -> None:
+        with psycopg.connect(**DB_CONFIG, options=f"-c search_path={BENCH_SCHEMA}") as conn:
+            while True:
+                with jobs_lock:
+                    i = next(jobs, None)
+                if i is None:
+                    return
+                started = time.perf_counter()
+                try:
+                    join(i + 1, i % events + 1, conn)
+                except Exception as e:
+                    conn.rollback()
+                    errors.append(str(e))
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    actors.stop()
+    try:
+        result = check(events, capacity, signups) if not errors else f"{len(errors)} 筆失敗：{errors[0]}"
+    finally:
+        teardown()
+    latencies.sort()
+    return {
+        "per_sec": signups / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "avg_batch": {
+            "group": batcher.stats()["avg_batch"],
+            "actors": actors.stats()["avg_ops_per_tx"],
+        }.get(mode, 1),
+        "check": result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="join_task contention benchmark")
+    parser.add_argument("--events", type=int, default=1, help="同時開放報名的任務數")
+    parser.add_argument("--capacity", type=int, default=200, help="每個任務的名額")
+    parser.add_argument("--signups", type=int, default=2000, help="總報名筆數（平均分到各任務）")
+    parser.add_argument("--threads", type=int, nargs="*", default=[16, 64])
+    parser.add_argument("--owners", type=int, nargs="*", default=[4], help="actors 模式的 owner 數")
+    args = parser.parse_args()
+
+    print(
+        f"=== {args.events} 個任務 × 名額 {args.capacity}，共 {args.signups} 筆報名 ==="
+    )
+    print(f"{'模式':<8}{'threads':>8}{'筆/秒':>10}{'p50 ms':>9}{'p99 ms':>9}{'平均批次':>9}  檢查")
+    for threads in args.threads:
+        modes = [("direct", 0), ("group", 0)] + [("actors", n) for n in args.owners]
+        for mode, owners in modes:
+            r = run(mode, args.events, args.capacity, args.signups, threads, owners)
+            label = f"{mode}×{owners}" if owners else mode
+            print(
+                f"{label:<10}{threads:>6}{r['per_sec']:>10.0f}{r['p50_ms']:>9.2f}"
+                f"{r['p99_ms']:>9.2f}{r['avg_batch']:>9}  {r['check']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
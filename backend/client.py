@@ -1,28 +1,18 @@
 # backend/client.py
 import socket
-import json
 from datetime import date
 
+from protocol import ClientChannel
+
 HOST = "127.0.0.1"
 PORT = 5050
 
 
-def send_request(sock: socket.socket, action: str, params: dict):
-    req = {"action": action, "params": params}
-    sock.sendall((json.dumps(req) + "\n").encode("utf-8"))
-    # 單行 response，累積到換行（避免 4096 bytes 剪斷 JSON）
-    buf = ""
-    while True:
-        chunk = sock.recv(4096)
-        if not chunk:
-            print("[ERROR] 與伺服器連線中斷")
-            return None
-        buf += chunk.decode("utf-8")
-        if "\n" in buf:
-            line, _ = buf.split("\n", 1)
-            line = line.strip()
-            break
-    resp = json.loads(line)
+def send_request(channel: ClientChannel, action: str, params: dict):
+    resp = channel.request({"action": action, "params": params})
+    if resp is None:
+        print("[ERROR] 與伺服器連線中斷")
+        return None
     if resp.get("status") != "ok":
         msg = resp.get("message", "unknown error")
         print(f"[ERROR] {msg}")
@@ -30,6 +20,56 @@ def send_request(sock: socket.socket, action: str, params: dict):
     return resp.get("data")
 
 
+def stream_request(channel: ClientChannel, action: str, params: dict):
+    """串流模式：server 邊讀邊送，這裡逐筆產出資料列；發生錯誤時印出訊息後結束"""
+    for resp in channel.stream({"action": action, "params": {**params, "stream": True}}):
+        if resp.get("status") != "ok":
+            print(f"[ERROR] {resp.get('message', 'unknown error')}")
+            return
+        yield from resp.get("data") or []
+
+
+def parse_skill_weights(sw_str: str) -> dict:
+    """把 'First Aid:2,Logistics:1' 轉成 {技能: 權重}"""
+    skill_weights = {}
+    if sw_str:
+        for pair in sw_str.split(","):
+            if ":" in pair:
+                name, w = pair.split(":", 1)
+                skill_weights[name.strip()] = int(w.strip())
+    return skill_weights
+
+
+def parse_date_range(text: str):
+    """'2025-01-01' 或 '2025-01-01~2025-01-07' 轉成 (date_from, date_to)；格式錯誤回傳 None"""
+    parts = [t.strip() for t in text.split("~")]
+    if len(parts) > 2:
+        return None
+    try:
+        dates = [date.fromisoformat(t).isoformat() if t else "" for t in parts]
+    except ValueError:
+        return None
+    return dates[0], dates[-1]
+
+
+def parse_hour_range(text: str):
+    """'9-15' 轉成 (9, 15)；格式錯誤回傳 None"""
+    try:
+        start, end = (int(t) for t in text.split("-", 1))
+    except ValueError:
+        return None
+    return start, end
+
+
+def parse_weekdays(text: str):
+    """'6,7' 轉成 [6, 7]（1 = 週一 … 7 = 週日）；格式錯誤回傳 None"""
+    try:
+        days = [int(t) for t in text.replace("，", ",").split(",") if t.strip()]
+    except ValueError:
+        return None
+    return days if all(1 <= d <= 7 for d in days) else None
+
+
 def show_tasks(tasks):
     if not tasks:
         print("目前沒有符合條件的任務。")
@@ -39,11 +79,12 @@ def show_tasks(tasks):
         time_str = ""
         if "start_hour" in t and "end_hour" in t:
             time_str = f"{t['start_hour']}:00-{t['end_hour']}:00 "
+        score_str = f"  契合度: {t['match_score']}" if "match_score" in t else ""
         print(
             f"Event {t['event_id']}: {t['title']}  "
             f"日期: {t['date']} {time_str} 地點: {t['venue']}  "
             f"名額: {t['active_volunteers']}/{t['capacity']}  "
-            f"剩餘: {t['slots_left']}"
+            f"剩餘: {t['slots_left']}{score_str}"
         )
     print("==============\n")
 
@@ -62,7 +103,7 @@ def show_history(history):
     print("==============\n")
 
 
-def organizer_menu(sock, user_id):
+def organizer_menu(channel, user_id):
     while True:
         print("\n=== Organizer 主選單 ===")
         print("1) 建立場地")
@@ -75,7 +116,10 @@ def organizer_menu(sock, user_id):
         print("8) 查看場地列表")
         print("9) 查看技能列表")
         print("10) 檢查場地時段可用性")
-        print("11) 返回")
+        print("11) 批次排班")
+        print("12) 匯入報名名單")
+        print("13) 批次取消報名")
+        print("14) 返回")
         cmd = input("請輸入選項: ").strip()
 
         if cmd == "1":
@@ -83,7 +127,7 @@ def organizer_menu(sock, user_id):
             address = input("地址: ").strip()
             capacity = input("容量: ").strip()
             data = send_request(
-                sock,
+                channel,
                 "create_venue",
                 {
                     "user_id": user_id,
@@ -99,7 +143,7 @@ def organizer_menu(sock, user_id):
             org_name = input("主辦單位名稱: ").strip()
             contact_email = input("聯絡 email: ").strip()
             data = send_request(
-                sock,
+                channel,
                 "create_org",
                 {
                     "user_id": user_id,
@@ -118,29 +162,54 @@ def organizer_menu(sock, user_id):
             capacity = input("名額上限: ").strip()
             title = input("標題: ").strip()
             description = input("描述: ").strip()
-            data = send_request(
-                sock,
-                "create_event",
+            print("所需技能（可留空），格式: SkillName:Weight，多個以逗號分隔，如 First Aid:2,Logistics:1")
+            skill_weights = parse_skill_weights(input("技能清單: ").strip())
+            # 建任務、設定時段、設定技能一次送出，同一個交易內完成（任一步失敗就全部不生效）
+            requests = [
                 {
-                    "user_id": user_id,
-                    "venue_id": venue_id,
-                    "start_hour": start_hour,
-                    "end_hour": end_hour,
-                    "event_date": event_date,
-                    "capacity": capacity,
-                    "title": title,
-                    "description": description,
+                    "action": "create_event",
+                    "params": {
+                        "user_id": user_id,
+                        "venue_id": venue_id,
+                        "start_hour": start_hour,
+                        "end_hour": end_hour,
+                        "event_date": event_date,
+                        "capacity": capacity,
+                        "title": title,
+                        "description": description,
+                    },
                 },
-            )
+                {
+                    "action": "set_event_periods",
+                    "params": {
+                        "user_id": user_id,
+                        "event_id": {"$ref": "0.event_id"},
+                        "start_hour": start_hour,
+                        "end_hour": end_hour,
+                    },
+                },
+            ]
+            if skill_weights:
+                requests.append(
+                    {
+                        "action": "set_required_skills",
+                        "params": {
+                            "user_id": user_id,
+                            "event_id": {"$ref": "0.event_id"},
+                            "skill_weights": skill_weights,
+                        },
+                    }
+                )
+            data = send_request(channel, "batch", {"requests": requests, "atomic": True})
             if data:
-                print(f"✅ 任務建立成功，event_id = {data['event_id']}")
+                print(f"✅ 任務建立成功，event_id = {data[0]['data']['event_id']}")
 
         elif cmd == "4":
             event_id = input("event_id: ").strip()
             start_hour = input("開始時間(0-23): ").strip()
             end_hour = input("結束時間(1-23): ").strip()
             data = send_request(
-                sock,
+                channel,
                 "set_event_periods",
                 {
                     "user_id": user_id,
@@ -155,15 +224,9 @@ def organizer_menu(sock, user_id):
         elif cmd == "5":
             event_id = input("event_id: ").strip()
             print("輸入技能與權重，格式: SkillName:Weight，多個以逗號分隔，如 First Aid:2,Logistics:1")
-            sw_str = input("技能清單: ").strip()
-            skill_weights = {}
-            if sw_str:
-                for pair in sw_str.split(","):
-                    if ":" in pair:
-                        name, w = pair.split(":", 1)
-                        skill_weights[name.strip()] = int(w.strip())
+            skill_weights = parse_skill_weights(input("技能清單: ").strip())
             data = send_request(
-                sock,
+                channel,
                 "set_required_skills",
                 {
                     "user_id": user_id,
@@ -175,7 +238,7 @@ def organizer_menu(sock, user_id):
                 print("✅ 已設定所需技能")
 
         elif cmd == "6":
-            data = send_request(sock, "list_my_events", {"user_id": user_id})
+            data = send_request(channel, "list_my_events", {"user_id": user_id})
             if data is not None:
                 print("\n=== 我的任務列表 ===")
                 for e in data:
@@ -189,22 +252,20 @@ def organizer_menu(sock, user_id):
 
         elif cmd == "7":
             event_id = input("event_id: ").strip()
-            data = send_request(
-                sock,
+            print("\n=== 報名名單 ===")
+            for p in stream_request(
+                channel,
                 "get_event_participants",
                 {"user_id": user_id, "event_id": event_id},
-            )
-            if data is not None:
-                print("\n=== 報名名單 ===")
-                for p in data:
-                    print(
-                        f"{p['user_id']} | {p['user_name']} | {p['email']} | "
-                        f"{p['phone']} | {p['role']} | {p['status']} | {p['join_time']}"
-                    )
-                print("==============\n")
+            ):
+                print(
+                    f"{p['user_id']} | {p['user_name']} | {p['email']} | "
+                    f"{p['phone']} | {p['role']} | {p['status']} | {p['join_time']}"
+                )
+            print("==============\n")
 
         elif cmd == "8":
-            data = send_request(sock, "list_venues", {})
+            data = send_request(channel, "list_venues", {})
             if data is not None:
                 print("\n=== 場地列表 ===")
                 for v in data:
@@ -214,7 +275,7 @@ def organizer_menu(sock, user_id):
                 print("==============\n")
 
         elif cmd == "9":
-            data = send_request(sock, "list_skills", {})
+            data = send_request(channel, "list_skills", {})
             if data is not None:
                 print("\n=== 技能列表 ===")
                 for s in data:
@@ -236,7 +297,7 @@ def organizer_menu(sock, user_id):
                 print("日期格式錯誤，請用 YYYY-MM-DD")
                 continue
             data = send_request(
-                sock,
+                channel,
                 "check_venue_availability",
                 {
                     "user_id": user_id,
@@ -257,14 +318,59 @@ def organizer_menu(sock, user_id):
                         )
 
         elif cmd == "11":
+            raw = input("要排班的 event_id（逗號分隔，留空表示所有未開始的任務）: ").strip()
+            payload = {"user_id": user_id}
+            if raw:
+                payload["event_ids"] = [x.strip() for x in raw.split(",") if x.strip()]
+            data = send_request(channel, "staff_events", payload)
+            if data is None:
+                continue
+            stats = data["stats"]
+            print(
+                f"\n試算結果：{stats['events']} 個任務、可排 {stats['assigned']} 人次，"
+                f"契合度總和 {stats['total_score']}（耗時 {stats['total_s']} 秒）"
+            )
+            for e in data["events"]:
+                print(f"Event {e['event_id']}: 排入 {e['assigned']} 人，剩餘名額 {e['slots_left']}")
+            if stats["assigned"] and input("確定寫入報名資料？(y/N): ").strip().lower() == "y":
+                payload["apply"] = True
+                data = send_request(channel, "staff_events", payload)
+                if data is not None:
+                    print(f"✅ 已排入 {data['stats']['assigned']} 人次")
+
+        elif cmd in ("12", "13"):
+            event_id = input("event_id: ").strip()
+            raw = input("志工 user_id（逗號分隔）: ").strip()
+            user_ids = [x.strip() for x in raw.split(",") if x.strip()]
+            if not event_id or not user_ids:
+                continue
+            data = send_request(
+                channel,
+                "bulk_join" if cmd == "12" else "bulk_cancel",
+                {"user_id": user_id, "event_id": event_id, "user_ids": user_ids},
+            )
+            if data is None:
+                continue
+            results = data if cmd == "12" else data["results"]
+            counts = {}
+            for r in results:
+                counts[r["result"]] = counts.get(r["result"], 0) + 1
+                print(f"User {r['user_id']}: {r['result']}")
+            print("小計：" + "、".join(f"{k} {v}" for k, v in counts.items()))
+            if cmd == "13" and data["promoted"]:
+                print(f"候補遞補：{', '.join(map(str, data['promoted']))}")
+
+        elif cmd == "14":
             break
         else:
             print("無效的選項，請重新輸入。")
 
 
 def main():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.connect((HOST, PORT))
+    with socket.create_connection((HOST, PORT)) as sock:
+        channel = ClientChannel(sock)
+        # 改用長度前綴的二進位 frame（server 不支援就維持 JSON 行）
+        channel.negotiate()
         print("已連線到伺服器。")
 
         # 先決定 user 身分
@@ -281,7 +387,7 @@ def main():
             user_name = input("帳號（user_name）: ").strip()
             password = input("密碼: ").strip()
             data = send_request(
-                sock,
+                channel,
                 "login",
                 {"user_name": user_name, "password": password},
             )
@@ -306,7 +412,7 @@ def main():
             else:
                 role = "Volunteer"
             data = send_request(
-                sock,
+                channel,
                 "register_user",
                 {
                     "user_name": user_name,
@@ -343,9 +449,11 @@ def main():
                         "5) 志工：查看歷史紀錄",
                         "6) 志工：查看已報名的任務",
                         "7) 志工：更新個人資料",
+                        "8) 志工：設定技能等級",
+                        "9) 志工：推薦任務",
                     ]
                 )
-            next_idx = 8 if is_volunteer else 1
+            next_idx = 10 if is_volunteer else 1
             org_option = None
             if is_organizer:
                 org_option = next_idx
@@ -357,19 +465,32 @@ def main():
             cmd = input("請輸入選項: ").strip()
 
             if is_volunteer and cmd == "1":
-                # 搜尋條件
-                date_str = input("日期 (YYYY-MM-DD，或直接 Enter 略過): ").strip()
-                if not date_str:
-                    event_date = ""
-                else:
-                    # 粗略檢查格式
-                    try:
-                        date.fromisoformat(date_str)
-                    except ValueError:
+                # 搜尋條件：日期可給單日或區間，一次查完，不用逐日詢問
+                date_from = date_to = ""
+                date_str = input(
+                    "日期 (YYYY-MM-DD 或 YYYY-MM-DD~YYYY-MM-DD，Enter 略過): "
+                ).strip()
+                if date_str:
+                    date_range = parse_date_range(date_str)
+                    if date_range is None:
                         print("日期格式錯誤，將忽略日期條件。")
-                        event_date = ""
                     else:
-                        event_date = date_str
+                        date_from, date_to = date_range
+                hour_from = hour_to = ""
+                hour_str = input("時段 (例如 9-15，Enter 略過): ").strip()
+                if hour_str:
+                    hour_range = parse_hour_range(hour_str)
+                    if hour_range is None:
+                        print("時段格式錯誤，將忽略時段條件。")
+                    else:
+                        hour_from, hour_to = hour_range
+                weekdays = []
+                weekday_str = input("星期 (1=週一 … 7=週日，例如 6,7，Enter 略過): ").strip()
+                if weekday_str:
+                    weekdays = parse_weekdays(weekday_str)
+                    if weekdays is None:
+                        print("星期格式錯誤，將忽略星期條件。")
+                        weekdays = []
 
                 loc = input("地點關鍵字 (Enter 略過): ").strip()
                 title_kw = input("任務名稱關鍵字 (Enter 略過): ").strip()
@@ -378,10 +499,14 @@ def main():
                 only_avail = not (only_avail_str == "n")
 
                 data = send_request(
-                    sock,
+                    channel,
                     "search_tasks",
                     {
-                        "event_date": event_date,
+                        "date_from": date_from,
+                        "date_to": date_to,
+                        "hour_from": hour_from,
+                        "hour_to": hour_to,
+                        "weekdays": weekdays,
                         "location_keyword": loc,
                         "title_keyword": title_kw,
                         "skill_keyword": skill,
@@ -413,7 +538,7 @@ def main():
                 title_kw = input("任務名稱關鍵字 (Enter 略過): ").strip()
                 skill = input("技能關鍵字 (Enter 略過): ").strip()
                 data = send_request(
-                    sock,
+                    channel,
                     "search_tasks",
                     {
                         "event_date": event_date,
@@ -436,7 +561,7 @@ def main():
                 if not event_id:
                     continue
                 data = send_request(
-                    sock,
+                    channel,
                     "join_task",
                     {"user_id": user_id, "event_id": event_id},
                 )
@@ -445,7 +570,9 @@ def main():
                     if result == "joined":
                         print("✅ 報名成功！")
                     elif result == "waitlisted":
-                        print("⚠ 名額已滿，你已被加入候補。")
+                        print(
+                            f"⚠ 名額已滿，你已被加入候補（第 {data['position']} 位 / 共 {data['waitlist']} 人）。"
+                        )
                     else:
                         print("未知結果：", result)
 
@@ -454,7 +581,7 @@ def main():
                 if not event_id:
                     continue
                 data = send_request(
-                    sock,
+                    channel,
                     "cancel_participation",
                     {"user_id": user_id, "event_id": event_id},
                 )
@@ -465,12 +592,12 @@ def main():
                         print("⚠ 查無報名紀錄。")
 
             elif is_volunteer and cmd == "5":
-                data = send_request(sock, "get_user_history", {"user_id": user_id})
+                data = send_request(channel, "get_user_history", {"user_id": user_id})
                 if data is not None:
                     show_history(data)
 
             elif is_volunteer and cmd == "6":
-                data = send_request(sock, "get_user_active_participation", {"user_id": user_id})
+                data = send_request(channel, "get_user_active_participation", {"user_id": user_id})
                 if data is not None:
                     print("\n=== 已報名任務 ===")
                     if not data:
@@ -497,12 +624,30 @@ def main():
                     payload["phone"] = new_phone
                 if new_pw:
                     payload["password"] = new_pw
-                data = send_request(sock, "update_profile", payload)
+                data = send_request(channel, "update_profile", payload)
                 if data is not None:
                     print("✅ 已更新個人資料")
 
+            elif is_volunteer and cmd == "8":
+                skill_name = input("技能名稱（例如 First Aid）: ").strip()
+                level = input("等級(1~5): ").strip()
+                if not skill_name or not level:
+                    continue
+                data = send_request(
+                    channel,
+                    "set_user_skill",
+                    {"user_id": user_id, "skill_name": skill_name, "level": level},
+                )
+                if data is not None:
+                    print("✅ 已設定技能等級")
+
+            elif is_volunteer and cmd == "9":
+                data = send_request(channel, "recommend_tasks", {"user_id": user_id})
+                if data is not None:
+                    show_tasks(data)
+
             elif is_organizer and org_option and cmd == str(org_option):
-                organizer_menu(sock, user_id)
+                organizer_menu(channel, user_id)
 
             elif cmd == str(next_idx):
                 print("再見～")
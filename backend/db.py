@@ -1,5 +1,15 @@
+import atexit
+import contextvars
+import itertools
+import threading
 import psycopg
 from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:  # 沒裝 psycopg_pool 就退回每次直接連線
+    ConnectionPool = None
 
 DB_CONFIG = {
     "dbname": "micro_volunteer",
@@ -9,9 +19,98 @@ DB_CONFIG = {
     "port": 5432
 }
 
+# 連線池設定（需要 psycopg_pool：pip install "psycopg[pool]"）
+POOL_CONFIG = {
+    "enabled": True,
+    "min_size": 2,          # 常駐連線數
+    "max_size": 20,         # 連線數上限
+    "max_lifetime": 1800,   # 秒，連線用超過這個時間就換新的
+    "max_idle": 300,        # 秒，多於 min_size 的閒置連線超過這個時間就關掉
+    "timeout": 10,          # 秒，取得連線最多等多久（超過丟 PoolTimeout）
+    "check": True,          # 借出前先做健康檢查，避免拿到已斷線的連線
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_stream_ids = itertools.count(1)
+
+# 目前 request 的統計（由 request_scope 設定；不在 request 內時為 None）
+_request_stats: contextvars.ContextVar = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+class CountingCursor(psycopg.Cursor):
+    """在 request_scope 內執行的 SQL 都會被計數，方便確認一個 request 打了幾次 DB"""
+
+    def execute(self, query, params=None, **kwargs):
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["queries"] += 1
+        return super().execute(query, params, **kwargs)
+
+    def executemany(self, query, params_seq, **kwargs):
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["queries"] += 1
+        return super().executemany(query, params_seq, **kwargs)
+
+
+_CONNECT_KWARGS = {**DB_CONFIG, "cursor_factory": CountingCursor}
+
+
+def get_pool():
+    """取得（必要時建立）全域連線池；未啟用或未安裝 psycopg_pool 時回傳 None"""
+    global _pool
+    if _pool is None and POOL_CONFIG["enabled"] and ConnectionPool is not None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    kwargs=_CONNECT_KWARGS,
+                    min_size=POOL_CONFIG["min_size"],
+                    max_size=POOL_CONFIG["max_size"],
+                    max_lifetime=POOL_CONFIG["max_lifetime"],
+                    max_idle=POOL_CONFIG["max_idle"],
+                    timeout=POOL_CONFIG["timeout"],
+                    check=ConnectionPool.check_connection if POOL_CONFIG["check"] else None,
+                    name="micro_volunteer",
+                    open=True,
+                )
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(close_pool)
+
+
+def pool_stats() -> Dict:
+    """連線池統計（給 admin 看），包含設定值與 psycopg_pool 的計數器"""
+    pool = get_pool()
+    if pool is None:
+        return {"enabled": False}
+    stats = dict(pool.get_stats())
+    stats["enabled"] = True
+    stats["config"] = dict(POOL_CONFIG)
+    return stats
+
+
 @contextmanager
 def get_conn():
-    conn = psycopg.connect(**DB_CONFIG)
+    pool = get_pool()
+    if pool is not None:
+        # 離開時成功就 commit、失敗就 rollback，然後把連線還給 pool
+        with pool.connection() as conn:
+            yield conn
+        return
+
+    conn = psycopg.connect(**_CONNECT_KWARGS)
     try:
         yield conn
         conn.commit()
@@ -19,4 +118,105 @@ def get_conn():
         conn.rollback()
         raise
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+@contextmanager
+def use_conn(conn: Optional[psycopg.Connection] = None):
+    """
+    有傳入 conn（例如 request 共用的交易）就直接沿用，不 commit 也不關閉；
+    沒傳就照舊自己借一條連線，結束時 commit
+    """
+    if conn is not None:
+        yield conn
+        return
+    with get_conn() as own_conn:
+        yield own_conn
+
+
+def stream_rows(
+    sql: str,
+    params: Sequence = (),
+    chunk_size: int = 500,
+    conn: Optional[psycopg.Connection] = None,
+) -> Iterator[List[Tuple]]:
+    """
+    以 server-side named cursor 逐批讀取查詢結果，每次 yield 最多 chunk_size 筆，
+    不論結果多大，記憶體內只會有一批資料（需在交易內使用，request 的連線即可）
+    """
+    with use_conn(conn) as conn:
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["queries"] += 1
+        with conn.cursor(name=f"stream_{next(_stream_ids)}") as cur:
+            cur.itersize = chunk_size
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+
+@contextmanager
+def request_scope():
+    """
+    一個 request 只借一條連線、只跑一個交易：
+    yield (conn, stats)，離開時整批 commit（例外則 rollback），
+    stats["queries"] 為這個 request 執行過的 SQL 數
+    """
+    stats = {"queries": 0, "after_commit": []}
+    with get_conn() as conn:
+        token = _request_stats.set(stats)
+        try:
+            yield conn, stats
+        finally:
+            _request_stats.reset(token)
+    # 到這裡交易已經 commit
+    for callback in stats["after_commit"]:
+        try:
+            callback()
+        except Exception as e:
+            print(f"[DB] after_commit callback failed: {e}")
+
+
+def request_query_count() -> int:
+    """目前 request 到現在為止執行過的 SQL 數（不在 request 內為 0）"""
+    stats = _request_stats.get()
+    return stats["queries"] if stats is not None else 0
+
+
+def run_in_savepoint(conn: psycopg.Connection, func: Callable[[], Dict]) -> Dict:
+    """
+    在目前 request 的交易內以 SAVEPOINT 包住 func：
+    func 回傳的 status 不是 ok（或丟出例外）時只 rollback 到 savepoint，
+    同時丟掉這段期間登記的 after_commit，交易中其他已完成的寫入不受影響
+    """
+    stats = _request_stats.get()
+    mark = len(stats["after_commit"]) if stats is not None else 0
+    with conn.cursor() as cur:
+        cur.execute("SAVEPOINT request_item;")
+    resp = None
+    try:
+        resp = func()
+    finally:
+        with conn.cursor() as cur:
+            if resp is not None and resp.get("status") == "ok":
+                cur.execute("RELEASE SAVEPOINT request_item;")
+            else:
+                cur.execute("ROLLBACK TO SAVEPOINT request_item;")
+                if stats is not None:
+                    del stats["after_commit"][mark:]
+    return resp
+
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """
+    等目前 request 的交易 commit 成功後才執行 callback（例如更新記憶體中的排程）；
+    不在 request_scope 內就立刻執行。交易 rollback 時呼叫端要清掉 stats["after_commit"]
+    """
+    stats = _request_stats.get()
+    if stats is None:
+        callback()
+    else:
+        stats["after_commit"].append(callback)
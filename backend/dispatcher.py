@@ -0,0 +1,248 @@
+# backend/dispatcher.py
+# action 註冊表：每個 action 宣告參數格式與所需角色，dispatch 直接查 dict（O(1)），
+# 並記錄每個 action 的呼叫次數、錯誤次數與延遲分佈
+import threading
+import time
+from bisect import bisect_left
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg import Connection
+
+from db import after_commit, request_query_count
+from sessions import sessions
+
+# 延遲分佈的桶（毫秒，上界）；最後一桶為超過最大值
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+class ActionMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.queries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, elapsed_ms: float, ok: bool, queries: int = 0) -> None:
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.errors += 1
+            self.queries += queries
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            histogram = {
+                f"<={bound}ms": count
+                for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)
+            }
+            histogram[f">{LATENCY_BUCKETS_MS[-1]}ms"] = self.buckets[-1]
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0,
+                "max_ms": round(self.max_ms, 3),
+                "avg_queries": round(self.queries / self.calls, 2) if self.calls else 0,
+                "histogram": histogram,
+            }
+
+
+class Action:
+    def __init__(
+        self,
+        name: str,
+        handler: Callable,
+        params: Dict[str, Any],
+        role: Optional[str],
+        role_message: Optional[str],
+        login: bool,
+    ):
+        self.name = name
+        self.handler = handler
+        self.params = params
+        self.role = role
+        self.role_message = role_message
+        # 有宣告 role 的 action 一定要登入
+        self.login = login or role is not None
+        self.metrics = ActionMetrics()
+
+
+ACTIONS: Dict[str, Action] = {}
+
+
+def action(
+    name: str,
+    params: Optional[Dict[str, Any]] = None,
+    role: Optional[str] = None,
+    role_message: Optional[str] = None,
+    login: bool = False,
+):
+    """
+    註冊 action handler 的 decorator
+      - params: 參數名稱 -> 型別（必填），或 (型別, 預設值)（選填）
+      - role: 需要的角色；會以 params 裡的 user_id 對照登入的 session
+      - login: 不需特定角色，但 user_id 必須是登入者本人
+    handler 簽名為 handler(ctx, p)，p 為轉型後的參數
+    """
+
+    def decorator(func: Callable) -> Callable:
+        if name in ACTIONS:
+            raise ValueError(f"action 重複註冊: {name}")
+        ACTIONS[name] = Action(name, func, params or {}, role, role_message, login)
+        return func
+
+    return decorator
+
+
+def _coerce(kind: Any, value: Any) -> Any:
+    if kind is date:
+        return value if isinstance(value, date) else date.fromisoformat(value)
+    if kind is list:
+        return list(value)
+    if kind is dict:
+        return dict(value)
+    if kind is bool:
+        # bool("false") 是 True：字串要明確解析，其他型別只接受 bool 與 0/1
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in ("1", "true", "yes"):
+                return True
+            if text in ("0", "false", "no"):
+                return False
+            raise ValueError(value)
+        if isinstance(value, bool) or value in (0, 1):
+            return bool(value)
+        raise ValueError(value)
+    return kind(value)
+
+
+def parse_params(schema: Dict[str, Any], raw: Dict) -> Dict:
+    """依宣告的格式把 client 傳來的參數轉型；選填參數沒給或空字串時用預設值"""
+    parsed: Dict[str, Any] = {}
+    for name, spec in schema.items():
+        value = raw.get(name)
+        if isinstance(spec, tuple):
+            kind, default = spec
+            if value is None or value == "":
+                parsed[name] = default
+                continue
+        else:
+            kind = spec
+            if value is None or value == "":
+                raise ValueError(f"缺少參數: {name}")
+        try:
+            parsed[name] = _coerce(kind, value)
+        except (TypeError, ValueError):
+            raise ValueError(f"參數格式錯誤: {name}") from None
+    return parsed
+
+
+class RequestContext:
+    """
+    handler 可用的 request 狀態：共用連線、這條 TCP 連線的狀態與登入的 session；
+    emit 不為 None 時可在最終 response 之前先送出部分結果（串流模式）；
+    nested 為 True 表示是 batch 內的子請求（交易由外層的 batch 控制）
+    """
+
+    def __init__(
+        self,
+        conn: Connection,
+        conn_state: Dict,
+        raw_params: Dict,
+        emit: Optional[Callable[[Dict], None]] = None,
+        nested: bool = False,
+    ):
+        self.conn = conn
+        self.conn_state = conn_state
+        self.session = conn_state.get("session")
+        self.token = raw_params.get("token")
+        self.emit = emit
+        self.nested = nested
+
+    def require_login(self, user_id: int) -> Optional[Dict]:
+        """確認這條連線已登入，而且 user_id 就是登入者本人（不再相信 client 傳的 user_id）"""
+        if self.session is None:
+            return {"status": "error", "message": "請先登入。"}
+        if user_id != self.session.user_id or (
+            self.token is not None and self.token != self.session.token
+        ):
+            return {"status": "error", "message": "身分驗證失敗，請重新登入。"}
+        return None
+
+    def require_role(
+        self, user_id: int, role: str, message: Optional[str] = None
+    ) -> Optional[Dict]:
+        err = self.require_login(user_id)
+        if err:
+            return err
+        # 角色快取在 session 裡，只有被 admin 改過角色時才會重查 DB
+        if not sessions.has_role(self.session, role, conn=self.conn):
+            return {"status": "error", "message": message or f"需具備 {role} 身分才能執行。"}
+        return None
+
+    def start_session(self, user_id: int, user_name: str, roles: List[str]) -> str:
+        sessions.drop(self.conn_state.get("session"))
+        new_session = sessions.create(user_id, user_name, roles)
+        conn_state = self.conn_state
+        # 交易 commit 後才把 session 綁到連線上
+        after_commit(lambda: conn_state.__setitem__("session", new_session))
+        return new_session.token
+
+    def end_session(self) -> None:
+        sessions.drop(self.session)
+        self.conn_state.pop("session", None)
+        self.session = None
+
+
+def dispatch(
+    name: str,
+    raw_params: Dict,
+    conn: Connection,
+    conn_state: Optional[Dict] = None,
+    emit: Optional[Callable[[Dict], None]] = None,
+    nested: bool = False,
+) -> Dict:
+    """查表執行 action，並記錄延遲/錯誤；conn 為 request 共用的連線（不在這裡 commit）"""
+    spec = ACTIONS.get(name)
+    if spec is None:
+        return {"status": "error", "message": f"Unknown action: {name}"}
+    if conn_state is None:
+        conn_state = {}
+
+    started = time.perf_counter()
+    queries_before = request_query_count()
+    resp: Dict = {"status": "error"}
+    try:
+        ctx = RequestContext(conn, conn_state, raw_params, emit, nested)
+        p = parse_params(spec.params, raw_params)
+        err = None
+        if spec.role is not None:
+            err = ctx.require_role(p["user_id"], spec.role, spec.role_message)
+        elif spec.login:
+            err = ctx.require_login(p["user_id"])
+        resp = err or spec.handler(ctx, p)
+        return resp
+    except Exception as e:
+        # 任何例外丟回去（由呼叫端 rollback）
+        resp = {"status": "error", "message": str(e)}
+        return resp
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        spec.metrics.record(
+            elapsed_ms, resp.get("status") == "ok", request_query_count() - queries_before
+        )
+
+
+def metrics_snapshot() -> Dict[str, Dict]:
+    """所有被呼叫過的 action 的統計"""
+    return {
+        name: spec.metrics.snapshot()
+        for name, spec in sorted(ACTIONS.items())
+        if spec.metrics.calls
+    }
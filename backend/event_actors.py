@@ -0,0 +1,212 @@
+# backend/event_actors.py
+# 報名/取消的 actor 模式：依 event_id 的一致性雜湊把 join_task / cancel_participation
+# 分給固定的 owner thread，同一個任務的操作只會由同一個 owner 依到達順序執行，
+# 不同任務分散在各個 owner 上平行處理。
+#   - 每個 owner 有自己的 DB 連線，一次取出佇列中所有操作，在同一個交易內做完再 commit
+#     （同任務連續的報名合併成一次 join_task_batch），commit 之後才回覆 request
+#   - 同一個任務只有一個寫入者，TASK_EVENT 的列鎖不會再有人排隊；鎖仍照常取得，
+#     所以 batch action、批次排班等不經過 owner 的寫入一樣安全
+#   - 一致性雜湊（每個 owner VNODES 個虛擬節點）：owner 數改變時只有約 1/N 的任務換 owner
+# server 以 --event-owners N 開啟；其他 action 照舊在任一 handler thread 上執行
+import bisect
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+import psycopg
+
+from db import DB_CONFIG
+from volunteer import cancel_participation, join_task_batch
+
+VNODES = 128
+
+
+class _Op:
+    __slots__ = ("kind", "user_id", "event_id", "done", "result", "error")
+
+    def __init__(self, kind: str, user_id: int, event_id: int):
+        self.kind = kind  # "join" / "cancel"
+        self.user_id = user_id
+        self.event_id = event_id
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[Exception] = None
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class _Owner:
+    def __init__(self, index: int):
+        self.index = index
+        self.queue: List[_Op] = []
+        self.cond = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.ops = 0
+        self.transactions = 0
+        self.retries = 0
+
+
+class EventActors:
+    def __init__(self, connect_kwargs: Optional[Dict] = None):
+        self.connect_kwargs = connect_kwargs or DB_CONFIG
+        self._owners: List[_Owner] = []
+        self._ring: List[int] = []
+        self._ring_owner: List[int] = []
+        self._stopped = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._owners) and not self._stopped
+
+    # ---------- 對外 API ----------
+
+    def start(self, owners: int) -> None:
+        if self._owners:
+            return
+        self._owners = [_Owner(i) for i in range(owners)]
+        points = sorted(
+            (_hash(f"owner-{i}-{v}"), i) for i in range(owners) for v in range(VNODES)
+        )
+        self._ring = [point for point, _ in points]
+        self._ring_owner = [owner for _, owner in points]
+        for owner in self._owners:
+            owner.thread = threading.Thread(
+                target=self._run, args=(owner,), name=f"event-owner-{owner.index}", daemon=True
+            )
+            owner.thread.start()
+
+    def stop(self) -> None:
+        """停止所有 owner；還在佇列中的操作以錯誤結束，不會讓 request 一直等下去"""
+        self._stopped = True
+        for owner in self._owners:
+            with owner.cond:
+                owner.cond.notify()
+
+    def owner_of(self, event_id: int) -> int:
+        """一致性雜湊：順時針找到的第一個虛擬節點所屬的 owner"""
+        i = bisect.bisect(self._ring, _hash(str(event_id))) % len(self._ring)
+        return self._ring_owner[i]
+
+    def join(self, user_id: int, event_id: int) -> str:
+        """回傳 'joined' / 'waitlisted'（已 commit）"""
+        return self._submit(_Op("join", user_id, event_id))
+
+    def cancel(self, user_id: int, event_id: int) -> bool:
+        """回傳值同 volunteer.cancel_participation（已 commit）"""
+        return self._submit(_Op("cancel", user_id, event_id))
+
+    def stats(self) -> Dict:
+        owners = []
+        for owner in self._owners:
+            with owner.cond:
+                owners.append(
+                    {
+                        "pending": len(owner.queue),
+                        "ops": owner.ops,
+                        "transactions": owner.transactions,
+                        "retries": owner.retries,
+                    }
+                )
+        ops = sum(o["ops"] for o in owners)
+        transactions = sum(o["transactions"] for o in owners)
+        return {
+            "owners": len(owners),
+            "ops": ops,
+            "transactions": transactions,
+            "avg_ops_per_tx": round(ops / transactions, 2) if transactions else 0,
+            "per_owner": owners,
+        }
+
+    # ---------- 內部 ----------
+
+    def _submit(self, op: _Op):
+        if not self.running:
+            raise RuntimeError("event actors 未啟動")
+        owner = self._owners[self.owner_of(op.event_id)]
+        with owner.cond:
+            # 在鎖內再確認一次：stop 之後放進佇列的操作不會再有人處理
+            if self._stopped:
+                raise RuntimeError("event actors 已停止")
+            owner.queue.append(op)
+            owner.cond.notify()
+        op.done.wait()
+        if op.error is not None:
+            raise op.error
+        return op.result
+
+    def _take(self, owner: _Owner) -> Optional[List[_Op]]:
+        with owner.cond:
+            while not self._stopped and not owner.queue:
+                owner.cond.wait()
+            if self._stopped:
+                for op in owner.queue:
+                    op.error = RuntimeError("event actors 已停止")
+                    op.done.set()
+                owner.queue = []
+                return None
+            ops, owner.queue = owner.queue, []
+            return ops
+
+    def _run(self, owner: _Owner) -> None:
+        conn = None
+        while True:
+            ops = self._take(owner)
+            if ops is None:
+                break
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg.connect(**self.connect_kwargs)
+                self._apply(conn, ops)
+                conn.commit()
+                owner.transactions += 1
+            except Exception as e:
+                print(f"[EVENT_ACTORS] {e}")
+                # 整批 rollback 後逐筆重做，只有出錯的那筆回傳錯誤
+                conn = self._retry_one_by_one(conn, ops)
+                owner.retries += 1
+                owner.transactions += len(ops)
+            owner.ops += len(ops)
+            for op in ops:
+                op.done.set()
+        if conn is not None:
+            conn.close()
+
+    def _retry_one_by_one(self, conn, ops: List[_Op]):
+        for op in ops:
+            op.result = op.error = None
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg.connect(**self.connect_kwargs)
+                else:
+                    conn.rollback()
+                self._apply(conn, [op])
+                conn.commit()
+            except Exception as e:
+                op.error = e
+                if conn is not None and not conn.closed:
+                    conn.rollback()
+        return conn
+
+    def _apply(self, conn, ops: List[_Op]) -> None:
+        """同一個任務的操作依到達順序執行，連續的報名合併成一次 join_task_batch"""
+        by_event: Dict[int, List[_Op]] = {}
+        for op in ops:
+            by_event.setdefault(op.event_id, []).append(op)
+        for event_id, event_ops in by_event.items():
+            joins: List[_Op] = []
+            for op in event_ops + [None]:
+                if op is not None and op.kind == "join":
+                    joins.append(op)
+                    continue
+                if joins:
+                    results = join_task_batch(event_id, [j.user_id for j in joins], conn=conn)
+                    for j, result in zip(joins, results):
+                        j.result = result
+                    joins = []
+                if op is not None:
+                    op.result = cancel_participation(op.user_id, event_id, conn=conn)
+
+
+event_actors = EventActors()
@@ -0,0 +1,198 @@
+# backend/explain_search.py
+"""
+確認 search_tasks 的關鍵字搜尋有用到 GIN 索引（idx_*_search），
+日期區間/時段搜尋有用到 (event_date, start_hour) 索引
+
+分兩部分，任一組沒用到預期的索引就以 exit code 1 結束：
+  1. 正式資料：關掉 seq scan 與逐筆 index scan（避免小表直接掃主鍵再過濾），
+     讓資料量小時也能看出 planner「能不能」走索引
+  2. 預設 planner 設定：在獨立的 schema（explain_fixture）灌入 10 萬筆任務並 ANALYZE，
+     確認 planner 實際「會選」預期的索引，而且沒有對 TASK_EVENT 做 seq scan；跑完整個刪掉
+用法：
+    python3 explain_search.py           # 只印結果
+    python3 explain_search.py --plans   # 連同執行計畫一起印出
+"""
+import argparse
+import json
+import sys
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from db import get_conn
+from volunteer import build_search_query
+
+# (說明, build_search_query 參數, 計畫中必須出現的索引)
+CASES = [
+    ("標題中文關鍵字", {"title_keyword": "淨灘"}, ["idx_task_event_search"]),
+    ("標題英文前綴", {"title_keyword": "beach"}, ["idx_task_event_search"]),
+    ("地點關鍵字", {"location_keyword": "台南"}, ["idx_venue_search"]),
+    ("技能關鍵字", {"skill_keyword": "急救"}, ["idx_skill_search"]),
+    # 兩個條件時由標題索引找出任務，場地條件在 join 後檢查即可
+    (
+        "標題 + 地點",
+        {"title_keyword": "淨灘", "location_keyword": "台南", "limit": 20},
+        ["idx_task_event_search"],
+    ),
+]
+
+
+FIXTURE_SCHEMA = "explain_fixture"
+FIXTURE_TABLES = ["VENUE", "TASK_EVENT", "SKILL", "TASK_REQUIRED_SKILL"]
+FIXTURE_EVENTS = 100_000
+
+# 預設 planner 設定下的檢查：(說明, build_search_query 參數, 必須選用的索引, Index Cond 必須包含的欄位)
+PLANNER_CASES = [
+    ("標題中文關鍵字", {"title_keyword": "淨灘"}, "idx_task_event_search", None),
+    ("標題英文前綴", {"title_keyword": "beach"}, "idx_task_event_search", None),
+    (
+        "標題 + 地點",
+        {"title_keyword": "淨灘", "location_keyword": "台南", "limit": 20},
+        "idx_task_event_search",
+        None,
+    ),
+    # 日期區間 + 時段只在這裡檢查：資料量小時 planner 和 idx_task_event_date 分不出高下，
+    # 任務多、時段分散時必須選 (event_date, start_hour)，而且時段條件要在 Index Cond 裡
+    (
+        "日期區間 + 時段",
+        {"date_from": date.today(), "date_to": date.today() + timedelta(days=6),
+         "hour_from": 9, "hour_to": 15},
+        "idx_task_event_date_hour",
+        "start_hour",
+    ),
+]
+
+# 10 萬筆任務分散在一年、6~18 點開始；標題只有少數含「淨灘」/「Beach」
+FIXTURE_SQL = [
+    """
+    INSERT INTO VENUE (venue_id, name, address, capacity)
+    SELECT g, CASE WHEN g %% 50 = 0 THEN '台南海灘 ' || g ELSE '場地 ' || g END,
+           '高雄市測試路 ' || g || ' 號', 100
+    FROM generate_series(1, 500) g;
+    """,
+    """
+    INSERT INTO SKILL (skill_id, skill_name)
+    SELECT g, CASE WHEN g = 7 THEN '急救' ELSE 'Skill ' || g END
+    FROM generate_series(1, 100) g;
+    """,
+    """
+    INSERT INTO TASK_EVENT (event_id, owner_id, venue_id, event_date, start_hour, end_hour,
+                            capacity, duration_hours, status, title, description)
+    SELECT g, 1, 1 + g %% 500, CURRENT_DATE + (g %% 365), 6 + g %% 13, 8 + g %% 13, 10, 2,
+           'Planned',
+           CASE WHEN g %% 500 = 0 THEN '淨灘任務 ' || g
+                WHEN g %% 700 = 0 THEN 'Beach cleanup ' || g
+                ELSE '社區服務 ' || g END,
+           '說明'
+    FROM generate_series(1, %(events)s) g;
+    """,
+    """
+    INSERT INTO TASK_REQUIRED_SKILL (event_id, skill_id, weight)
+    SELECT g, 1 + g %% 100, 1 FROM generate_series(1, %(events)s) g;
+    """,
+]
+
+
+def plan_nodes(node: Dict) -> Iterator[Dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def used_indexes(plan: Dict) -> List[str]:
+    return sorted({n["Index Name"] for n in plan_nodes(plan) if "Index Name" in n})
+
+
+def setup_fixture(cur) -> None:
+    """建立與正式表相同結構、相同索引名稱的表並灌資料（在目前的交易內）"""
+    cur.execute(f"CREATE SCHEMA {FIXTURE_SCHEMA};")
+    for table in FIXTURE_TABLES:
+        cur.execute(
+            f"CREATE TABLE {FIXTURE_SCHEMA}.{table} "
+            f"(LIKE public.{table} INCLUDING ALL EXCLUDING INDEXES);"
+        )
+        cur.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s;",
+            (table.lower(),),
+        )
+        for (indexdef,) in cur.fetchall():
+            cur.execute(indexdef.replace(" ON public.", f" ON {FIXTURE_SCHEMA}.", 1))
+    cur.execute(f"SET LOCAL search_path TO {FIXTURE_SCHEMA}, public;")
+    for statement in FIXTURE_SQL:
+        cur.execute(statement, {"events": FIXTURE_EVENTS})
+    for table in FIXTURE_TABLES:
+        cur.execute(f"ANALYZE {table};")
+
+
+def check_planner_choice(plan: Dict, index: str, cond_column: Optional[str]) -> List[str]:
+    """回傳問題清單：沒選到索引、Index Cond 沒用到指定欄位、對 TASK_EVENT 做 seq scan"""
+    problems = []
+    nodes = [n for n in plan_nodes(plan) if n.get("Index Name") == index]
+    if not nodes:
+        problems.append(f"沒有選用 {index}")
+    elif cond_column and not any(cond_column in n.get("Index Cond", "") for n in nodes):
+        problems.append(f"{index} 的 Index Cond 沒有 {cond_column}")
+    if any(
+        n["Node Type"] == "Seq Scan" and n.get("Relation Name") == "task_event"
+        for n in plan_nodes(plan)
+    ):
+        problems.append("task_event 走 seq scan")
+    return problems
+
+
+def run_planner_cases(conn, show_plans: bool) -> int:
+    failed = 0
+    with conn.cursor() as cur:
+        setup_fixture(cur)
+        for name, kwargs, index, cond_column in PLANNER_CASES:
+            sql, params = build_search_query(**kwargs)
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0][0]["Plan"]
+            problems = check_planner_choice(plan, index, cond_column)
+            print(f"[{'OK' if not problems else 'FAIL'}] {name}: {', '.join(used_indexes(plan))}")
+            if problems:
+                failed += 1
+                print(f"       {'；'.join(problems)}")
+            if show_plans or problems:
+                print(json.dumps(plan, ensure_ascii=False, indent=2))
+    return failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="search_tasks EXPLAIN 檢查")
+    parser.add_argument("--plans", action="store_true", help="印出完整執行計畫")
+    args = parser.parse_args()
+
+    failed = 0
+    print("== 正式資料（強制走索引）==")
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # SET LOCAL 只影響這個交易，最後 rollback
+            cur.execute("SET LOCAL enable_seqscan = off;")
+            cur.execute("SET LOCAL enable_indexscan = off;")
+            for name, kwargs, expected in CASES:
+                sql, params = build_search_query(**kwargs)
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                plan = cur.fetchone()[0][0]["Plan"]
+                indexes = used_indexes(plan)
+                missing = [idx for idx in expected if idx not in indexes]
+                print(f"[{'OK' if not missing else 'FAIL'}] {name}: {', '.join(indexes)}")
+                if missing:
+                    failed += 1
+                    print(f"       缺少索引: {', '.join(missing)}")
+                if args.plans or missing:
+                    print(json.dumps(plan, ensure_ascii=False, indent=2))
+        conn.rollback()
+
+    print(f"== 預設 planner（{FIXTURE_EVENTS} 筆任務）==")
+    with get_conn() as conn:
+        # 整個 fixture 建在這個交易內，rollback 就清掉
+        failed += run_planner_cases(conn, args.plans)
+        conn.rollback()
+
+    total = len(CASES) + len(PLANNER_CASES)
+    print(f"{total - failed}/{total} 通過")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# backend/lifecycle.py
+# 任務生命週期排程：Planned → Ongoing（start_hour）→ Finished（end_hour）
+# 以 heap 依「下一次轉換時間」排序，背景 thread 只在真正到點時才寫 DB，
+# 取代每個 request 都跑一次的全表 UPDATE（mark_finished_events）
+import heapq
+import itertools
+import threading
+import time as _time
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from db import get_conn
+
+RESYNC_SECONDS = 600  # 定期整批重載，補上不是經由 server 建立/修改的任務（例如 seed 腳本）
+MAX_SLEEP_SECONDS = 60  # 最長睡多久就醒來檢查一次，避免系統時間被調整後睡過頭
+
+
+def transition_times(
+    event_date: date, start_hour: int, end_hour: int
+) -> Tuple[datetime, datetime]:
+    """回傳 (開始時間, 結束時間)，也就是轉成 Ongoing / Finished 的時間點"""
+    base = datetime.combine(event_date, time())
+    return base + timedelta(hours=start_hour), base + timedelta(hours=end_hour)
+
+
+class LifecycleScheduler:
+    def __init__(self):
+        # heap 內容：(到期時間, 版本, event_id, 目標狀態)
+        self._heap: List[Tuple[datetime, int, int, str]] = []
+        # event_id -> 目前有效的版本；任務被修改/刪除後舊的 heap 項目就自動作廢
+        self._versions: Dict[int, int] = {}
+        self._seq = itertools.count(1)
+        self._pending_refresh: Set[int] = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.transitions = {"Ongoing": 0, "Finished": 0}
+        # 狀態轉換寫入 DB 之後呼叫，參數為 {"Ongoing": [...], "Finished": [...]}
+        self._listeners: List[Callable[[Dict[str, List[int]]], None]] = []
+
+    # ---------- 對外 API ----------
+
+    def start(self) -> None:
+        """載入所有未結束的任務並啟動背景 thread（已過期的會立刻補轉成 Finished）"""
+        if self._thread is not None:
+            return
+        self.resync()
+        self._thread = threading.Thread(
+            target=self._run, name="lifecycle-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def add_listener(self, callback: Callable[[Dict[str, List[int]]], None]) -> None:
+        """登記狀態轉換的通知（例如作廢搜尋快取）；在背景 thread 內呼叫"""
+        self._listeners.append(callback)
+
+    def refresh(self, event_id: int) -> None:
+        """任務新增或修改時間後呼叫：背景 thread 會重新讀取該任務並重排"""
+        with self._cond:
+            self._pending_refresh.add(event_id)
+            self._cond.notify()
+
+    def unschedule(self, event_id: int) -> None:
+        """任務刪除後呼叫：讓它在 heap 裡的排程失效"""
+        with self._cond:
+            self._versions.pop(event_id, None)
+            self._pending_refresh.discard(event_id)
+
+    def resync(self) -> None:
+        """從 DB 重新載入所有未結束的任務，整個 heap 重建"""
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT event_id, event_date, start_hour, end_hour, status
+                    FROM TASK_EVENT
+                    WHERE status <> 'Finished';
+                    """
+                )
+                rows = cur.fetchall()
+        with self._cond:
+            self._heap = []
+            self._versions = {}
+            self._schedule_rows(rows)
+            self._cond.notify()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            next_due = self._heap[0][0].isoformat() if self._heap else None
+            return {
+                "scheduled_events": len(self._versions),
+                "heap_size": len(self._heap),
+                "next_transition": next_due,
+                "transitions": dict(self.transitions),
+            }
+
+    # ---------- 內部 ----------
+
+    def _schedule_rows(self, rows: Iterable[Tuple]) -> None:
+        """呼叫端需持有 self._cond"""
+        for event_id, event_date, start_hour, end_hour, status in rows:
+            version = next(self._seq)
+            self._versions[event_id] = version
+            start_at, end_at = transition_times(event_date, start_hour, end_hour)
+            if status == "Planned":
+                heapq.heappush(self._heap, (start_at, version, event_id, "Ongoing"))
+            heapq.heappush(self._heap, (end_at, version, event_id, "Finished"))
+
+    def _pop_due(self, now: datetime) -> Dict[str, List[int]]:
+        """取出所有已到期且仍有效的轉換；呼叫端需持有 self._cond"""
+        due: Dict[str, List[int]] = {"Ongoing": [], "Finished": []}
+        while self._heap and self._heap[0][0] <= now:
+            _, version, event_id, target = heapq.heappop(self._heap)
+            if self._versions.get(event_id) != version:
+                continue
+            due[target].append(event_id)
+            if target == "Finished":
+                del self._versions[event_id]
+        return due
+
+    def _load_pending(self) -> None:
+        with self._cond:
+            event_ids = list(self._pending_refresh)
+            self._pending_refresh.clear()
+        if not event_ids:
+            return
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT event_id, event_date, start_hour, end_hour, status
+                    FROM TASK_EVENT
+                    WHERE event_id = ANY(%s) AND status <> 'Finished';
+                    """,
+                    (event_ids,),
+                )
+                rows = cur.fetchall()
+        with self._cond:
+            self._schedule_rows(rows)
+
+    def _apply(self, due: Dict[str, List[int]]) -> None:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                if due["Ongoing"]:
+                    cur.execute(
+                        """
+                        UPDATE TASK_EVENT
+                        SET status = 'Ongoing'
+                        WHERE event_id = ANY(%s) AND status = 'Planned';
+                        """,
+                        (due["Ongoing"],),
+                    )
+                    self.transitions["Ongoing"] += cur.rowcount
+                if due["Finished"]:
+                    cur.execute(
+                        """
+                        UPDATE TASK_EVENT
+                        SET status = 'Finished'
+                        WHERE event_id = ANY(%s) AND status <> 'Finished';
+                        """,
+                        (due["Finished"],),
+                    )
+                    self.transitions["Finished"] += cur.rowcount
+
+    def _run(self) -> None:
+        next_resync = _time.monotonic() + RESYNC_SECONDS
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    due = self._pop_due(datetime.now())
+                    if due["Ongoing"] or due["Finished"] or self._pending_refresh:
+                        break
+                    if _time.monotonic() >= next_resync:
+                        break
+                    timeout = MAX_SLEEP_SECONDS
+                    if self._heap:
+                        until_due = (self._heap[0][0] - datetime.now()).total_seconds()
+                        timeout = min(timeout, max(until_due, 0))
+                    self._cond.wait(timeout)
+            try:
+                self._load_pending()
+                if due["Ongoing"] or due["Finished"]:
+                    self._apply(due)
+                    for callback in self._listeners:
+                        callback(due)
+                if _time.monotonic() >= next_resync:
+                    next_resync = _time.monotonic() + RESYNC_SECONDS
+                    self.resync()
+            except Exception as e:
+                # DB 暫時失敗：提早 resync，把漏掉的轉換補回來
+                print(f"[LIFECYCLE] {e}")
+                next_resync = min(next_resync, _time.monotonic() + 30)
+
+
+scheduler = LifecycleScheduler()
@@ -0,0 +1,243 @@
+# backend/match_score.py
+"""
+MATCH_SCORE 批次計算：每位志工 × 每個未結束任務的技能契合度
+
+  L[u, s] = 志工 u 的技能 s 等級（USER_SKILL.level，1~5，沒有為 0）
+  W[e, s] = 任務 e 對技能 s 的權重（TASK_REQUIRED_SKILL.weight）
+  score[u, e] = 1 + 4 * (L @ W.T)[u, e] / (5 * sum_s W[e, s])
+
+也就是需求技能等級的加權平均換算到 1~5 分：所有需求技能都 5 級為 5 分，一項都沒有為 1 分。
+只寫入至少具備一項需求技能的組合（沒寫入的視為 1 分）；任務沒有需求技能就不計分。
+
+志工依 block_size 分批相乘，每批結果以 COPY 寫進暫存表，最後一次 upsert 回 MATCH_SCORE，
+並刪掉這些任務已不再契合的舊分數。需要 numpy（pip install numpy）；
+有裝 scipy 時志工技能矩陣改用稀疏矩陣。用法：
+    python3 match_score.py                    # 全部重算並印出耗時與吞吐量
+    python3 match_score.py --block-size 2000
+"""
+import argparse
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from psycopg import Connection
+
+from db import use_conn
+
+try:
+    from scipy import sparse
+except ImportError:  # 沒裝 scipy 就用一般的 numpy 矩陣（技能種類不多時差異不大）
+    sparse = None
+
+BLOCK_SIZE = 5000  # 每批幾位志工
+MAX_LEVEL = 5
+
+EVENT_SKILLS_SQL = """
+    SELECT trs.event_id, trs.skill_id, trs.weight
+    FROM TASK_REQUIRED_SKILL trs
+    JOIN TASK_EVENT e ON e.event_id = trs.event_id
+    WHERE e.status <> 'Finished' {event_filter};
+"""
+
+USER_SKILLS_SQL = """
+    SELECT us.user_id, us.skill_id, us.level
+    FROM USER_SKILL us
+    JOIN USER_ROLE r ON r.user_id = us.user_id AND r.role = 'Volunteer'
+    {user_filter};
+"""
+
+
+def _index(values: Sequence[int]) -> Tuple[np.ndarray, Dict[int, int]]:
+    """id 陣列（排序、去重）與 id -> 列號"""
+    ids = np.unique(np.asarray(values, dtype=np.int64))
+    return ids, {int(v): i for i, v in enumerate(ids)}
+
+
+def load_matrices(
+    event_ids: Optional[List[int]] = None,
+    user_ids: Optional[List[int]] = None,
+    conn: Optional[Connection] = None,
+):
+    """
+    讀出志工技能矩陣 L（志工 × 技能）與任務權重矩陣 W（任務 × 技能）；
+    event_ids / user_ids 為 None 表示全部未結束任務 / 全部志工
+    回傳 (user_ids, event_ids, L, W)
+    """
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            if event_ids is None:
+                cur.execute(EVENT_SKILLS_SQL.format(event_filter=""))
+            else:
+                cur.execute(
+                    EVENT_SKILLS_SQL.format(event_filter="AND trs.event_id = ANY(%s)"),
+                    (list(event_ids),),
+                )
+            event_rows = cur.fetchall()
+            if user_ids is None:
+                cur.execute(USER_SKILLS_SQL.format(user_filter=""))
+            else:
+                cur.execute(
+                    USER_SKILLS_SQL.format(user_filter="WHERE us.user_id = ANY(%s)"),
+                    (list(user_ids),),
+                )
+            user_rows = cur.fetchall()
+
+    skills, skill_pos = _index([r[1] for r in event_rows] + [r[1] for r in user_rows])
+    events, event_pos = _index([r[0] for r in event_rows])
+    users, user_pos = _index([r[0] for r in user_rows])
+
+    W = np.zeros((len(events), len(skills)), dtype=np.float64)
+    for event_id, skill_id, weight in event_rows:
+        W[event_pos[event_id], skill_pos[skill_id]] = weight
+
+    rows = np.fromiter((user_pos[r[0]] for r in user_rows), dtype=np.int64, count=len(user_rows))
+    cols = np.fromiter((skill_pos[r[1]] for r in user_rows), dtype=np.int64, count=len(user_rows))
+    levels = np.fromiter((r[2] for r in user_rows), dtype=np.float64, count=len(user_rows))
+    shape = (len(users), len(skills))
+    if sparse is not None:
+        L = sparse.csr_matrix((levels, (rows, cols)), shape=shape)
+    else:
+        L = np.zeros(shape, dtype=np.float64)
+        L[rows, cols] = levels
+    return users, events, L, W
+
+
+def score_blocks(users: np.ndarray, events: np.ndarray, L, W, block_size: int = BLOCK_SIZE):
+    """
+    逐批算分：每批 yield (user_id 陣列, event_id 陣列, score 陣列)，
+    只包含至少具備一項需求技能的組合，分數取到小數第二位
+    """
+    if len(users) == 0 or len(events) == 0:
+        return
+    # 任務權重總和乘上滿級，轉成「除數」；同一個任務的每位志工都一樣
+    scale = 4.0 / (MAX_LEVEL * W.sum(axis=1))
+    for start in range(0, len(users), block_size):
+        raw = L[start:start + block_size] @ W.T  # (志工, 任務) 加權等級總和
+        raw = np.asarray(raw)
+        u, e = np.nonzero(raw)
+        scores = np.round(1.0 + raw[u, e] * scale[e], 2)
+        yield users[start + u], events[e], scores
+
+
+def _copy_block(copy, user_ids: np.ndarray, event_ids: np.ndarray, scores: np.ndarray) -> None:
+    """把一批結果組成 COPY 的文字格式一次送出（不逐列呼叫 write_row）"""
+    lines = "".join(
+        f"{u}\t{e}\t{s:.2f}\n"
+        for u, e, s in zip(user_ids.tolist(), event_ids.tolist(), scores.tolist())
+    )
+    copy.write(lines)
+
+
+def recompute_match_scores(
+    event_ids: Optional[List[int]] = None,
+    user_ids: Optional[List[int]] = None,
+    block_size: int = BLOCK_SIZE,
+    conn: Optional[Connection] = None,
+) -> Dict:
+    """
+    重算 MATCH_SCORE 並寫回（event_ids / user_ids 為 None 表示全部）；
+    只更新分數有變的列，並刪掉範圍內已不契合的舊分數。回傳各階段耗時與吞吐量
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    with use_conn(conn) as conn:
+        users, events, L, W = load_matrices(event_ids, user_ids, conn=conn)
+        timings["load_s"] = time.perf_counter() - started
+
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TEMP TABLE match_score_stage (
+                    user_id  BIGINT,
+                    event_id BIGINT,
+                    score    NUMERIC(5,2)
+                );
+                """
+            )
+            pairs = 0
+            compute_s = 0.0
+            copy_started = mark = time.perf_counter()
+            with cur.copy("COPY match_score_stage (user_id, event_id, score) FROM STDIN") as copy:
+                for block in score_blocks(users, events, L, W, block_size):
+                    compute_s += time.perf_counter() - mark
+                    _copy_block(copy, *block)
+                    pairs += len(block[2])
+                    mark = time.perf_counter()
+            timings["compute_s"] = compute_s
+            timings["copy_s"] = time.perf_counter() - copy_started - compute_s
+
+            mark = time.perf_counter()
+            cur.execute("ANALYZE match_score_stage;")
+            cur.execute(
+                """
+                INSERT INTO MATCH_SCORE (user_id, event_id, score, updated_at)
+                SELECT user_id, event_id, score, now()
+                FROM match_score_stage
+                ON CONFLICT (user_id, event_id)
+                DO UPDATE SET score = EXCLUDED.score, updated_at = EXCLUDED.updated_at
+                WHERE MATCH_SCORE.score <> EXCLUDED.score;
+                """
+            )
+            upserted = cur.rowcount
+            # 範圍內沒有出現在新結果的舊分數（志工技能或任務需求變了）刪掉
+            # （任務的需求技能全被移除時不會出現在 events 裡，所以範圍以條件本身為準）
+            if event_ids is None:
+                scope = [
+                    "m.event_id IN (SELECT event_id FROM TASK_EVENT WHERE status <> 'Finished')"
+                ]
+                params: List = []
+            else:
+                scope = ["m.event_id = ANY(%s)"]
+                params = [list(event_ids)]
+            if user_ids is not None:
+                scope.append("m.user_id = ANY(%s)")
+                params.append(list(user_ids))
+            cur.execute(
+                f"""
+                DELETE FROM MATCH_SCORE m
+                WHERE {" AND ".join(scope)}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM match_score_stage s
+                      WHERE s.user_id = m.user_id AND s.event_id = m.event_id
+                  );
+                """,
+                params,
+            )
+            deleted = cur.rowcount
+            cur.execute("DROP TABLE match_score_stage;")
+            timings["upsert_s"] = time.perf_counter() - mark
+
+    total = time.perf_counter() - started
+    cells = len(users) * len(events)
+    return {
+        "volunteers": len(users),
+        "events": len(events),
+        "pairs_scored": cells,
+        "rows_written": pairs,
+        "rows_changed": upserted,
+        "rows_deleted": deleted,
+        **{k: round(v, 3) for k, v in timings.items()},
+        "total_s": round(total, 3),
+        "pairs_per_s": round(cells / timings["compute_s"]) if timings["compute_s"] else None,
+        "rows_per_s": round(pairs / total) if total else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重算 MATCH_SCORE")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    args = parser.parse_args()
+    stats = recompute_match_scores(block_size=args.block_size)
+    print(f"志工 {stats['volunteers']} 位 × 未結束任務 {stats['events']} 個")
+    print(
+        f"讀取 {stats['load_s']}s / 計算 {stats['compute_s']}s / COPY {stats['copy_s']}s"
+        f" / upsert {stats['upsert_s']}s，總計 {stats['total_s']}s"
+    )
+    print(
+        f"寫入 {stats['rows_written']} 筆（變動 {stats['rows_changed']}、刪除 {stats['rows_deleted']}）"
+        f"，計算 {stats['pairs_per_s']} 組/秒，整體 {stats['rows_per_s']} 筆/秒"
+    )
+
+
+if __name__ == "__main__":
+    main()
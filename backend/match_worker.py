@@ -0,0 +1,161 @@
+# backend/match_worker.py
+# MATCH_SCORE 的增量維護：技能異動後只重算受影響的部分
+#   - 志工技能或 Volunteer 角色變動 -> 該志工對所有未結束任務的那一列
+#   - 任務需求技能變動 -> 該任務對所有志工的那一欄
+#   - 刪除技能（USER_SKILL / TASK_REQUIRED_SKILL 會被連帶刪除）-> 整批重算
+# 寫入端只把 id 放進佇列（交易 commit 之後），背景 thread 等佇列安靜 DEBOUNCE_SECONDS
+# （最久 MAX_DELAY_SECONDS）再合併成一次 recompute_match_scores，寫入延遲不受影響
+import threading
+import time
+from typing import Callable, Dict, List, Set
+
+from match_score import recompute_match_scores
+
+DEBOUNCE_SECONDS = 0.5
+MAX_DELAY_SECONDS = 5.0
+RETRY_SECONDS = 5.0
+
+
+class MatchScoreWorker:
+    def __init__(self):
+        self._users: Set[int] = set()
+        self._events: Set[int] = set()
+        self._full = False
+        self._first_at = 0.0  # 目前這批最早一筆的時間
+        self._last_at = 0.0  # 目前這批最後一筆的時間
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._listeners: List[Callable[[Dict], None]] = []
+        self.batches = 0
+        self.users_recomputed = 0
+        self.events_recomputed = 0
+        self.full_rebuilds = 0
+        self.last_batch_ms = 0.0
+
+    # ---------- 對外 API ----------
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="match-score", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def add_listener(self, callback: Callable[[Dict], None]) -> None:
+        """
+        登記重算完成的通知（例如作廢推薦清單）；在背景 thread 內呼叫，
+        參數為 {"full": bool, "users": [...], "events": [...]}
+        """
+        self._listeners.append(callback)
+
+    def user_changed(self, user_id: int) -> None:
+        with self._cond:
+            self._users.add(user_id)
+            self._touch()
+
+    def event_changed(self, event_id: int) -> None:
+        with self._cond:
+            self._events.add(event_id)
+            self._touch()
+
+    def rebuild_all(self) -> None:
+        with self._cond:
+            self._full = True
+            self._touch()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "pending_users": len(self._users),
+                "pending_events": len(self._events),
+                "pending_full": self._full,
+                "batches": self.batches,
+                "users_recomputed": self.users_recomputed,
+                "events_recomputed": self.events_recomputed,
+                "full_rebuilds": self.full_rebuilds,
+                "last_batch_ms": round(self.last_batch_ms, 3),
+            }
+
+    # ---------- 內部 ----------
+
+    def _touch(self) -> None:
+        """呼叫端需持有 self._cond"""
+        now = time.monotonic()
+        if self._first_at == 0.0:
+            self._first_at = now
+        self._last_at = now
+        self._cond.notify()
+
+    def _has_pending_work(self) -> bool:
+        return self._full or bool(self._users) or bool(self._events)
+
+    def _take(self):
+        """等到有工作且佇列安靜下來，取出整批；停止時回傳 None"""
+        with self._cond:
+            while not self._stopped and not self._has_pending_work():
+                self._cond.wait()
+            while not self._stopped:
+                now = time.monotonic()
+                wait = min(
+                    self._last_at + DEBOUNCE_SECONDS - now,
+                    self._first_at + MAX_DELAY_SECONDS - now,
+                )
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+            if self._stopped:
+                return None
+            batch = (self._full, self._users, self._events)
+            self._full, self._users, self._events = False, set(), set()
+            self._first_at = self._last_at = 0.0
+            return batch
+
+    def _requeue(self, full: bool, users: Set[int], events: Set[int]) -> None:
+        with self._cond:
+            self._full = self._full or full
+            self._users |= users
+            self._events |= events
+            now = time.monotonic()
+            # 晚一點再試，避免 DB 故障時一直重試
+            self._first_at = now + RETRY_SECONDS - MAX_DELAY_SECONDS
+            self._last_at = now + RETRY_SECONDS - DEBOUNCE_SECONDS
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            full, users, events = batch
+            started = time.perf_counter()
+            try:
+                if full:
+                    # 整批重算已涵蓋個別的異動
+                    recompute_match_scores()
+                    self.full_rebuilds += 1
+                else:
+                    if users:
+                        recompute_match_scores(user_ids=sorted(users))
+                        self.users_recomputed += len(users)
+                    if events:
+                        recompute_match_scores(event_ids=sorted(events))
+                        self.events_recomputed += len(events)
+            except Exception as e:
+                print(f"[MATCH_WORKER] {e}")
+                self._requeue(full, users, events)
+                continue
+            self.batches += 1
+            self.last_batch_ms = (time.perf_counter() - started) * 1000
+            changed = {"full": full, "users": sorted(users), "events": sorted(events)}
+            for callback in self._listeners:
+                try:
+                    callback(changed)
+                except Exception as e:
+                    print(f"[MATCH_WORKER] {e}")
+
+
+match_worker = MatchScoreWorker()
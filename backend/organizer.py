@@ -1,13 +1,16 @@
 # backend/organizer.py
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple
 from datetime import date
-from db import get_conn
-from volunteer import create_skill
+from psycopg import Connection
+from db import use_conn, stream_rows
+from volunteer import create_skill, STREAM_CHUNK_SIZE
 
 
-def map_organizer_org(user_id: int, org_id: int) -> None:
+def map_organizer_org(
+    user_id: int, org_id: int, conn: Optional[Connection] = None
+) -> None:
     """建立 Organizer 與 ORG 的對應"""
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -19,11 +22,11 @@ def map_organizer_org(user_id: int, org_id: int) -> None:
             )
 
 
-def get_primary_org(user_id: int) -> int:
+def get_primary_org(user_id: int, conn: Optional[Connection] = None) -> int:
     """
     取得使用者的主要 ORG（取第一筆）。如果沒有，會 ValueError。
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -41,11 +44,13 @@ def get_primary_org(user_id: int) -> int:
             return row[0]
 
 
-def get_or_create_default_org(user_id: int) -> int:
+def get_or_create_default_org(
+    user_id: int, conn: Optional[Connection] = None
+) -> int:
     """
     先找有無綁定的 ORG；沒有的話自動建一個以使用者名稱為名的 ORG 並綁定。
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -95,14 +100,17 @@ def get_or_create_default_org(user_id: int) -> int:
 
 
 def create_org(
-    org_name: str, contact_email: str, owner_user_id: Optional[int] = None
+    org_name: str,
+    contact_email: str,
+    owner_user_id: Optional[int] = None,
+    conn: Optional[Connection] = None,
 ) -> int:
     sql = """
         INSERT INTO ORG (org_name, contact_email)
         VALUES (%s, %s)
         RETURNING org_id;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (org_name, contact_email))
             org_id = cur.fetchone()[0]
@@ -118,13 +126,15 @@ def create_org(
     return org_id
 
 
-def create_venue(name: str, address: str, capacity: int) -> int:
+def create_venue(
+    name: str, address: str, capacity: int, conn: Optional[Connection] = None
+) -> int:
     sql = """
         INSERT INTO VENUE (name, address, capacity)
         VALUES (%s, %s, %s)
         RETURNING venue_id;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (name, address, capacity))
             venue_id = cur.fetchone()[0]
@@ -142,9 +152,10 @@ def create_event(
     title: str,
     description: str,
     status: str = "Planned",
+    conn: Optional[Connection] = None,
 ) -> int:
     if org_id is None:
-        org_id = get_or_create_default_org(owner_id)
+        org_id = get_or_create_default_org(owner_id, conn=conn)
     duration_hours = end_hour - start_hour
     if duration_hours < 1 or duration_hours > 3:
         raise ValueError("活動時數必須介於 1~3 小時，請確認開始/結束時間")
@@ -159,7 +170,7 @@ def create_event(
            %s, %s, %s)
         RETURNING event_id;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 sql,
@@ -181,7 +192,9 @@ def create_event(
     return event_id
 
 
-def set_event_periods(event_id: int, hours: List[int]) -> None:
+def set_event_periods(
+    event_id: int, hours: List[int], conn: Optional[Connection] = None
+) -> None:
     """
     設定任務時間（使用小時列表），會自動轉成 start/end/hour，並限制最多 3 小時
     （會先刪掉原本 TASK_EVENT_PERIOD 的設定）
@@ -194,7 +207,7 @@ def set_event_periods(event_id: int, hours: List[int]) -> None:
     if duration_hours > 3:
         raise ValueError("活動時間最多 3 小時")
 
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 "DELETE FROM TASK_EVENT_PERIOD WHERE event_id = %s;",
@@ -222,12 +235,14 @@ def set_event_periods(event_id: int, hours: List[int]) -> None:
     return True
 
 
-def set_required_skills(event_id: int, skill_weights: Dict[str, int]) -> None:
+def set_required_skills(
+    event_id: int, skill_weights: Dict[str, int], conn: Optional[Connection] = None
+) -> None:
     """
     skill_weights: 例如 {"First Aid": 2, "Logistics": 1}
     會自動建立 SKILL，然後寫進 TASK_REQUIRED_SKILL
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             # 先清除舊設定
             cur.execute(
@@ -236,7 +251,7 @@ def set_required_skills(event_id: int, skill_weights: Dict[str, int]) -> None:
             )
 
             for skill_name, weight in skill_weights.items():
-                skill_id = create_skill(skill_name)
+                skill_id = create_skill(skill_name, conn=conn)
                 cur.execute(
                     """
                     INSERT INTO TASK_REQUIRED_SKILL (event_id, skill_id, weight)
@@ -247,7 +262,7 @@ def set_required_skills(event_id: int, skill_weights: Dict[str, int]) -> None:
     return True
 
 
-def list_my_events(owner_id: int) -> List[Dict]:
+def list_my_events(owner_id: int, conn: Optional[Connection] = None) -> List[Dict]:
     """列出該 Organizer 建立的任務與報名概況"""
     sql = """
         SELECT e.event_id,
@@ -257,22 +272,15 @@ def list_my_events(owner_id: int) -> List[Dict]:
                e.end_hour,
                e.status,
                e.capacity,
-               COALESCE(SUM(CASE WHEN p.status='Active' THEN 1 END),0) AS active_cnt,
-               COALESCE(SUM(CASE WHEN p.status='Cancelled' THEN 1 END),0) AS cancelled_cnt,
-               COALESCE(wl.wl_cnt, 0) AS waitlist_cnt
+               e.active_count,
+               (SELECT COUNT(*) FROM PARTICIPATION p
+                WHERE p.event_id = e.event_id AND p.status = 'Cancelled') AS cancelled_cnt,
+               e.waitlist_count
         FROM TASK_EVENT e
-        LEFT JOIN PARTICIPATION p ON p.event_id = e.event_id
-        LEFT JOIN (
-            SELECT event_id, COUNT(*) AS wl_cnt
-            FROM WAITLIST
-            GROUP BY event_id
-        ) wl ON wl.event_id = e.event_id
         WHERE e.owner_id = %s
-        GROUP BY e.event_id, e.title, e.event_date, e.start_hour, e.end_hour,
-                 e.status, e.capacity, wl.wl_cnt
         ORDER BY e.event_date DESC, e.event_id DESC;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (owner_id,))
             rows = cur.fetchall()
@@ -293,8 +301,13 @@ def list_my_events(owner_id: int) -> List[Dict]:
     ]
 
 
-def list_all_events_with_counts() -> List[Dict]:
-    """列出所有任務與報名概況（Admin 用）"""
+def _events_with_counts_query(
+    after_id: Optional[int], limit: Optional[int]
+) -> Tuple[str, List]:
+    """
+    依 (event_date, event_id) 由新到舊做 keyset 分頁；after_id 為上一頁最後一筆的 event_id。
+    報名/候補數直接讀 TASK_EVENT 的計數欄位，只有取消數逐筆計算，不必整表 JOIN + GROUP BY
+    """
     sql = """
         SELECT e.event_id,
                e.title,
@@ -303,48 +316,75 @@ def list_all_events_with_counts() -> List[Dict]:
                e.end_hour,
                e.status,
                e.capacity,
-               COALESCE(SUM(CASE WHEN p.status='Active' THEN 1 END),0) AS active_cnt,
-               COALESCE(SUM(CASE WHEN p.status='Cancelled' THEN 1 END),0) AS cancelled_cnt,
-               COALESCE(wl.wl_cnt, 0) AS waitlist_cnt
+               e.active_count,
+               (SELECT COUNT(*) FROM PARTICIPATION p
+                WHERE p.event_id = e.event_id AND p.status = 'Cancelled') AS cancelled_cnt,
+               e.waitlist_count
         FROM TASK_EVENT e
-        LEFT JOIN PARTICIPATION p ON p.event_id = e.event_id
-        LEFT JOIN (
-            SELECT event_id, COUNT(*) AS wl_cnt
-            FROM WAITLIST
-            GROUP BY event_id
-        ) wl ON wl.event_id = e.event_id
-        GROUP BY e.event_id, e.title, e.event_date, e.start_hour, e.end_hour,
-                 e.status, e.capacity, wl.wl_cnt
-        ORDER BY e.event_date DESC, e.event_id DESC;
     """
-    with get_conn() as conn:
+    params: List = []
+    if after_id is not None:
+        sql += """
+        WHERE (e.event_date, e.event_id) < (
+            SELECT a.event_date, a.event_id FROM TASK_EVENT a WHERE a.event_id = %s
+        )
+        """
+        params.append(after_id)
+    sql += """
+        ORDER BY e.event_date DESC, e.event_id DESC
+        LIMIT %s;
+    """
+    params.append(limit)
+    return sql, params
+
+
+def _event_with_counts_row(r) -> Dict:
+    return {
+        "event_id": r[0],
+        "title": r[1],
+        "event_date": r[2],
+        "start_hour": r[3],
+        "end_hour": r[4],
+        "status": r[5],
+        "capacity": r[6],
+        "active": r[7],
+        "cancelled": r[8],
+        "waitlist": r[9],
+    }
+
+
+def list_all_events_with_counts(
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    conn: Optional[Connection] = None,
+) -> List[Dict]:
+    """列出所有任務與報名概況（Admin 用；after_id / limit 為 keyset 分頁）"""
+    sql, params = _events_with_counts_query(after_id, limit)
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
-            cur.execute(sql)
+            cur.execute(sql, params)
             rows = cur.fetchall()
-    return [
-        {
-            "event_id": r[0],
-            "title": r[1],
-            "event_date": r[2],
-            "start_hour": r[3],
-            "end_hour": r[4],
-            "status": r[5],
-            "capacity": r[6],
-            "active": r[7],
-            "cancelled": r[8],
-            "waitlist": r[9],
-        }
-        for r in rows
-    ]
+    return [_event_with_counts_row(r) for r in rows]
+
+
+def stream_all_events_with_counts(
+    after_id: Optional[int] = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    conn: Optional[Connection] = None,
+) -> Iterator[List[Dict]]:
+    """同 list_all_events_with_counts，但以 server-side cursor 每次產出一批"""
+    sql, params = _events_with_counts_query(after_id, None)
+    for rows in stream_rows(sql, params, chunk_size, conn=conn):
+        yield [_event_with_counts_row(r) for r in rows]
 
 
-def list_venues() -> List[Dict]:
+def list_venues(conn: Optional[Connection] = None) -> List[Dict]:
     sql = """
         SELECT venue_id, name, address, capacity
         FROM VENUE
         ORDER BY venue_id;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql)
             rows = cur.fetchall()
@@ -354,9 +394,9 @@ def list_venues() -> List[Dict]:
     ]
 
 
-def list_skills() -> List[Dict]:
+def list_skills(conn: Optional[Connection] = None) -> List[Dict]:
     sql = "SELECT skill_id, skill_name FROM SKILL ORDER BY skill_id;"
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql)
             rows = cur.fetchall()
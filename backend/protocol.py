@@ -0,0 +1,222 @@
+# backend/protocol.py
+# 傳輸格式：
+#   - 預設：一行一個 JSON（UTF-8，以 \n 結尾），舊 client 不用改
+#   - 協商後：長度前綴的二進位 frame，4 bytes big-endian 長度 + payload，
+#     payload 為 MessagePack（需要 msgpack：pip install msgpack），沒裝時退回 UTF-8 JSON
+# 協商方式：連線後先送一行
+#   {"action": "negotiate", "params": {"framing": "length_prefixed", "codecs": ["msgpack", "json"]}}
+# server 回一行 JSON 說明選了哪個 codec，之後雙方都改用 frame
+import json
+import socket
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # 沒裝 msgpack 就只提供 JSON payload
+    msgpack = None
+
+HEADER = struct.Struct("!I")
+MAX_MESSAGE_BYTES = 1024 * 1024  # 單筆 request（一行或一個 frame）上限
+RECV_SIZE = 64 * 1024
+FRAMING_LINES = "lines"
+FRAMING_LENGTH_PREFIXED = "length_prefixed"
+
+
+class MessageTooLarge(ValueError):
+    pass
+
+
+def available_codecs() -> List[str]:
+    return ["msgpack", "json"] if msgpack is not None else ["json"]
+
+
+def encode_payload(obj: Any, codec: str) -> bytes:
+    if codec == "msgpack":
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def decode_payload(data, codec: str) -> Any:
+    if codec == "msgpack":
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(bytes(data).decode("utf-8"))
+
+
+def encode_frame(obj: Any, codec: str) -> bytes:
+    payload = encode_payload(obj, codec)
+    return HEADER.pack(len(payload)) + payload
+
+
+def encode_line(obj: Any) -> bytes:
+    return (json.dumps(obj) + "\n").encode("utf-8")
+
+
+def decode_request(data: bytes, codec: Optional[str]) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """
+    解析一筆 request（codec 為 None 表示 JSON 行）：
+    回傳 (req, None)，格式錯誤時 (None, 錯誤回應)，空行則 (None, None)
+    """
+    try:
+        if codec is None:
+            line = data.decode("utf-8").strip()
+            if not line:
+                return None, None
+            req = json.loads(line)
+        else:
+            req = decode_payload(data, codec)
+    except ValueError:
+        # JSONDecodeError / UnicodeDecodeError / msgpack 格式錯誤都是 ValueError
+        message = "Invalid MessagePack" if codec == "msgpack" else "Invalid JSON"
+        return None, {"status": "error", "message": message}
+    if not isinstance(req, dict):
+        return None, {"status": "error", "message": "Invalid request"}
+    return req, None
+
+
+def encode_message(resp: Dict, codec: Optional[str]) -> bytes:
+    return encode_line(resp) if codec is None else encode_frame(resp, codec)
+
+
+def negotiate(params: Dict) -> Tuple[Dict, Optional[str]]:
+    """
+    處理 client 的 negotiate 請求，回傳 (response, codec)；
+    codec 為 None 表示維持 JSON 行模式
+    """
+    framing = params.get("framing", FRAMING_LENGTH_PREFIXED)
+    if framing == FRAMING_LINES:
+        return {"status": "ok", "data": {"framing": FRAMING_LINES}}, None
+    if framing != FRAMING_LENGTH_PREFIXED:
+        return {"status": "error", "message": f"不支援的 framing: {framing}"}, None
+    wanted = params.get("codecs") or ["json"]
+    for codec in wanted:
+        if codec in available_codecs():
+            return {
+                "status": "ok",
+                "data": {"framing": FRAMING_LENGTH_PREFIXED, "codec": codec},
+            }, codec
+    return {
+        "status": "error",
+        "message": f"不支援的 codec: {wanted}，可用: {available_codecs()}",
+    }, None
+
+
+class RecvBuffer:
+    """
+    socket 接收緩衝：recv_into 直接寫進可重複使用的 bytearray，
+    已處理的資料只記位移、需要空間時才整段搬到前面，不會隨資料量變成平方時間；
+    以 bytes 為單位切訊息，多位元組的 UTF-8 字元被 recv 切開也不會解碼失敗
+    """
+
+    def __init__(self, size: int = RECV_SIZE):
+        self._buf = bytearray(size)
+        self._start = 0  # 尚未處理的資料起點
+        self._end = 0  # 已收到的資料終點
+        self._scan = 0  # 行模式下已確認沒有 \n 的位置，下次從這裡繼續找
+
+    def pending(self) -> int:
+        return self._end - self._start
+
+    def fill(self, sock: socket.socket) -> int:
+        """收一次資料；回傳收到的 bytes 數，0 表示對方關閉連線"""
+        if len(self._buf) - self._end < RECV_SIZE // 4:
+            self._make_room()
+        n = sock.recv_into(memoryview(self._buf)[self._end:])
+        self._end += n
+        return n
+
+    def _make_room(self) -> None:
+        pending = self.pending()
+        if self._start > 0:
+            self._buf[:pending] = self._buf[self._start:self._end]
+            self._scan -= self._start
+            self._start, self._end = 0, pending
+        if len(self._buf) - self._end < RECV_SIZE // 4:
+            self._buf.extend(bytes(len(self._buf)))
+
+    def _take(self, end: int, skip: int = 0) -> bytes:
+        data = bytes(self._buf[self._start:end])
+        self._start = end + skip
+        self._scan = self._start
+        if self._start == self._end:
+            self._start = self._end = self._scan = 0
+        return data
+
+    def next_line(self) -> Optional[bytes]:
+        """取出一行（不含 \\n）；還沒收齊回傳 None"""
+        idx = self._buf.find(b"\n", max(self._scan, self._start), self._end)
+        if idx < 0:
+            self._scan = self._end
+            if self.pending() > MAX_MESSAGE_BYTES:
+                raise MessageTooLarge("Request too large")
+            return None
+        return self._take(idx, skip=1)
+
+    def next_frame(self) -> Optional[bytes]:
+        """取出一個 frame 的 payload；還沒收齊回傳 None"""
+        if self.pending() < HEADER.size:
+            return None
+        (length,) = HEADER.unpack_from(self._buf, self._start)
+        if length > MAX_MESSAGE_BYTES:
+            raise MessageTooLarge("Request too large")
+        if self.pending() < HEADER.size + length:
+            return None
+        self._start += HEADER.size
+        return self._take(self._start + length)
+
+
+class ClientChannel:
+    """client 端的連線包裝：send_request 透過它收送，協商成功就改用二進位 frame"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.codec: Optional[str] = None  # None 表示 JSON 行模式
+        self._recv = RecvBuffer()
+
+    def negotiate(self, codecs: Optional[List[str]] = None) -> Optional[str]:
+        """要求改用長度前綴 frame；server 不支援時維持 JSON 行模式"""
+        resp = self.request(
+            {
+                "action": "negotiate",
+                "params": {
+                    "framing": FRAMING_LENGTH_PREFIXED,
+                    "codecs": codecs or available_codecs(),
+                },
+            }
+        )
+        if resp is not None and resp.get("status") == "ok":
+            self.codec = resp["data"].get("codec")
+        return self.codec
+
+    def request(self, req: Dict) -> Optional[Dict]:
+        """送出一筆 request 並等待回應；連線中斷時回傳 None"""
+        self.sock.sendall(encode_message(req, self.codec))
+        return self.receive()
+
+    def stream(self, req: Dict) -> Iterator[Dict]:
+        """
+        送出串流模式的 request（params 需帶 stream=True），逐一產出收到的 response，
+        直到 more 不為 True（最後一個 response 或錯誤）為止
+        """
+        self.sock.sendall(encode_message(req, self.codec))
+        while True:
+            resp = self.receive()
+            if resp is None:
+                return
+            yield resp
+            if not resp.get("more"):
+                return
+
+    def receive(self) -> Optional[Dict]:
+        """讀取下一個 response；連線中斷時回傳 None"""
+        while True:
+            if self.codec is None:
+                data = self._recv.next_line()
+            else:
+                data = self._recv.next_frame()
+            if data is not None:
+                if self.codec is None:
+                    return json.loads(data.decode("utf-8"))
+                return decode_payload(data, self.codec)
+            if self._recv.fill(self.sock) == 0:
+                return None
@@ -0,0 +1,215 @@
+# backend/recommend.py
+# recommend_tasks 的候選清單快取：每位志工一份依 MATCH_SCORE 排好的任務清單，
+# 查詢時依序挑出尚未開始、未額滿、和已報名任務時段不衝突的前 k 個，
+# 不用每次對所有任務算分排序。任務狀態（人數、開始時間）由 search_index 提供。
+#
+# 維護方式（寫入都在交易 commit 之後才通知）：
+#   - 第一次推薦時從 MATCH_SCORE 載入該志工的清單，LRU 保留 CACHE_USERS 位
+#   - 任務額滿/開始/刪除：從所有含有它的清單移除（查詢時發現的也順便移除）
+#   - 移除過的任務因取消報名又有名額：含有它的清單作廢，下次推薦時重新載入
+#   - match_worker 重算後：志工的清單作廢；任務的分數有變則全部作廢
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from psycopg import Connection
+
+from db import use_conn
+from search_index import search_index
+from volunteer import get_user_active_participation, recommend_tasks
+
+CACHE_USERS = 10000
+
+CANDIDATES_SQL = """
+    SELECT m.event_id, m.score
+    FROM MATCH_SCORE m
+    JOIN TASK_EVENT e ON e.event_id = m.event_id
+    WHERE m.user_id = %s AND e.status = 'Planned' AND e.event_date >= %s
+    ORDER BY m.score DESC, e.event_date, m.event_id;
+"""
+
+
+def _conflicts(ev: Dict, busy: Dict[date, List[Tuple[int, int]]]) -> bool:
+    """和已報名的任務同一天且時段重疊（已報名的任務本身也算）"""
+    return any(
+        start < ev["end_hour"] and ev["start_hour"] < end
+        for start, end in busy.get(ev["date"], ())
+    )
+
+
+class Recommender:
+    def __init__(self, size: int = CACHE_USERS):
+        self.size = size
+        # user_id -> [(event_id, score)]，分數高的在前；只整份替換，不原地修改
+        self._lists: "OrderedDict[int, List[Tuple[int, float]]]" = OrderedDict()
+        self._loaded: Dict[int, List[int]] = {}  # user_id -> 載入時清單上的 event_id
+        self._by_event: Dict[int, Set[int]] = {}  # event_id -> 載入時清單含有它的志工
+        self._closed: Set[int] = set()  # 曾被移出清單的任務（額滿後可能再開放）
+        # 每次作廢都加一；載入途中有作廢過，結果就不放進快取
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self.invalidations = 0
+        self.fallbacks = 0
+
+    def recommend(
+        self, user_id: int, limit: int = 10, conn: Optional[Connection] = None
+    ) -> List[Dict]:
+        """格式同 volunteer.recommend_tasks；search_index 尚未載入時改查 DB"""
+        candidates = self._candidates(user_id, conn)
+        events = search_index.open_events(event_id for event_id, _ in candidates)
+        if events is None:
+            self.fallbacks += 1
+            return recommend_tasks(user_id, limit, conn=conn)
+        if len(events) < len(candidates):
+            open_ids = {ev["event_id"] for ev in events}
+            self._prune(
+                [event_id for event_id, _ in candidates if event_id not in open_ids],
+                users=[user_id],
+            )
+        if not events:
+            return []
+
+        busy: Dict[date, List[Tuple[int, int]]] = {}
+        for row in get_user_active_participation(user_id, conn=conn):
+            busy.setdefault(row["date"], []).append((row["start_hour"], row["end_hour"]))
+        scores = dict(candidates)
+        result = []
+        for ev in events:
+            if _conflicts(ev, busy):
+                continue
+            ev["match_score"] = scores[ev["event_id"]]
+            result.append(ev)
+            if len(result) >= limit:
+                break
+        return result
+
+    # ---------- 作廢 ----------
+
+    def event_changed(self, event_id: int) -> None:
+        """報名/取消/改時段後呼叫（search_index.refresh 之後）"""
+        events = search_index.open_events([event_id])
+        if events is None:
+            return
+        if not events:
+            self._prune([event_id])
+            return
+        with self._lock:
+            if event_id in self._closed:
+                self._closed.discard(event_id)
+                self._invalidate(self._by_event.get(event_id, set()))
+
+    def event_removed(self, event_id: int) -> None:
+        self._prune([event_id])
+        with self._lock:
+            self._closed.discard(event_id)
+            self._by_event.pop(event_id, None)
+
+    def on_transition(self, due: Dict[str, List[int]]) -> None:
+        """lifecycle 的通知：開始或結束的任務都不能再推薦"""
+        self._prune(due.get("Ongoing", []) + due.get("Finished", []))
+
+    def on_scores_changed(self, changed: Dict) -> None:
+        """match_worker 的通知"""
+        if changed["full"] or changed["events"]:
+            self.clear()
+            return
+        with self._lock:
+            self._invalidate(changed["users"])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._lists)
+            self._lists.clear()
+            self._loaded.clear()
+            self._by_event.clear()
+            self._closed.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._lists),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "pruned": self.pruned,
+                "invalidations": self.invalidations,
+                "fallbacks": self.fallbacks,
+            }
+
+    # ---------- 內部 ----------
+
+    def _candidates(
+        self, user_id: int, conn: Optional[Connection]
+    ) -> List[Tuple[int, float]]:
+        with self._lock:
+            items = self._lists.get(user_id)
+            if items is not None:
+                self._lists.move_to_end(user_id)
+                self.hits += 1
+                return items
+            self.misses += 1
+            generation = self._generation
+        with use_conn(conn) as conn:
+            with conn.cursor() as cur:
+                cur.execute(CANDIDATES_SQL, (user_id, date.today()))
+                items = [(event_id, float(score)) for event_id, score in cur.fetchall()]
+        with self._lock:
+            if generation == self._generation:
+                self._store(user_id, items)
+        return items
+
+    def _prune(self, event_ids: Iterable[int], users: Optional[Iterable[int]] = None) -> None:
+        """把任務移出清單（users 為 None 表示所有含有它的清單）"""
+        with self._lock:
+            targets: Set[int] = set()
+            for event_id in event_ids:
+                self._closed.add(event_id)
+                targets |= self._by_event.get(event_id, set())
+            if users is not None:
+                targets &= set(users)
+            closed = self._closed
+            for user_id in targets:
+                items = self._lists.get(user_id)
+                if items is None:
+                    continue
+                kept = [item for item in items if item[0] not in closed]
+                self.pruned += len(items) - len(kept)
+                self._lists[user_id] = kept
+
+    def _invalidate(self, user_ids: Iterable[int]) -> None:
+        """呼叫端需持有 self._lock"""
+        self._generation += 1
+        for user_id in list(user_ids):
+            if user_id in self._lists:
+                self._drop(user_id)
+                self.invalidations += 1
+
+    def _store(self, user_id: int, items: List[Tuple[int, float]]) -> None:
+        """呼叫端需持有 self._lock"""
+        if user_id in self._lists:
+            self._drop(user_id)
+        self._lists[user_id] = items
+        self._loaded[user_id] = [event_id for event_id, _ in items]
+        for event_id, _ in items:
+            self._by_event.setdefault(event_id, set()).add(user_id)
+        while len(self._lists) > self.size:
+            self._drop(next(iter(self._lists)))
+
+    def _drop(self, user_id: int) -> None:
+        """呼叫端需持有 self._lock"""
+        del self._lists[user_id]
+        for event_id in self._loaded.pop(user_id):
+            users = self._by_event.get(event_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self._by_event[event_id]
+
+
+recommender = Recommender()
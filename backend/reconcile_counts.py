@@ -0,0 +1,36 @@
+# backend/reconcile_counts.py
+"""
+重算 TASK_EVENT.active_count / waitlist_count
+
+平常由 join_task / cancel_participation 維護；直接改資料庫之後（seed 腳本、手動 SQL、
+刪除使用者連帶刪掉報名/候補）執行一次即可。用法：
+    python3 reconcile_counts.py                   # 全部任務
+    python3 reconcile_counts.py --event-id 12 13  # 指定任務
+    python3 reconcile_counts.py --dry-run         # 只列出不一致的任務，不寫入
+"""
+import argparse
+
+from db import get_conn
+from volunteer import reconcile_event_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重算任務的報名/候補人數")
+    parser.add_argument("--event-id", type=int, nargs="*", help="只處理這些任務")
+    parser.add_argument("--dry-run", action="store_true", help="只列出，不寫入")
+    args = parser.parse_args()
+
+    with get_conn() as conn:
+        result = reconcile_event_counts(args.event_id or None, conn=conn)
+        if args.dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+
+    fixed = result["events"]
+    verb = "不一致" if args.dry_run else "已修正"
+    print(f"{verb}的任務 {len(fixed)} 個" + (f": {', '.join(map(str, fixed))}" if fixed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# backend/search_cache.py
+# search_tasks 結果快取：以正規化後的搜尋條件為 key，LRU + TTL，
+# 由會改變搜尋結果的寫入精準地作廢，並把同時間相同條件的查詢合併成一次（single-flight）。
+#
+# 作廢規則（寫入都在交易 commit 之後才通知）：
+#   - invalidate_event：報名、任務開始/刪除 —— 只會讓該任務的人數/狀態改變或從結果消失，
+#     作廢含有該任務的結果，以及「只看未額滿且有分頁」、「依剩餘名額排序」與帶分類統計的結果
+#     （名次、分頁邊界或計數可能因此改變）
+#   - invalidate_availability：取消報名 —— 名額空出來，任務可能重新出現在「只看未額滿」的結果
+#   - clear：建任務、改時段/技能、刪場地/技能、任務結束 —— 可能讓任何查詢多出結果
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+CACHE_SIZE = 1024
+CACHE_TTL_SECONDS = 30.0
+
+
+def normalize_criteria(criteria: Dict) -> Tuple:
+    """
+    把 search_tasks 的條件轉成 key：關鍵字轉小寫、合併空白，空字串視為沒給，list 轉成 tuple；
+    future_only/past_only 與今天的日期有關，所以 key 也帶上今天
+    """
+    items = []
+    for name, value in sorted(criteria.items()):
+        if isinstance(value, str):
+            value = " ".join(value.lower().split()) or None
+        elif isinstance(value, list):
+            value = tuple(value)
+        items.append((name, value))
+    return (date.today(),) + tuple(items)
+
+
+class _Entry:
+    __slots__ = ("value", "event_ids", "expires", "available_only", "volatile")
+
+
+class _Flight:
+    """正在查詢中的 key：其他 thread 等它完成後直接拿結果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SearchCache:
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._by_event: Dict[int, Set[Hashable]] = {}  # event_id -> 結果含有它的 key
+        self._available_only: Set[Hashable] = set()  # only_available=True 的 key
+        self._volatile: Set[Hashable] = set()  # 任何人數變動都可能影響的 key
+        self._flights: Dict[Hashable, _Flight] = {}
+        # 每次作廢都加一；查詢開始後有作廢過，結果就不放進快取（可能是舊資料）
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get_or_compute(
+        self,
+        criteria: Dict,
+        compute: Callable[[], Dict],
+        defer: Optional[Callable[[Callable[[], None]], None]] = None,
+    ) -> Dict:
+        """
+        有快取就直接回傳；沒有時同一個 key 只會有一個 thread 真的執行 compute，
+        其他同時進來的等它的結果。compute 回傳 {"tasks": [...], "facets": ...}，
+        tasks 的每個 dict 需有 event_id。
+        defer（例如 db.after_commit）：等交易 commit 後才放進快取，
+        避免同一個交易裡未 commit 的寫入被快取起來。合併的 thread 不等 commit 就拿到結果，
+        所以 compute 所在的交易不能有未 commit 的寫入（batch 內的查詢不要經過快取）
+        """
+        key = normalize_criteria(criteria)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if entry is not None:
+                self._drop(key)
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+            generation = self._generation
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+
+            def store():
+                with self._lock:
+                    if generation == self._generation:
+                        self._store(key, criteria, value)
+
+            if defer is not None:
+                defer(store)
+            else:
+                store()
+            return value
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    # ---------- 作廢 ----------
+
+    def invalidate_event(self, event_id: int) -> None:
+        with self._lock:
+            self._invalidate(self._by_event.get(event_id, set()) | self._volatile)
+
+    def invalidate_availability(self, event_id: int) -> None:
+        with self._lock:
+            self._invalidate(
+                self._by_event.get(event_id, set()) | self._volatile | self._available_only
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_event.clear()
+            self._available_only.clear()
+            self._volatile.clear()
+
+    def on_transition(self, due: Dict[str, List[int]]) -> None:
+        """lifecycle 的通知：開始只改狀態欄位，結束會讓任務移到歷史查詢的結果裡"""
+        if due.get("Finished"):
+            self.clear()
+            return
+        for event_id in due.get("Ongoing", []):
+            self.invalidate_event(event_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+    # ---------- 內部（呼叫端需持有 self._lock） ----------
+
+    def _store(self, key: Hashable, criteria: Dict, value: Dict) -> None:
+        if key in self._entries:
+            self._drop(key)
+        entry = _Entry()
+        entry.value = value
+        entry.event_ids = [row["event_id"] for row in value["tasks"]]
+        entry.expires = time.monotonic() + self.ttl
+        entry.available_only = bool(criteria.get("only_available"))
+        paged = criteria.get("limit") is not None or bool(criteria.get("offset"))
+        # 分類統計涵蓋所有符合條件的任務，任何人數變動都可能改變計數
+        entry.volatile = (
+            criteria.get("order") == "slots"
+            or bool(criteria.get("facets"))
+            or (entry.available_only and paged)
+        )
+        self._entries[key] = entry
+        for event_id in entry.event_ids:
+            self._by_event.setdefault(event_id, set()).add(key)
+        if entry.available_only:
+            self._available_only.add(key)
+        if entry.volatile:
+            self._volatile.add(key)
+        while len(self._entries) > self.size:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _invalidate(self, keys: Set[Hashable]) -> None:
+        self._generation += 1
+        for key in keys:
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        for event_id in entry.event_ids:
+            keys = self._by_event.get(event_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_event[event_id]
+        self._available_only.discard(key)
+        self._volatile.discard(key)
+
+
+search_cache = SearchCache()
@@ -0,0 +1,554 @@
+# backend/search_index.py
+# 未結束任務的記憶體內反向索引：標題/描述、場地、技能的詞 -> event_id 集合，
+# search_tasks 常見的關鍵字/地點/技能查詢直接用集合交集算出結果，不用進 Postgres。
+# 切詞與 DB 端的 search_tsv 相同（text_search），所以兩邊找到的任務一致；
+# 相關度以詞的權重加總（標題/場地名稱 1.0、描述/地址 0.4），和 DB 端的 text_search.rank_sql 相同。
+#
+# 維護方式：
+#   - server 啟動時 start() 整批載入，之後每 REBUILD_SECONDS 重建一次，
+#     補上不是經由 server 寫入的資料（例如 seed 腳本）
+#   - 建任務/改時段/改技能/報名/取消後 refresh(event_id) 只重讀該任務
+#   - 刪任務 remove(event_id)；刪場地/技能會連帶刪掉任務，直接 rebuild()
+#   - 讀 DB 在鎖外進行，每次讀之前先取一個遞增的序號：同一個任務只接受序號較新的結果
+#     （序號較大的讀取一定看得到序號較小者觸發時已 commit 的資料），remove 也記一筆，
+#     較舊的 refresh 不會把刪掉的任務放回來；rebuild 期間的 refresh/remove 在換上新索引前重放
+#   - 任務結束（Finished）不靠 DB 狀態，查詢時依結束時間排除
+import threading
+from bisect import bisect_left
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from db import get_conn
+from lifecycle import transition_times
+from text_search import WEIGHT_PRIMARY, WEIGHT_SECONDARY, query_terms, tokenize
+from volunteer import SEARCH_ORDERS, sort_facets
+
+REBUILD_SECONDS = 600
+
+# 一次讀出任務、場地、Active 人數與需求技能；{where} 決定要載入哪些任務
+EVENTS_SQL = """
+    SELECT
+        e.event_id, e.title, e.description, e.event_date, e.start_hour, e.end_hour,
+        e.status, e.capacity, e.venue_id, v.name, v.address,
+        e.active_count,
+        ARRAY(SELECT trs.skill_id FROM TASK_REQUIRED_SKILL trs
+              WHERE trs.event_id = e.event_id ORDER BY trs.skill_id) AS skill_ids,
+        ARRAY(SELECT s.skill_name FROM TASK_REQUIRED_SKILL trs
+              JOIN SKILL s ON s.skill_id = trs.skill_id
+              WHERE trs.event_id = e.event_id ORDER BY trs.skill_id) AS skill_names
+    FROM TASK_EVENT e
+    JOIN VENUE v ON v.venue_id = e.venue_id
+    WHERE e.status <> 'Finished' AND {where};
+"""
+
+
+def _weighted_tokens(primary: Optional[str], secondary: Optional[str]) -> Dict[str, float]:
+    """詞 -> 權重；同一個詞出現在兩個欄位時取較高的權重"""
+    weights = {token: WEIGHT_SECONDARY for token in tokenize(secondary)}
+    weights.update((token, WEIGHT_PRIMARY) for token in tokenize(primary))
+    return weights
+
+
+class Postings:
+    """詞 -> id 集合；英數字查詢是前綴比對，用排序過的詞表做 bisect"""
+
+    def __init__(self):
+        self._lists: Dict[str, Set[int]] = {}
+        self._sorted: Optional[List[str]] = None  # 詞表有增減時才重排
+
+    def add(self, tokens: Iterable[str], doc_id: int) -> None:
+        for token in tokens:
+            ids = self._lists.get(token)
+            if ids is None:
+                ids = self._lists[token] = set()
+                self._sorted = None
+            ids.add(doc_id)
+
+    def discard(self, tokens: Iterable[str], doc_id: int) -> None:
+        for token in tokens:
+            ids = self._lists.get(token)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self._lists[token]
+                self._sorted = None
+
+    def tokens_for(self, term: str, prefix: bool) -> List[str]:
+        """查詢詞對應到的索引詞（前綴比對時可能有多個）"""
+        if not prefix:
+            return [term] if term in self._lists else []
+        if self._sorted is None:
+            self._sorted = sorted(self._lists)
+        tokens = []
+        for i in range(bisect_left(self._sorted, term), len(self._sorted)):
+            if not self._sorted[i].startswith(term):
+                break
+            tokens.append(self._sorted[i])
+        return tokens
+
+    def match(self, terms: List[Tuple[str, bool]]) -> Set[int]:
+        """所有查詢詞都要命中（AND），回傳 id 集合"""
+        result: Optional[Set[int]] = None
+        for term, prefix in terms:
+            ids: Set[int] = set()
+            for token in self.tokens_for(term, prefix):
+                ids |= self._lists[token]
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result or set()
+
+    def __len__(self) -> int:
+        return len(self._lists)
+
+
+class _Event:
+    __slots__ = (
+        "event_id", "title", "event_date", "start_hour", "end_hour", "status",
+        "capacity", "active", "venue_id", "skill_ids", "tokens", "start_at", "end_at",
+    )
+
+
+class _IndexData:
+    """一份完整的索引；rebuild 時建好新的一份再整個換掉"""
+
+    def __init__(self):
+        self.events: Dict[int, _Event] = {}
+        self.event_postings = Postings()
+        self.by_date: Dict[date, Set[int]] = {}
+        # 場地與技能各自建索引，再經由 *_events 對應回任務：
+        # 和 SQL 一樣是「同一個場地 / 同一項技能」要包含所有查詢詞
+        self.venues: Dict[int, Tuple[str, str, Dict[str, float]]] = {}
+        self.venue_postings = Postings()
+        self.venue_events: Dict[int, Set[int]] = {}
+        self.skill_postings = Postings()
+        self.skill_tokens: Dict[int, List[str]] = {}
+        self.skill_names: Dict[int, str] = {}
+        self.skill_events: Dict[int, Set[int]] = {}
+
+    def put(self, row: Tuple) -> None:
+        (
+            event_id, title, description, event_date, start_hour, end_hour, status,
+            capacity, venue_id, venue_name, address, active, skill_ids, skill_names,
+        ) = row
+        self.drop(event_id)
+
+        ev = _Event()
+        ev.event_id = event_id
+        ev.title = title
+        ev.event_date = event_date
+        ev.start_hour = start_hour
+        ev.end_hour = end_hour
+        ev.status = status
+        ev.capacity = capacity
+        ev.active = active
+        ev.venue_id = venue_id
+        ev.skill_ids = list(skill_ids)
+        ev.tokens = _weighted_tokens(title, description)
+        ev.start_at, ev.end_at = transition_times(event_date, start_hour, end_hour)
+        self.events[event_id] = ev
+        self.event_postings.add(ev.tokens, event_id)
+        self.by_date.setdefault(event_date, set()).add(event_id)
+
+        # 場地名稱/地址有改就換掉舊的詞
+        old_venue = self.venues.get(venue_id)
+        if old_venue is None or old_venue[:2] != (venue_name, address):
+            if old_venue is not None:
+                self.venue_postings.discard(old_venue[2], venue_id)
+            venue_tokens = _weighted_tokens(venue_name, address)
+            self.venues[venue_id] = (venue_name, address, venue_tokens)
+            self.venue_postings.add(venue_tokens, venue_id)
+        self.venue_events.setdefault(venue_id, set()).add(event_id)
+
+        for skill_id, skill_name in zip(skill_ids, skill_names):
+            if skill_id not in self.skill_tokens:
+                tokens = tokenize(skill_name)
+                self.skill_tokens[skill_id] = tokens
+                self.skill_names[skill_id] = skill_name
+                self.skill_postings.add(tokens, skill_id)
+            self.skill_events.setdefault(skill_id, set()).add(event_id)
+
+    def drop(self, event_id: int) -> None:
+        ev = self.events.pop(event_id, None)
+        if ev is None:
+            return
+        self.event_postings.discard(ev.tokens, event_id)
+        self.by_date.get(ev.event_date, set()).discard(event_id)
+        self.venue_events.get(ev.venue_id, set()).discard(event_id)
+        for skill_id in ev.skill_ids:
+            self.skill_events.get(skill_id, set()).discard(event_id)
+
+
+class EventSearchIndex:
+    def __init__(self):
+        self._data: Optional[_IndexData] = None  # None 表示尚未載入，search 一律回傳 None
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self._built_at: Optional[datetime] = None
+        self._seq = 0  # 每次讀 DB 前取號
+        self._floor = 0  # 目前 _data 那次 rebuild 的序號，更舊的結果直接丟掉
+        # rebuild 之後各任務最後套用的 (序號, rows)；rows 為 None 表示已刪除
+        self._versions: Dict[int, Tuple[int, Optional[List[Tuple]]]] = {}
+        self.served = 0
+        self.fallbacks = 0
+        self.stale_writes = 0
+
+    # ---------- 維護 ----------
+
+    def start(self) -> None:
+        """整批載入並啟動定期重建的背景 thread"""
+        if self._thread is not None:
+            return
+        self.rebuild()
+        self._thread = threading.Thread(
+            target=self._run, name="search-index", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def rebuild(self) -> None:
+        """從 DB 重新載入今天以後所有未結束的任務"""
+        seq = self._next_seq()
+        data = _IndexData()
+        for row in self._load("e.event_date >= CURRENT_DATE", ()):
+            data.put(row)
+        with self._lock:
+            if seq < self._floor:
+                # 比較晚開始的 rebuild 已經換上去了
+                self.stale_writes += 1
+                return
+            # 載入期間的 refresh/remove 比這份快照新，重放到新的索引上
+            versions = {}
+            for event_id, (version, rows) in self._versions.items():
+                if version > seq:
+                    versions[event_id] = (version, rows)
+                    self._put_rows(data, event_id, rows)
+            self._versions = versions
+            self._floor = seq
+            self._data = data
+            self._built_at = datetime.now()
+
+    def refresh(self, event_id: int) -> None:
+        """任務新增/修改或報名人數變動後呼叫（交易 commit 之後），只重讀這一筆"""
+        if self._data is None:
+            return
+        seq = self._next_seq()
+        rows = self._load("e.event_id = %s AND e.event_date >= CURRENT_DATE", (event_id,))
+        self._apply(event_id, seq, rows)
+
+    def remove(self, event_id: int) -> None:
+        """刪除任務後呼叫；記下序號，之前開始讀的 refresh 不會再把它放回來"""
+        self._apply(event_id, self._next_seq(), None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            data = self._data
+            return {
+                "ready": data is not None,
+                "events": len(data.events) if data else 0,
+                "tokens": len(data.event_postings) if data else 0,
+                "built_at": self._built_at.isoformat() if self._built_at else None,
+                "served": self.served,
+                "fallbacks": self.fallbacks,
+                "stale_writes": self.stale_writes,
+            }
+
+    def _next_seq(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def _apply(self, event_id: int, seq: int, rows: Optional[List[Tuple]]) -> None:
+        """只套用比這個任務目前版本新的結果"""
+        with self._lock:
+            current = self._versions.get(event_id)
+            if seq < self._floor or (current is not None and current[0] > seq):
+                self.stale_writes += 1
+                return
+            self._versions[event_id] = (seq, rows)
+            if self._data is not None:
+                self._put_rows(self._data, event_id, rows)
+
+    @staticmethod
+    def _put_rows(data: _IndexData, event_id: int, rows: Optional[List[Tuple]]) -> None:
+        if not rows:
+            data.drop(event_id)
+        for row in rows or ():
+            data.put(row)
+
+    def _load(self, where: str, params: Tuple) -> List[Tuple]:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(EVENTS_SQL.format(where=where), params)
+                return cur.fetchall()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(REBUILD_SECONDS):
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(f"[SEARCH_INDEX] {e}")
+
+    # ---------- 查詢 ----------
+
+    def search(
+        self,
+        event_date: Optional[date] = None,
+        location_keyword: Optional[str] = None,
+        skill_keyword: Optional[str] = None,
+        title_keyword: Optional[str] = None,
+        only_available: bool = True,
+        include_finished: bool = False,
+        only_finished: bool = False,
+        future_only: bool = False,
+        past_only: bool = False,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        hour_from: Optional[int] = None,
+        hour_to: Optional[int] = None,
+        weekdays: Optional[List[int]] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Optional[List[Dict]]:
+        """
+        參數與回傳格式同 volunteer.search_tasks；
+        索引回答不了的查詢（尚未載入、要看已結束/過去的任務、關鍵字切不出詞）回傳 None，
+        由呼叫端改查 DB
+        """
+        terms = self._query_terms(
+            event_date, date_to, include_finished, only_finished, past_only,
+            title_keyword, location_keyword, skill_keyword,
+        )
+        if terms is None:
+            return None
+        title_terms, location_terms, skill_terms = terms
+        if order is None:
+            order = "relevance" if any(terms) else "date"
+        if order not in SEARCH_ORDERS:
+            raise ValueError(f"不支援的排序方式: {order}")
+
+        now = datetime.now()
+        with self._lock:
+            data = self._data
+            hits = []
+            for ev in self._match(
+                data, now, terms, event_date, date_from, date_to, hour_from, hour_to, weekdays
+            ):
+                if only_available and ev.active >= ev.capacity:
+                    continue
+                rank = 0.0
+                if title_terms:
+                    rank += self._rank(data.event_postings, ev.tokens, title_terms)
+                if location_terms:
+                    rank += self._rank(
+                        data.venue_postings, data.venues[ev.venue_id][2], location_terms
+                    )
+                # 捨去浮點誤差，和 SQL 端 numeric 加總的同分情況一致
+                hits.append((ev, round(rank, 6)))
+
+            hits.sort(key=_SORT_KEYS[order])
+            if order == "date_desc":
+                hits.reverse()
+            end = None if limit is None else offset + limit
+            page = hits[offset:end]
+            self.served += 1
+            return [self._result(data, ev, now) for ev, _ in page]
+
+    def facets(
+        self,
+        event_date: Optional[date] = None,
+        location_keyword: Optional[str] = None,
+        skill_keyword: Optional[str] = None,
+        title_keyword: Optional[str] = None,
+        only_available: bool = True,
+        include_finished: bool = False,
+        only_finished: bool = False,
+        future_only: bool = False,
+        past_only: bool = False,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        hour_from: Optional[int] = None,
+        hour_to: Optional[int] = None,
+        weekdays: Optional[List[int]] = None,
+    ) -> Optional[Dict]:
+        """分類統計，格式同 volunteer.search_facets；回答不了時回傳 None"""
+        terms = self._query_terms(
+            event_date, date_to, include_finished, only_finished, past_only,
+            title_keyword, location_keyword, skill_keyword,
+        )
+        if terms is None:
+            return None
+
+        venues: Dict[int, int] = {}
+        dates: Dict[date, int] = {}
+        skills: Dict[int, int] = {}
+        availability = {"available": 0, "full": 0}
+        with self._lock:
+            data = self._data
+            for ev in self._match(
+                data, datetime.now(), terms,
+                event_date, date_from, date_to, hour_from, hour_to, weekdays,
+            ):
+                available = ev.active < ev.capacity
+                availability["available" if available else "full"] += 1
+                if only_available and not available:
+                    continue
+                venues[ev.venue_id] = venues.get(ev.venue_id, 0) + 1
+                dates[ev.event_date] = dates.get(ev.event_date, 0) + 1
+                for skill_id in ev.skill_ids:
+                    skills[skill_id] = skills.get(skill_id, 0) + 1
+            self.served += 1
+            return sort_facets(
+                {
+                    "venue": [
+                        {"venue_id": venue_id, "name": data.venues[venue_id][0], "count": n}
+                        for venue_id, n in venues.items()
+                    ],
+                    "date": [{"date": d, "count": n} for d, n in dates.items()],
+                    "skill": [
+                        {"skill_id": skill_id, "name": data.skill_names[skill_id], "count": n}
+                        for skill_id, n in skills.items()
+                    ],
+                    "availability": availability,
+                }
+            )
+
+    def open_events(self, event_ids: Iterable[int]) -> Optional[List[Dict]]:
+        """
+        依傳入順序回傳其中尚未開始且未額滿的任務（格式同 search 的結果），給推薦用；
+        不在索引裡的（已結束、已刪除）直接略過。尚未載入時回傳 None
+        """
+        now = datetime.now()
+        with self._lock:
+            data = self._data
+            if data is None:
+                return None
+            result = []
+            for event_id in event_ids:
+                ev = data.events.get(event_id)
+                if (
+                    ev is None
+                    or ev.status != "Planned"
+                    or ev.start_at <= now
+                    or ev.active >= ev.capacity
+                ):
+                    continue
+                result.append(self._result(data, ev, now))
+            return result
+
+    def _query_terms(
+        self, event_date, date_to, include_finished, only_finished, past_only,
+        title_keyword, location_keyword, skill_keyword,
+    ) -> Optional[Tuple]:
+        """切好 (標題, 地點, 技能) 的查詢詞；索引回答不了時回傳 None"""
+        today = date.today()
+        if (
+            self._data is None
+            or include_finished
+            or only_finished
+            or past_only
+            or (event_date is not None and event_date < today)
+            or (date_to is not None and date_to < today)
+        ):
+            self.fallbacks += 1
+            return None
+        terms = tuple(
+            query_terms(keyword) if keyword else None
+            for keyword in (title_keyword, location_keyword, skill_keyword)
+        )
+        if any(t == [] for t in terms):
+            # 只有符號之類的關鍵字：SQL 會退回 ILIKE，這裡不處理
+            self.fallbacks += 1
+            return None
+        return terms
+
+    @staticmethod
+    def _match(
+        data: _IndexData, now: datetime, terms: Tuple,
+        event_date, date_from, date_to, hour_from, hour_to, weekdays,
+    ) -> Iterator[_Event]:
+        """符合關鍵字與日期/時段條件、還沒結束的任務（不管是否額滿）；呼叫端需持有 lock"""
+        title_terms, location_terms, skill_terms = terms
+        candidates: Optional[Set[int]] = None
+        if event_date is not None:
+            candidates = set(data.by_date.get(event_date, ()))
+        if title_terms:
+            ids = data.event_postings.match(title_terms)
+            candidates = ids if candidates is None else candidates & ids
+        if location_terms:
+            ids = set()
+            for venue_id in data.venue_postings.match(location_terms):
+                ids |= data.venue_events.get(venue_id, set())
+            candidates = ids if candidates is None else candidates & ids
+        if skill_terms:
+            ids = set()
+            for skill_id in data.skill_postings.match(skill_terms):
+                ids |= data.skill_events.get(skill_id, set())
+            candidates = ids if candidates is None else candidates & ids
+        if candidates is None:
+            candidates = set(data.events)
+
+        for event_id in candidates:
+            ev = data.events[event_id]
+            if ev.end_at <= now:
+                continue  # 已經結束，只是 lifecycle 還沒把狀態寫成 Finished
+            if date_from is not None and ev.event_date < date_from:
+                continue
+            if date_to is not None and ev.event_date > date_to:
+                continue
+            if hour_from is not None and ev.start_hour < hour_from:
+                continue
+            if hour_to is not None and ev.end_hour > hour_to:
+                continue
+            if weekdays and ev.event_date.isoweekday() not in weekdays:
+                continue
+            yield ev
+
+    @staticmethod
+    def _rank(postings: Postings, weights: Dict[str, float], terms) -> float:
+        """每個查詢詞取命中的詞裡最高的權重，再加總"""
+        total = 0.0
+        for term, prefix in terms:
+            total += max(
+                (weights[t] for t in postings.tokens_for(term, prefix) if t in weights),
+                default=0.0,
+            )
+        return total
+
+    @staticmethod
+    def _result(data: _IndexData, ev: _Event, now: datetime) -> Dict:
+        venue_name, address, _ = data.venues[ev.venue_id]
+        status = ev.status
+        if status == "Planned" and ev.start_at <= now:
+            status = "Ongoing"
+        return {
+            "event_id": ev.event_id,
+            "title": ev.title,
+            "date": ev.event_date,
+            "start_hour": ev.start_hour,
+            "end_hour": ev.end_hour,
+            "status": status,
+            "venue": venue_name,
+            "address": address,
+            "capacity": ev.capacity,
+            "active_volunteers": ev.active,
+            "slots_left": ev.capacity - ev.active,
+        }
+
+
+# 與 SEARCH_ORDERS 相同的排序；date_desc 以 date 排好再反轉
+_SORT_KEYS = {
+    "relevance": lambda hit: (-hit[1], hit[0].event_date, hit[0].event_id),
+    "date": lambda hit: (hit[0].event_date, hit[0].event_id),
+    "date_desc": lambda hit: (hit[0].event_date, hit[0].event_id),
+    "slots": lambda hit: (
+        hit[0].active - hit[0].capacity, hit[0].event_date, hit[0].event_id
+    ),
+}
+
+search_index = EventSearchIndex()
@@ -1,509 +1,288 @@
 # backend/server.py
+import argparse
+import asyncio
 import socket
-import json
-from datetime import date, datetime
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
 import threading
-from db import get_conn
-from analytics import log_search, top_keywords
-from volunteer import (
-    register_user,
-    search_tasks,
-    join_task,
-    cancel_participation,
-    get_user_history,
-    get_user_roles,
-    user_has_role,
-    list_users_with_roles,
-    add_role,
-    remove_role,
-    create_skill,
-    mark_finished_events,
-    update_user_profile,
-    get_event_participants,
-    get_venue_bookings,
-    is_venue_available,
-    get_user_active_participation,
-)
-from organizer import (
-    create_org,
-    create_venue,
-    create_event,
-    set_event_periods,
-    set_required_skills,
-    list_my_events,
-    list_venues,
-    list_skills,
-    get_or_create_default_org,
-    list_all_events_with_counts,
+from db import get_conn, request_scope
+from dispatcher import dispatch
+from event_actors import event_actors
+from lifecycle import scheduler
+from match_worker import match_worker
+from recommend import recommender
+from search_cache import search_cache
+from search_index import search_index
+from protocol import (
+    HEADER,
+    MAX_MESSAGE_BYTES,
+    MessageTooLarge,
+    RecvBuffer,
+    decode_request,
+    encode_line,
+    encode_message,
+    negotiate,
 )
+from sessions import sessions
+from signup_batch import signup_batcher
+import actions  # noqa: F401  匯入時註冊所有 action
 
 
 HOST = "127.0.0.1"
 PORT = 5050
-REGISTRATION_ROLES = {"Volunteer", "Organizer"}
-
-
-def serialize(obj: Any) -> Any:
-    """把 date/datetime 轉成字串，方便丟回給 client"""
-    if isinstance(obj, (date, datetime)):
-        return obj.isoformat()
-    if isinstance(obj, dict):
-        return {k: serialize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [serialize(v) for v in obj]
-    return obj
-
-
-def handle_request(req: Dict) -> Dict:
-    """根據 action 處理一個請求，回傳 dict"""
+# asyncio 模式：同時連線上限、執行 handle_request 的 thread 數、單行 request 上限
+MAX_CONNECTIONS = 10000
+EXECUTOR_WORKERS = 16
+MAX_LINE_BYTES = MAX_MESSAGE_BYTES
+MAX_PIPELINE_DEPTH = 128  # 每條連線最多先讀進來幾筆尚未處理的 request
+
+
+def handle_request(
+    req: Dict,
+    conn_state: Optional[Dict] = None,
+    emit: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    根據 action 處理一個請求，回傳 dict（各 action 的實作在 actions.py）
+    整個 request 共用一條連線、一個交易：成功才 commit，錯誤則整批 rollback
+    conn_state 為這條 TCP 連線的狀態（登入後的 session 存在這裡）
+    emit 為傳輸層提供的「先送出一段回應」函式，串流模式的 action 會用到
+    request 帶了 id 的話原樣放回 response，方便 pipelining 的 client 對照
+    """
     action = req.get("action")
-    params = req.get("params", {})
+    params = req.get("params") or {}
+    emit_chunk = None
+    if emit is not None:
 
-    # 每次請求先把已過期活動標記 Finished
-    try:
-        mark_finished_events()
-    except Exception:
-        # 不影響主流程，忽略
-        pass
-
-    def require_role(user_id: int, role: str) -> Optional[Dict]:
-        if not user_has_role(user_id, role):
-            return {"status": "error", "message": f"需具備 {role} 身分才能執行。"}
-        return None
+        def emit_chunk(chunk: Dict) -> None:
+            if "id" in req:
+                chunk["id"] = req["id"]
+            emit(chunk)
 
     try:
-        if action == "register_user":
-            user_name = params["user_name"]
-            email = params["email"]
-            phone = int(params["phone"])
-            password = params["password"]
-            role = params.get("role", "Volunteer")
-            role = role.strip().lower().capitalize()
-            if role not in REGISTRATION_ROLES:
-                return {
-                    "status": "error",
-                    "message": "註冊角色僅支援 Volunteer 或 Organizer。",
-                }
-            user_id = register_user(user_name, email, phone, password, role)
-            # 如果是 Organizer，自動建立一個同名 ORG 並綁定
-            if role == "Organizer":
-                create_org(f"{user_name} Org", email or f"{user_name}@example.org", user_id)
-            return {"status": "ok", "data": {"user_id": user_id, "roles": [role]}}
-
-        elif action == "login":
-            user_name = params["user_name"]
-            password = params["password"]
-            login_result = login_user(user_name, password)
-            if login_result is None:
-                # 帳號或密碼錯誤
-                return {
-                    "status": "error",
-                    "message": "帳號或密碼錯誤，請重新確認。",
-                }
-            user_id, roles = login_result
-            if not roles:
-                return {
-                    "status": "error",
-                    "message": "此帳號尚未被指派任何角色，請聯絡管理員。",
-                }
-            return {
-                "status": "ok",
-                "data": {"user_id": user_id, "user_name": user_name, "roles": roles},
-            }
-        # ---------- Organizer 功能 ----------
-        elif action == "create_venue":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Organizer")
-            if err:
-                return err
-            name = params["name"]
-            address = params["address"]
-            capacity = int(params["capacity"])
-            venue_id = create_venue(name, address, capacity)
-            return {"status": "ok", "data": {"venue_id": venue_id}}
-
-        elif action == "create_org":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Organizer")
-            if err:
-                return err
-            org_name = params["org_name"]
-            contact_email = params["contact_email"]
-            owner_user_id = int(params.get("owner_user_id", user_id))
-            org_id = create_org(org_name, contact_email, owner_user_id)
-            return {"status": "ok", "data": {"org_id": org_id}}
-
-        elif action == "create_event":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Organizer")
-            if err:
-                return err
-            owner_id = user_id  # 以自己為 owner
-            org_id = params.get("org_id")
-            if org_id is not None:
-                org_id = int(org_id)
-            else:
-                org_id = get_or_create_default_org(user_id)
-            venue_id = int(params["venue_id"])
-            event_date = date.fromisoformat(params["event_date"])
-            start_hour = int(params["start_hour"])
-            end_hour = int(params["end_hour"])
-            capacity = int(params["capacity"])
-            # 場地是否可用
-            if not is_venue_available(venue_id, event_date, start_hour, end_hour):
-                return {"status": "error", "message": "該場地該時段已被預約，請換時間"}
-            title = params.get("title", "")
-            description = params.get("description", "")
-            status = params.get("status", "Planned")
-            event_id = create_event(
-                owner_id,
-                org_id,
-                venue_id,
-                event_date,
-                start_hour,
-                end_hour,
-                capacity,
-                title,
-                description,
-                status,
-            )
-            return {"status": "ok", "data": {"event_id": event_id}}
-
-        elif action == "set_event_periods":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Organizer")
-            if err:
-                return err
-            event_id = int(params["event_id"])
-            if "start_hour" in params and "end_hour" in params:
-                start_hour = int(params["start_hour"])
-                end_hour = int(params["end_hour"])
-                hours = list(range(start_hour, end_hour))
-            else:
-                hours = [int(h) for h in params.get("hours", [])]
-            set_event_periods(event_id, hours)
-            return {"status": "ok", "data": True}
-
-        elif action == "set_required_skills":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Organizer")
-            if err:
-                return err
-            event_id = int(params["event_id"])
-            skill_weights = params.get("skill_weights", {})
-            set_required_skills(event_id, skill_weights)
-            return {"status": "ok", "data": True}
-
-        elif action == "list_my_events":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Organizer")
-            if err:
-                return err
-            events = list_my_events(user_id)
-            return {"status": "ok", "data": serialize(events)}
-
-        elif action == "list_venues":
-            venues = list_venues()
-            return {"status": "ok", "data": venues}
-
-        elif action == "list_skills":
-            skills = list_skills()
-            return {"status": "ok", "data": skills}
-
-        elif action == "get_event_participants":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Organizer")
-            if err:
-                return err
-            event_id = int(params["event_id"])
-            # 確認是自己的任務
-            events = list_my_events(user_id)
-            if not any(e["event_id"] == event_id for e in events):
-                return {"status": "error", "message": "僅能查看自己建立的任務"}
-            participants = get_event_participants(event_id)
-            return {"status": "ok", "data": serialize(participants)}
-
-        elif action == "check_venue_availability":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Organizer")
-            if err:
-                return err
-            venue_id = int(params["venue_id"])
-            event_date = date.fromisoformat(params["event_date"])
-            start_hour = int(params["start_hour"])
-            end_hour = int(params["end_hour"])
-            available = is_venue_available(venue_id, event_date, start_hour, end_hour)
-            conflicts = get_venue_bookings(venue_id, event_date) if not available else []
-            return {"status": "ok", "data": {"available": available, "conflicts": conflicts}}
-
-        elif action == "list_venue_bookings":
-            venue_id = int(params["venue_id"])
-            event_date = date.fromisoformat(params["event_date"])
-            bookings = get_venue_bookings(venue_id, event_date)
-            return {"status": "ok", "data": serialize(bookings)}
-
-        # ---------- Admin 功能（簡化） ----------
-        elif action == "admin_list_users":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            role_filter = params.get("role")
-            users = list_users_with_roles()
-            if role_filter:
-                role_std = role_filter.strip().lower().capitalize()
-                users = [u for u in users if role_std in u.get("roles", [])]
-            return {"status": "ok", "data": users}
-
-        elif action == "admin_add_role":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            target_user_id = int(params["target_user_id"])
-            role = params["role"]
-            add_role(target_user_id, role)
-            return {"status": "ok", "data": True}
-
-        elif action == "admin_remove_role":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            target_user_id = int(params["target_user_id"])
-            role = params["role"]
-            remove_role(target_user_id, role)
-            return {"status": "ok", "data": True}
-
-        elif action == "admin_create_skill":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            skill_name = params["skill_name"]
-            skill_id = create_skill(skill_name)
-            return {"status": "ok", "data": {"skill_id": skill_id}}
-
-        elif action == "admin_delete_event":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            event_id = int(params["event_id"])
-            with get_conn() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("DELETE FROM TASK_EVENT WHERE event_id = %s;", (event_id,))
-            return {"status": "ok", "data": True}
-
-        elif action == "admin_delete_venue":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            venue_id = int(params["venue_id"])
-            with get_conn() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("DELETE FROM VENUE WHERE venue_id = %s;", (venue_id,))
-            return {"status": "ok", "data": True}
-
-        elif action == "admin_delete_skill":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            skill_id = int(params["skill_id"])
-            with get_conn() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("DELETE FROM SKILL WHERE skill_id = %s;", (skill_id,))
-            return {"status": "ok", "data": True}
-
-        elif action == "admin_top_keywords":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            limit = int(params.get("limit", 10))
-            kws = top_keywords(limit)
-            return {"status": "ok", "data": kws}
-
-        elif action == "admin_list_events":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            events = list_all_events_with_counts()
-            return {"status": "ok", "data": serialize(events)}
-
-        elif action == "admin_event_participants":
-            user_id = int(params["user_id"])
-            err = require_role(user_id, "Admin")
-            if err:
-                return err
-            event_id = int(params["event_id"])
-            participants = get_event_participants(event_id)
-            return {"status": "ok", "data": serialize(participants)}
-
-        elif action == "update_profile":
-            user_id = int(params["user_id"])
-            update_user_profile(
-                user_id,
-                user_name=params.get("user_name"),
-                email=params.get("email"),
-                phone=int(params["phone"]) if params.get("phone") else None,
-                password=params.get("password"),
-            )
-            return {"status": "ok", "data": True}
-
-        elif action == "search_tasks":
-            # 文字轉成 date，如果是空字串就 None
-            event_date_str = params.get("event_date")
-            if event_date_str:
-                event_date = date.fromisoformat(event_date_str)
-            else:
-                event_date = None
-
-            location_keyword = params.get("location_keyword") or None
-            skill_keyword = params.get("skill_keyword") or None
-            title_keyword = params.get("title_keyword") or params.get("keyword") or None
-            only_available = bool(params.get("only_available", True))
-            include_finished = bool(params.get("include_finished", False))
-            only_finished = bool(params.get("only_finished", False))
-            future_only = bool(params.get("future_only", False))
-            past_only = bool(params.get("past_only", False))
-            user_id = int(params.get("user_id", 0)) if params.get("user_id") is not None else None
-
-            tasks = search_tasks(
-                event_date=event_date,
-                location_keyword=location_keyword,
-                skill_keyword=skill_keyword,
-                title_keyword=title_keyword,
-                only_available=only_available,
-                include_finished=include_finished,
-                only_finished=only_finished,
-                future_only=future_only,
-                past_only=past_only,
-            )
-            try:
-                log_search(
-                    user_id or 0,
-                    title_keyword or "",
-                    {
-                        "event_date": event_date_str or "",
-                        "location": location_keyword or "",
-                        "skill": skill_keyword or "",
-                        "only_available": only_available,
-                        "history": only_finished or past_only,
-                    },
-                    is_history=only_finished or past_only,
-                )
-            except Exception:
-                pass
-            return {"status": "ok", "data": serialize(tasks)}
-
-        elif action == "join_task":
-            user_id = int(params["user_id"])
-            if not user_has_role(user_id, "Volunteer"):
-                return {
-                    "status": "error",
-                    "message": "需具備 Volunteer 身分才能報名任務。",
-                }
-            event_id = int(params["event_id"])
-            result = join_task(user_id, event_id)
-            # result 可能是 "joined" 或 "waitlisted"
-            return {"status": "ok", "data": {"result": result}}
-
-        elif action == "cancel_participation":
-            user_id = int(params["user_id"])
-            if not user_has_role(user_id, "Volunteer"):
-                return {
-                    "status": "error",
-                    "message": "需具備 Volunteer 身分才能取消報名。",
-                }
-            event_id = int(params["event_id"])
-            success = cancel_participation(user_id, event_id)
-            return {"status": "ok", "data": {"success": success}}
-
-        elif action == "get_user_history":
-            user_id = int(params["user_id"])
-            if not user_has_role(user_id, "Volunteer"):
-                return {
-                    "status": "error",
-                    "message": "需具備 Volunteer 身分才能查看參與紀錄。",
-                }
-            history = get_user_history(user_id)
-            return {"status": "ok", "data": serialize(history)}
-
-        elif action == "get_user_active_participation":
-            user_id = int(params["user_id"])
-            if not user_has_role(user_id, "Volunteer"):
-                return {
-                    "status": "error",
-                    "message": "需具備 Volunteer 身分才能查看報名列表。",
-                }
-            data = get_user_active_participation(user_id)
-            return {"status": "ok", "data": serialize(data)}
-
-        else:
-            return {"status": "error", "message": f"Unknown action: {action}"}
-
+        with request_scope() as (conn, stats):
+            resp = dispatch(action, params, conn, conn_state, emit_chunk)
+            if resp.get("status") != "ok":
+                conn.rollback()
+                stats["after_commit"].clear()
     except Exception as e:
-        # 任何例外丟回去
-        return {"status": "error", "message": str(e)}
+        # commit 失敗或借不到連線
+        resp = {"status": "error", "message": str(e)}
+    else:
+        resp["queries"] = stats["queries"]
+    if "id" in req:
+        resp["id"] = req["id"]
+    return resp
 
 
 def handle_client(conn: socket.socket, addr):
     print(f"[SERVER] Connected by {addr}")
-    with conn:
-        buf = ""
-        while True:
-            chunk = conn.recv(4096)
-            if not chunk:
-                break
-            buf += chunk.decode("utf-8")
-            # 以換行為一筆 request
-            while "\n" in buf:
-                line, buf = buf.split("\n", 1)
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    req = json.loads(line)
-                except json.JSONDecodeError:
-                    resp = {"status": "error", "message": "Invalid JSON"}
-                else:
-                    resp = handle_request(req)
+    state: Dict = {}
+    codec: Optional[str] = None  # None：JSON 行模式；協商後為 frame 的 payload 格式
+    recv = RecvBuffer()
+    out = []
 
-                conn.sendall((json.dumps(resp) + "\n").encode("utf-8"))
-    print(f"[SERVER] Connection closed {addr}")
+    def emit(chunk: Dict) -> None:
+        # 串流的部分結果：連同前面還沒送出的回應一起立即送出，保持順序
+        out.append(encode_message(chunk, codec))
+        conn.sendall(b"".join(out))
+        out.clear()
 
-
-def main():
-    ensure_admin_account()
-    print(f"[SERVER] Listening on {HOST}:{PORT} ...")
+    try:
+        with conn:
+            while recv.fill(conn):
+                # 一次 recv 可能收到多筆 request（pipelining），依序處理、回應合併送出
+                while True:
+                    try:
+                        data = recv.next_line() if codec is None else recv.next_frame()
+                    except MessageTooLarge:
+                        out.append(
+                            encode_message({"status": "error", "message": "Request too large"}, codec)
+                        )
+                        conn.sendall(b"".join(out))
+                        return
+                    if data is None:
+                        break
+                    req, resp = decode_request(data, codec)
+                    if req is None and resp is None:
+                        continue
+                    if req is not None and codec is None and req.get("action") == "negotiate":
+                        # 協商結果仍以 JSON 行回覆，之後才改用 frame
+                        resp, codec = negotiate(req.get("params") or {})
+                        out.append(encode_line(resp))
+                        continue
+                    if req is not None:
+                        resp = handle_request(req, state, emit)
+                    out.append(encode_message(resp, codec))
+                if out:
+                    conn.sendall(b"".join(out))
+                    out.clear()
+    finally:
+        # 連線關閉，綁在上面的 session 一併失效
+        sessions.drop(state.get("session"))
+        print(f"[SERVER] Connection closed {addr}")
+
+
+def serve_threaded(host: str, port: int) -> None:
+    """舊模式：每個連線一條 thread"""
+    print(f"[SERVER] Listening on {host}:{port} (thread mode) ...")
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
+        s.bind((host, port))
         s.listen(50)  # 提高 backlog，允許多個連線
         while True:
             conn, addr = s.accept()
             t = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
             t.start()
 
-def login_user(user_name: str, password: str):
+
+async def serve_async(host: str, port: int, max_connections: int, workers: int) -> None:
     """
-    用 user_name + password 登入：
-    回傳 (user_id, roles)；找不到就回傳 None
+    asyncio 模式：閒置連線只佔一個 coroutine，
+    阻塞的 handle_request（DB 存取）丟到固定大小的 thread pool 執行
     """
-    sql = 'SELECT user_id FROM "USER" WHERE user_name = %s AND password = %s'
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, (user_name, password))
-            row = cur.fetchone()
-    if row:
-        user_id = row[0]
-        roles = get_user_roles(user_id)
-        return user_id, roles
-    return None
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="handler")
+    active = 0
+
+    async def send(writer: asyncio.StreamWriter, resp: Dict, codec: Optional[str] = None) -> None:
+        writer.write(encode_message(resp, codec))
+        await writer.drain()
+
+    async def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        nonlocal active
+        addr = writer.get_extra_info("peername")
+        if active >= max_connections:
+            # 超過上限直接拒絕，避免連線數無上限成長
+            try:
+                await send(writer, {"status": "error", "message": "伺服器連線數已達上限，請稍後再試。"})
+            finally:
+                writer.close()
+            return
+
+        active += 1
+        state: Dict = {}
+        # 已讀進來、等著處理的 request；client 不必等回應就能連送多筆（pipelining）
+        # 佇列項目為 (req, 直接回應, 回應用的 codec)，None 表示連線結束
+        pending: asyncio.Queue = asyncio.Queue(maxsize=MAX_PIPELINE_DEPTH)
+
+        async def read_requests() -> None:
+            codec: Optional[str] = None
+            try:
+                while True:
+                    try:
+                        if codec is None:
+                            data = await reader.readline()
+                            if not data:
+                                break
+                        else:
+                            (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                            if length > MAX_MESSAGE_BYTES:
+                                raise MessageTooLarge("Request too large")
+                            data = await reader.readexactly(length)
+                    except ValueError:
+                        # 單行超過 MAX_LINE_BYTES 或 frame 超過上限
+                        await pending.put(
+                            (None, {"status": "error", "message": "Request too large"}, codec)
+                        )
+                        break
+                    req, resp = decode_request(data, codec)
+                    if req is None and resp is None:
+                        continue
+                    if req is not None and codec is None and req.get("action") == "negotiate":
+                        # 協商結果仍以 JSON 行回覆，之後的讀寫都改用 frame
+                        resp, new_codec = negotiate(req.get("params") or {})
+                        await pending.put((None, resp, None))
+                        codec = new_codec
+                        continue
+                    await pending.put((req, resp, codec))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            await pending.put(None)
+
+        def make_emit(codec: Optional[str]) -> Callable[[Dict], None]:
+            def emit(chunk: Dict) -> None:
+                # 在 worker thread 呼叫：交給 event loop 送出並等 drain，
+                # 對方收得慢時串流也跟著放慢，記憶體不會堆積
+                asyncio.run_coroutine_threadsafe(send(writer, chunk, codec), loop).result()
+
+            return emit
+
+        print(f"[SERVER] Connected by {addr} (active={active})")
+        reader_task = asyncio.create_task(read_requests())
+        try:
+            # 同一條連線的 request 一次只處理一筆，回應順序與送出順序相同
+            # （後面的 request 可能依賴前一筆的結果，例如登入）
+            while True:
+                item = await pending.get()
+                if item is None:
+                    break
+                req, resp, codec = item
+                if resp is None:
+                    resp = await loop.run_in_executor(
+                        executor, handle_request, req, state, make_emit(codec)
+                    )
+                await send(writer, resp, codec)
+        except ConnectionError:
+            pass
+        finally:
+            reader_task.cancel()
+            active -= 1
+            sessions.drop(state.get("session"))
+            writer.close()
+            print(f"[SERVER] Connection closed {addr} (active={active})")
+
+    server = await asyncio.start_server(
+        on_connect, host, port, limit=MAX_LINE_BYTES, backlog=1024
+    )
+    print(
+        f"[SERVER] Listening on {host}:{port} (asyncio mode, "
+        f"max_connections={max_connections}, workers={workers}) ..."
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro Volunteer TCP server")
+    parser.add_argument(
+        "--mode",
+        choices=("asyncio", "thread"),
+        default="asyncio",
+        help="asyncio：單一 event loop + thread pool；thread：舊的每連線一條 thread",
+    )
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--workers", type=int, default=EXECUTOR_WORKERS)
+    parser.add_argument(
+        "--group-signup",
+        action="store_true",
+        help="同一任務同時到的 join_task 合併成一個交易處理（熱門任務開放報名時）",
+    )
+    parser.add_argument(
+        "--event-owners",
+        type=int,
+        default=0,
+        help="join_task / cancel_participation 依 event_id 分給 N 個 owner thread 依序處理（0 = 關閉）",
+    )
+    args = parser.parse_args()
+    signup_batcher.enabled = args.group_signup
+
+    ensure_admin_account()
+    # 任務狀態改由背景排程在開始/結束時間點更新，request 不再做生命週期寫入
+    scheduler.add_listener(search_cache.on_transition)
+    scheduler.add_listener(recommender.on_transition)
+    match_worker.add_listener(recommender.on_scores_changed)
+    scheduler.start()
+    search_index.start()
+    match_worker.start()
+    if args.event_owners > 0:
+        event_actors.start(args.event_owners)
+    if args.mode == "thread":
+        serve_threaded(args.host, args.port)
+    else:
+        asyncio.run(serve_async(args.host, args.port, args.max_connections, args.workers))
 
 
 def ensure_admin_account():
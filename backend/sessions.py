@@ -0,0 +1,81 @@
+# backend/sessions.py
+# 登入 session：token 綁在 TCP 連線上，並快取使用者角色，
+# 受保護的 action 只需做記憶體查詢，不必每次都查 USER_ROLE
+import secrets
+import threading
+from typing import Dict, List, Optional, Set
+
+from psycopg import Connection
+
+from volunteer import get_user_roles
+
+
+class Session:
+    def __init__(self, user_id: int, user_name: str, roles: List[str]):
+        self.token = secrets.token_hex(16)
+        self.user_id = user_id
+        self.user_name = user_name
+        # None 表示角色已被 admin 修改過，下次檢查時重新從 DB 載入
+        self.roles: Optional[Set[str]] = set(roles)
+        # 每次作廢 +1；重新載入期間若又被作廢，載入結果就是舊的，不能寫回
+        self.invalidations = 0
+
+
+class SessionStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_token: Dict[str, Session] = {}
+        self._by_user: Dict[int, Set[str]] = {}
+        self.role_reloads = 0
+
+    def create(self, user_id: int, user_name: str, roles: List[str]) -> Session:
+        session = Session(user_id, user_name, roles)
+        with self._lock:
+            self._by_token[session.token] = session
+            self._by_user.setdefault(user_id, set()).add(session.token)
+        return session
+
+    def drop(self, session: Optional[Session]) -> None:
+        """登出或連線關閉時呼叫"""
+        if session is None:
+            return
+        with self._lock:
+            self._by_token.pop(session.token, None)
+            tokens = self._by_user.get(session.user_id)
+            if tokens is not None:
+                tokens.discard(session.token)
+                if not tokens:
+                    del self._by_user[session.user_id]
+
+    def invalidate_user(self, user_id: int) -> None:
+        """admin 增刪角色後呼叫：該使用者所有 session 的角色快取作廢"""
+        with self._lock:
+            for token in self._by_user.get(user_id, ()):
+                session = self._by_token[token]
+                session.roles = None
+                session.invalidations += 1
+
+    def has_role(
+        self, session: Session, role: str, conn: Optional[Connection] = None
+    ) -> bool:
+        with self._lock:
+            roles = session.roles
+            invalidations = session.invalidations
+        if roles is None:
+            roles = set(get_user_roles(session.user_id, conn=conn))
+            with self._lock:
+                if session.invalidations == invalidations:
+                    session.roles = roles
+                self.role_reloads += 1
+        return role in roles
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": len(self._by_token),
+                "users": len(self._by_user),
+                "role_reloads": self.role_reloads,
+            }
+
+
+sessions = SessionStore()
@@ -0,0 +1,123 @@
+# backend/signup_batch.py
+# 熱門任務的報名合併（group commit）：同一個任務同時湧入的 join_task 排成一列，
+# 由第一個到的 request（leader）用自己的連線一次處理整批、commit 一次，
+# 其他 request 等結果即可，不必各自排隊搶 TASK_EVENT 的列鎖、各自 commit。
+#   - leader 處理期間新到的報名累積成下一批，結束時交給下一批的第一位接手
+#   - 名額依到達順序分配（volunteer.join_task_batch），不會超額，結果和逐筆報名相同
+#   - 沒有競爭時每批只有自己一筆，等同原本的逐筆報名
+#   - 整批失敗時 rollback 後逐筆重做，只有出錯的那筆回傳錯誤
+# server 以 --group-signup 開啟；batch action 內的 join_task 仍在原交易內逐筆處理
+import threading
+from typing import Dict, List, Optional
+
+from psycopg import Connection
+
+from volunteer import join_task_batch
+
+MAX_BATCH_SIZE = 500
+
+
+class _Ticket:
+    __slots__ = ("user_id", "done", "lead", "result", "error")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.done = threading.Event()
+        self.lead = False  # 被指派為下一批的 leader
+        self.result: Optional[str] = None
+        self.error: Optional[Exception] = None
+
+
+class SignupBatcher:
+    def __init__(self):
+        self.enabled = False
+        self._pending: Dict[int, List[_Ticket]] = {}  # event_id -> 等待中的報名
+        self._running: set = set()  # 正在處理某一批的 event_id
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.errors = 0
+
+    def join(self, user_id: int, event_id: int, conn: Connection) -> str:
+        """
+        報名並等結果（'joined' / 'waitlisted'）。conn 是這個 request 的連線：
+        輪到自己當 leader 時整批在上面執行並 commit，所以呼叫端的交易不能有其他未 commit 的寫入
+        """
+        ticket = _Ticket(user_id)
+        with self._lock:
+            self.requests += 1
+            self._pending.setdefault(event_id, []).append(ticket)
+            if event_id in self._running:
+                lead = False
+            else:
+                self._running.add(event_id)
+                lead = True
+        while not lead:
+            ticket.done.wait()
+            if not ticket.lead:
+                break
+            ticket.lead, lead = False, True
+            ticket.done.clear()
+        if lead:
+            self._lead(event_id, conn)
+        if ticket.error is not None:
+            raise ticket.error
+        return ticket.result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch": round(self.requests / self.batches, 2) if self.batches else 0,
+                "max_batch": self.max_batch,
+                "errors": self.errors,
+                "pending": sum(len(tickets) for tickets in self._pending.values()),
+            }
+
+    # ---------- 內部 ----------
+
+    def _lead(self, event_id: int, conn: Connection) -> None:
+        with self._lock:
+            pending = self._pending[event_id]
+            batch = pending[:MAX_BATCH_SIZE]
+            del pending[:MAX_BATCH_SIZE]
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+        try:
+            results = join_task_batch(event_id, [t.user_id for t in batch], conn=conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            with self._lock:
+                self.errors += 1
+            self._retry_one_by_one(event_id, batch, conn)
+        else:
+            for ticket, result in zip(batch, results):
+                ticket.result = result
+        with self._lock:
+            if pending:
+                # 處理期間到的報名由下一批的第一位用他自己的連線接手
+                successor = pending[0]
+                successor.lead = True
+                successor.done.set()
+            else:
+                del self._pending[event_id]
+                self._running.discard(event_id)
+        for ticket in batch:
+            ticket.done.set()
+
+    @staticmethod
+    def _retry_one_by_one(event_id: int, batch: List[_Ticket], conn: Connection) -> None:
+        for ticket in batch:
+            try:
+                ticket.result = join_task_batch(event_id, [ticket.user_id], conn=conn)[0]
+                conn.commit()
+            except Exception as e:
+                ticket.error = e
+                conn.rollback()
+
+
+signup_batcher = SignupBatcher()
@@ -0,0 +1,386 @@
+# backend/staffing.py
+"""
+批次排班：把一批任務的剩餘名額一次分配給志工，讓 MATCH_SCORE 總和最大
+
+限制：
+  - 每個任務不超過剩餘名額（capacity - Active 人數）
+  - 同一位志工不能排到時段重疊的任務，也不能和他已報名的任務重疊
+  - 只考慮有 MATCH_SCORE 的組合（至少具備一項需求技能）
+
+做法：
+  1. 同一天時段重疊（連鎖重疊也算）的任務併成一群，每位志工在一群裡最多排一個任務，
+     各群彼此獨立，每群就是一個指派問題：任務依名額展開成欄、志工為列，
+     用 scipy 的 linear_sum_assignment 求分數總和最大的指派。
+     每個任務只保留分數前 S 名的候選（S = 這群的總名額）：其餘的人就算被選上，
+     也一定能換成前 S 名裡沒被排到的人而分數不變小，所以不影響最佳解
+  2. 同一群裡其實不重疊的任務（例如 9-11 與 11-13 被 10-12 連在一起）第一步只能擇一，
+     剩下的名額再依分數高低貪婪補上不衝突的志工
+  矩陣超過 MAX_DENSE_CELLS 格的群直接用貪婪法。
+
+需要 numpy 與 scipy（pip install scipy）。用法：
+    python3 staffing.py                          # 試算所有未開始的任務（不寫入），印出耗時
+    python3 staffing.py --synthetic 10000x500    # 隨機產生 1 萬志工 × 500 任務，測求解速度
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from psycopg import Connection
+
+from db import get_conn, use_conn
+from match_score import score_blocks
+from volunteer import reconcile_event_counts
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # 沒裝 scipy 就不能排班，其餘功能照常
+    linear_sum_assignment = None
+
+MAX_DENSE_CELLS = 20_000_000  # 約 160 MB 的 float64 矩陣
+
+# 一個時段：(日期, 開始小時, 結束小時)
+Slot = Tuple[date, int, int]
+
+
+def _overlaps(slots: List[Slot], slot: Slot) -> bool:
+    d, start, end = slot
+    return any(d == d2 and start < e2 and s2 < end for d2, s2, e2 in slots)
+
+
+def _clusters(slots: List[Slot]) -> List[List[int]]:
+    """同一天時段有重疊（含連鎖重疊）的任務併成一群，回傳各群的任務編號"""
+    order = sorted(range(len(slots)), key=lambda i: slots[i])
+    clusters: List[List[int]] = []
+    cur_date, cur_end = None, -1
+    for i in order:
+        d, start, end = slots[i]
+        if clusters and d == cur_date and start < cur_end:
+            clusters[-1].append(i)
+            cur_end = max(cur_end, end)
+        else:
+            clusters.append([i])
+            cur_date, cur_end = d, end
+    return clusters
+
+
+class _Plan:
+    """求解過程的狀態：剩餘名額、每位志工已佔用的時段、已排的組合"""
+
+    def __init__(self, slots: List[Slot], remaining: List[int], busy: Dict[int, List[Slot]]):
+        self.slots = slots
+        self.remaining = list(remaining)
+        self.taken = {user_id: list(s) for user_id, s in busy.items()}
+        self.assigned: List[Tuple[int, int, float]] = []  # (user_id, 任務編號, score)
+
+    def free(self, user_id: int, event: int) -> bool:
+        taken = self.taken.get(user_id)
+        return not taken or not _overlaps(taken, self.slots[event])
+
+    def add(self, user_id: int, event: int, score: float) -> None:
+        self.taken.setdefault(user_id, []).append(self.slots[event])
+        self.remaining[event] -= 1
+        self.assigned.append((user_id, event, score))
+
+    def greedy(self, users: np.ndarray, events: np.ndarray, scores: np.ndarray) -> None:
+        """依分數由高到低，能排就排"""
+        for i in np.argsort(-scores, kind="stable").tolist():
+            event = int(events[i])
+            user_id = int(users[i])
+            if self.remaining[event] > 0 and self.free(user_id, event):
+                self.add(user_id, event, float(scores[i]))
+
+
+def solve(
+    slots: List[Slot],
+    remaining: List[int],
+    users: np.ndarray,
+    events: np.ndarray,
+    scores: np.ndarray,
+    busy: Optional[Dict[int, List[Slot]]] = None,
+) -> Tuple[List[Tuple[int, int, float]], Dict]:
+    """
+    slots / remaining：各任務的時段與剩餘名額（以任務編號 0..n-1 表示）
+    users / events / scores：候選組合（user_id、任務編號、分數）
+    busy：志工已報名任務的時段
+    回傳 ([(user_id, 任務編號, score)], 統計)
+    """
+    if linear_sum_assignment is None:
+        raise ValueError("批次排班需要安裝 scipy（pip install scipy）")
+    busy = busy or {}
+    stats = {"clusters": 0, "greedy_clusters": 0, "candidates": len(users)}
+
+    # 和已報名任務衝突的組合先拿掉（已報名的任務本身也會被拿掉）
+    if busy:
+        keep = np.fromiter(
+            (
+                int(u) not in busy or not _overlaps(busy[int(u)], slots[int(e)])
+                for u, e in zip(users.tolist(), events.tolist())
+            ),
+            dtype=bool,
+            count=len(users),
+        )
+        users, events, scores = users[keep], events[keep], scores[keep]
+
+    # 依任務分組，組內分數由高到低
+    order = np.lexsort((-scores, events))
+    users, events, scores = users[order], events[order], scores[order]
+    bounds = np.searchsorted(events, np.arange(len(slots) + 1))
+
+    plan = _Plan(slots, remaining, busy)
+    for cluster in _clusters(slots):
+        stats["clusters"] += 1
+        cluster = [e for e in cluster if plan.remaining[e] > 0 and bounds[e] < bounds[e + 1]]
+        if not cluster:
+            continue
+        total = sum(min(plan.remaining[e], bounds[e + 1] - bounds[e]) for e in cluster)
+        # 每個任務只留前 total 名候選
+        picks = [np.arange(bounds[e], min(bounds[e + 1], bounds[e] + total)) for e in cluster]
+        idx = np.concatenate(picks)
+        rows = np.unique(users[idx])
+        if len(rows) * total > MAX_DENSE_CELLS:
+            stats["greedy_clusters"] += 1
+            plan.greedy(users[idx], events[idx], scores[idx])
+            continue
+
+        cost = np.zeros((len(rows), total))
+        col_event = np.empty(total, dtype=np.int64)
+        col = 0
+        for e, pick in zip(cluster, picks):
+            n = min(plan.remaining[e], len(pick))
+            r = np.searchsorted(rows, users[pick])
+            cost[r, col:col + n] = -scores[pick][:, None]
+            col_event[col:col + n] = e
+            col += n
+        ri, ci = linear_sum_assignment(cost)
+        chosen = cost[ri, ci] < 0  # 分數 0 的格子表示這個名額沒人
+        for r, c in zip(ri[chosen].tolist(), ci[chosen].tolist()):
+            plan.add(int(rows[r]), int(col_event[c]), float(-cost[r, c]))
+
+    # 第二步：還有名額的任務，補上不衝突的志工
+    assigned = {(u, e) for u, e, _ in plan.assigned}
+    open_events = np.array([r > 0 for r in plan.remaining], dtype=bool)
+    mask = open_events[events] if len(events) else np.zeros(0, dtype=bool)
+    if mask.any():
+        idx = np.nonzero(mask)[0]
+        idx = idx[[(int(u), int(e)) not in assigned for u, e in zip(users[idx], events[idx])]]
+        before = len(plan.assigned)
+        plan.greedy(users[idx], events[idx], scores[idx])
+        stats["filled_by_greedy"] = len(plan.assigned) - before
+    else:
+        stats["filled_by_greedy"] = 0
+
+    stats["assigned"] = len(plan.assigned)
+    stats["total_score"] = round(sum(s for _, _, s in plan.assigned), 2)
+    stats["unfilled_slots"] = sum(plan.remaining)
+    return plan.assigned, stats
+
+
+# ---------- DB ----------
+
+def staff_events(
+    owner_id: int,
+    event_ids: Optional[List[int]] = None,
+    apply: bool = False,
+    conn: Optional[Connection] = None,
+) -> Dict:
+    """
+    為 owner_id 建立、尚未開始的任務（event_ids 為 None 表示全部）排班；
+    apply=True 時鎖住這些任務並直接寫入 PARTICIPATION（Active），否則只試算。
+    回傳 {"assignments": [...], "events": [...], "stats": {...}}
+    """
+    now = datetime.now()
+    started = time.perf_counter()
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            where = """
+                e.owner_id = %s
+                AND e.status = 'Planned'
+                AND e.event_date >= %s
+                AND e.event_date + e.start_hour * INTERVAL '1 hour' > %s
+            """
+            params: List = [owner_id, now.date(), now]
+            if event_ids is not None:
+                where += " AND e.event_id = ANY(%s)"
+                params.append(list(event_ids))
+            if apply:
+                # 和 join_task 一樣鎖住任務，人數在這個交易結束前不會變
+                cur.execute(
+                    f"SELECT e.event_id FROM TASK_EVENT e WHERE {where} "
+                    "ORDER BY e.event_id FOR UPDATE;",
+                    params,
+                )
+            cur.execute(
+                f"""
+                SELECT e.event_id, e.event_date, e.start_hour, e.end_hour,
+                       e.capacity - e.active_count
+                FROM TASK_EVENT e
+                WHERE {where}
+                ORDER BY e.event_id;
+                """,
+                params,
+            )
+            event_rows = cur.fetchall()
+            ids = [r[0] for r in event_rows]
+            cur.execute(
+                """
+                SELECT m.user_id, m.event_id, m.score
+                FROM MATCH_SCORE m
+                JOIN USER_ROLE r ON r.user_id = m.user_id AND r.role = 'Volunteer'
+                WHERE m.event_id = ANY(%s);
+                """,
+                (ids,),
+            )
+            pair_rows = cur.fetchall()
+            cur.execute(
+                """
+                SELECT p.user_id, e.event_date, e.start_hour, e.end_hour
+                FROM PARTICIPATION p
+                JOIN TASK_EVENT e ON e.event_id = p.event_id
+                WHERE p.status = 'Active' AND e.event_date = ANY(%s);
+                """,
+                (sorted({r[1] for r in event_rows}),),
+            )
+            busy: Dict[int, List[Slot]] = {}
+            for user_id, d, start, end in cur.fetchall():
+                busy.setdefault(user_id, []).append((d, start, end))
+        load_s = time.perf_counter() - started
+
+        pos = {event_id: i for i, event_id in enumerate(ids)}
+        slots = [(r[1], r[2], r[3]) for r in event_rows]
+        remaining = [max(r[4], 0) for r in event_rows]
+        mark = time.perf_counter()
+        assigned, stats = solve(
+            slots,
+            remaining,
+            np.fromiter((r[0] for r in pair_rows), dtype=np.int64, count=len(pair_rows)),
+            np.fromiter((pos[r[1]] for r in pair_rows), dtype=np.int64, count=len(pair_rows)),
+            np.fromiter((r[2] for r in pair_rows), dtype=np.float64, count=len(pair_rows)),
+            busy,
+        )
+        solve_s = time.perf_counter() - mark
+
+        assignments = [
+            {"user_id": user_id, "event_id": ids[e], "score": score}
+            for user_id, e, score in sorted(assigned, key=lambda a: (ids[a[1]], -a[2], a[0]))
+        ]
+        if apply and assignments:
+            apply_assignments(assignments, now, conn=conn)
+
+    filled: Dict[int, int] = {}
+    for a in assignments:
+        filled[a["event_id"]] = filled.get(a["event_id"], 0) + 1
+    return {
+        "assignments": assignments,
+        "events": [
+            {"event_id": event_id, "assigned": filled.get(event_id, 0),
+             "slots_left": remaining[i] - filled.get(event_id, 0)}
+            for i, event_id in enumerate(ids)
+        ],
+        "stats": {
+            "events": len(ids),
+            "volunteers": len({r[0] for r in pair_rows}),
+            **stats,
+            "applied": apply,
+            "load_s": round(load_s, 3),
+            "solve_s": round(solve_s, 3),
+            "total_s": round(time.perf_counter() - started, 3),
+        },
+    }
+
+
+def apply_assignments(
+    assignments: List[Dict], join_time: datetime, conn: Optional[Connection] = None
+) -> None:
+    """
+    一次寫入所有排班結果（Active），並刪掉這些人在該任務的候補；
+    最後重算這些任務的報名/候補人數（呼叫端需已鎖住任務）
+    """
+    user_ids = [a["user_id"] for a in assignments]
+    event_ids = [a["event_id"] for a in assignments]
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO PARTICIPATION (user_id, event_id, join_time, role, status)
+                SELECT a.user_id, a.event_id, %s, 'Volunteer', 'Active'
+                FROM unnest(%s::bigint[], %s::bigint[]) AS a(user_id, event_id)
+                ON CONFLICT (user_id, event_id)
+                DO UPDATE SET status = 'Active', join_time = EXCLUDED.join_time;
+                """,
+                (join_time, user_ids, event_ids),
+            )
+            cur.execute(
+                """
+                DELETE FROM WAITLIST w
+                USING unnest(%s::bigint[], %s::bigint[]) AS a(user_id, event_id)
+                WHERE w.user_id = a.user_id AND w.event_id = a.event_id;
+                """,
+                (user_ids, event_ids),
+            )
+        reconcile_event_counts(sorted(set(event_ids)), conn=conn)
+
+
+# ---------- 測試 ----------
+
+def synthetic_problem(n_users: int, n_events: int, seed: int = 0):
+    """
+    隨機產生排班問題：20 種技能、每位志工 0~4 項技能、每個任務 1~3 項需求技能，
+    任務分散在 30 天、8~18 點，名額 5~20；分數用 match_score 的公式計算
+    """
+    rng = np.random.default_rng(seed)
+    n_skills = 20
+    L = np.zeros((n_users, n_skills))
+    for u in range(n_users):
+        k = rng.integers(0, 5)
+        L[u, rng.choice(n_skills, k, replace=False)] = rng.integers(1, 6, k)
+    W = np.zeros((n_events, n_skills))
+    for e in range(n_events):
+        k = rng.integers(1, 4)
+        W[e, rng.choice(n_skills, k, replace=False)] = rng.integers(1, 4, k)
+
+    users, events, scores = [], [], []
+    for block in score_blocks(np.arange(n_users), np.arange(n_events), L, W):
+        users.append(block[0])
+        events.append(block[1])
+        scores.append(block[2])
+
+    today = date.today()
+    slots: List[Slot] = []
+    for _ in range(n_events):
+        start = int(rng.integers(8, 16))
+        slots.append((today + timedelta(days=int(rng.integers(0, 30))), start,
+                      min(start + int(rng.integers(1, 5)), 18)))
+    remaining = rng.integers(5, 21, n_events).tolist()
+    return slots, remaining, np.concatenate(users), np.concatenate(events), np.concatenate(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次排班試算")
+    parser.add_argument("--synthetic", metavar="志工數x任務數", help="用隨機資料測求解速度")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        n_users, n_events = (int(x) for x in args.synthetic.lower().split("x"))
+        slots, remaining, users, events, scores = synthetic_problem(n_users, n_events)
+        started = time.perf_counter()
+        _, stats = solve(slots, remaining, users, events, scores)
+        stats["solve_s"] = round(time.perf_counter() - started, 3)
+        print(f"志工 {n_users} 位 × 任務 {n_events} 個，總名額 {sum(remaining)}")
+    else:
+        # 每位 Organizer 各自試算，加總結果
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT DISTINCT owner_id FROM TASK_EVENT WHERE status = 'Planned';")
+                owners = [r[0] for r in cur.fetchall()]
+            stats = {"events": 0, "assigned": 0, "total_score": 0.0, "solve_s": 0.0}
+            for owner_id in owners:
+                result = staff_events(owner_id, conn=conn)["stats"]
+                for key in stats:
+                    stats[key] = round(stats[key] + result[key], 3)
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# backend/text_search.py
+# 中英文混合的關鍵字切詞，規則與 sql/schema.sql 的 cjk_tokens() 一致：
+#   - 英數字：整個字（轉小寫）
+#   - 中日韓文字：每個字（unigram）與相鄰兩字（bigram），
+#     所以「海灘」可以被「海」、「海灘」、「台南海灘」找到
+# 文件端在 DB 內以 cjk_tokens() 產生 tsvector（generated column + GIN 索引），
+# 查詢端由這裡組出 tsquery 字串。
+# 相關度：每個查詢詞取命中的詞裡最高的權重（標題/場地名稱高於描述/地址），再加總；
+# search_index 與 SQL（rank_sql）用同一套算法，兩邊回傳的順序相同
+import re
+from typing import List, Optional, Tuple
+
+WEIGHT_PRIMARY = 1.0  # 標題 / 場地名稱
+WEIGHT_SECONDARY = 0.4  # 描述 / 地址
+
+TOKEN_RE = re.compile(
+    r"[a-z0-9]+"
+    r"|[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+"
+)
+
+
+def _is_word(run: str) -> bool:
+    return run[0].isascii()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """文件端切詞（與 SQL 的 cjk_tokens() 相同）"""
+    tokens: List[str] = []
+    for run in TOKEN_RE.findall((text or "").lower()):
+        if _is_word(run):
+            tokens.append(run)
+            continue
+        for i, ch in enumerate(run):
+            tokens.append(ch)
+            if i + 1 < len(run):
+                tokens.append(run[i:i + 2])
+    return tokens
+
+
+def query_terms(text: Optional[str]) -> List[Tuple[str, bool]]:
+    """
+    查詢端切詞，回傳 [(詞, 是否為前綴比對)]：
+    英數字做前綴比對（"beach" 可找到 "beaches"），中文連續兩字以上用 bigram、單字用 unigram
+    """
+    terms: List[Tuple[str, bool]] = []
+    for run in TOKEN_RE.findall((text or "").lower()):
+        if _is_word(run):
+            terms.append((run, True))
+        elif len(run) == 1:
+            terms.append((run, False))
+        else:
+            terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+    # 去掉重複的詞，保留順序
+    return list(dict.fromkeys(terms))
+
+
+def to_tsquery(text: Optional[str]) -> Optional[str]:
+    """把關鍵字轉成 tsquery 字串（所有詞都要出現）；切不出任何詞時回傳 None"""
+    terms = query_terms(text)
+    if not terms:
+        return None
+    # 詞只會是英數字或中日韓文字，不含引號或反斜線，可以直接加引號
+    return " & ".join(f"'{term}'" + (":*" if prefix else "") for term, prefix in terms)
+
+
+def rank_sql(primary: str, tsv: str, text: Optional[str]) -> Optional[Tuple[str, List[str]]]:
+    """
+    相關度 SQL 與參數，算法同 search_index：每個詞命中 primary（標題/場地名稱欄位）
+    得 WEIGHT_PRIMARY，只命中 tsv 其餘部分（描述/地址）得 WEIGHT_SECONDARY。
+    array_to_tsvector 產生的詞沒有位置，setweight 的權重不會保留，所以主要欄位在這裡另外切詞比對；
+    切不出任何詞時回傳 None
+    """
+    terms = query_terms(text)
+    if not terms:
+        return None
+    primary_tsv = f"array_to_tsvector(cjk_tokens({primary}))"
+    cases = []
+    params: List[str] = []
+    for term, prefix in terms:
+        query = f"'{term}'" + (":*" if prefix else "")
+        cases.append(
+            f"CASE WHEN {primary_tsv} @@ %s::tsquery THEN {WEIGHT_PRIMARY} "
+            f"WHEN {tsv} @@ %s::tsquery THEN {WEIGHT_SECONDARY} ELSE 0 END"
+        )
+        params.extend([query, query])
+    return "(" + " + ".join(cases) + ")", params
@@ -1,9 +1,12 @@
 # backend/volunteer.py
 from datetime import datetime, date
-from db import get_conn
-from typing import Optional, List, Dict
+from psycopg import Connection
+from db import use_conn, stream_rows
+from text_search import rank_sql, to_tsquery
+from typing import Optional, List, Dict, Iterator, Tuple
 
 ALLOWED_ROLES = {"Volunteer", "Organizer", "Admin"}
+STREAM_CHUNK_SIZE = 500
 
 # ---------- 1. 註冊使用者 ----------
 
@@ -13,6 +16,7 @@ def register_user(
     phone: int,
     password: str,
     role: str = "Volunteer",
+    conn: Optional[Connection] = None,
 ) -> int:
     """
     建立一個新 user，並寫入預設角色，回傳 user_id
@@ -25,7 +29,7 @@ def register_user(
         VALUES (%s, %s, %s, %s)
         RETURNING user_id;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (user_name, email, phone, password))
             user_id = cur.fetchone()[0]
@@ -42,7 +46,7 @@ def register_user(
 
 # ---------- 2. 技能相關 ----------
 
-def create_skill(skill_name: str) -> int:
+def create_skill(skill_name: str, conn: Optional[Connection] = None) -> int:
     """
     新增一個技能（例如: First Aid, Logistics），回傳 skill_id
     """
@@ -52,14 +56,16 @@ def create_skill(skill_name: str) -> int:
         ON CONFLICT (skill_name) DO UPDATE SET skill_name = EXCLUDED.skill_name
         RETURNING skill_id;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (skill_name,))
             skill_id = cur.fetchone()[0]
     return skill_id
 
 
-def set_user_skill(user_id: int, skill_id: int, level: int) -> None:
+def set_user_skill(
+    user_id: int, skill_id: int, level: int, conn: Optional[Connection] = None
+) -> None:
     """
     設定使用者某個技能的等級（1~5），如果已存在就更新
     """
@@ -69,13 +75,13 @@ def set_user_skill(user_id: int, skill_id: int, level: int) -> None:
         ON CONFLICT (user_id, skill_id)
         DO UPDATE SET level = EXCLUDED.level;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (user_id, skill_id, level))
 
-def get_user_roles(user_id: int) -> List[str]:
+def get_user_roles(user_id: int, conn: Optional[Connection] = None) -> List[str]:
     """查詢使用者的所有角色"""
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 "SELECT role FROM USER_ROLE WHERE user_id = %s;",
@@ -85,9 +91,9 @@ def get_user_roles(user_id: int) -> List[str]:
     return [r[0] for r in rows]
 
 
-def user_has_role(user_id: int, role: str) -> bool:
+def user_has_role(user_id: int, role: str, conn: Optional[Connection] = None) -> bool:
     """確認使用者是否具備指定角色"""
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -102,6 +108,23 @@ def user_has_role(user_id: int, role: str) -> bool:
     return row is not None
 
 
+def users_with_role(
+    user_ids: List[int], role: str, conn: Optional[Connection] = None
+) -> List[int]:
+    """user_ids 中具備指定角色的使用者（一次查完）"""
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT user_id
+                FROM USER_ROLE
+                WHERE user_id = ANY(%s) AND role = %s;
+                """,
+                (list(user_ids), role),
+            )
+            return [r[0] for r in cur.fetchall()]
+
+
 def normalize_role(role: str) -> str:
     """將輸入的角色轉成標準格式（首字大寫）"""
     if not role:
@@ -110,41 +133,162 @@ def normalize_role(role: str) -> str:
     return role_std
 
 
-def list_users_with_roles() -> List[Dict]:
+# admin 瀏覽使用者可用的排序欄位（{t} 為資料表別名）；同值時再以 user_id 排序
+USER_SORT_COLUMNS = {
+    "user_id": "{t}.user_id",
+    "user_name": "{t}.user_name",
+    "email": "COALESCE({t}.email, '')",
+}
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _users_filters(role: Optional[str], prefix: Optional[str]) -> Tuple[List[str], List]:
     """
-    列出所有使用者與角色（demo 用）
+    role：具該角色者；prefix：user_name 或 email 以此開頭（不分大小寫），
+    兩者都能走索引（USER_ROLE (role, user_id) 與 lower(...) text_pattern_ops）
+    """
+    conditions: List[str] = []
+    params: List = []
+    if role:
+        conditions.append(
+            """EXISTS (
+                SELECT 1 FROM USER_ROLE f
+                WHERE f.user_id = u.user_id AND f.role = %s
+            )"""
+        )
+        params.append(role)
+    if prefix:
+        pattern = _escape_like(prefix.lower()) + "%"
+        conditions.append("(lower(u.user_name) LIKE %s OR lower(u.email) LIKE %s)")
+        params.extend([pattern, pattern])
+    return conditions, params
+
+
+def _users_query(
+    after_id: Optional[int],
+    limit: Optional[int],
+    role: Optional[str] = None,
+    prefix: Optional[str] = None,
+    sort: str = "user_id",
+    descending: bool = False,
+) -> Tuple[str, List]:
     """
+    依 (排序欄位, user_id) 做 keyset 分頁：after_id 為上一頁最後一筆的 user_id。
+    先取出這一頁的使用者，再逐一彙整角色，不必對整張 USER_ROLE 做 array_agg
+    """
+    if sort not in USER_SORT_COLUMNS:
+        raise ValueError(f"不支援的排序欄位: {sort}")
+    column = USER_SORT_COLUMNS[sort]
+    direction, op = ("DESC", "<") if descending else ("ASC", ">")
+
+    conditions, params = _users_filters(role, prefix)
+    if after_id is not None:
+        if sort == "user_id":
+            conditions.append(f"u.user_id {op} %s")
+        else:
+            conditions.append(
+                f"""({column.format(t="u")}, u.user_id) {op} (
+                    SELECT {column.format(t="a")}, a.user_id
+                    FROM "USER" a WHERE a.user_id = %s
+                )"""
+            )
+        params.append(after_id)
+
     sql = """
         SELECT u.user_id, u.user_name, u.email,
-               COALESCE(array_agg(r.role ORDER BY r.role), '{}') AS roles
+               COALESCE(
+                   (SELECT array_agg(r.role ORDER BY r.role)
+                    FROM USER_ROLE r
+                    WHERE r.user_id = u.user_id),
+                   '{}'
+               ) AS roles
         FROM "USER" u
-        LEFT JOIN USER_ROLE r ON r.user_id = u.user_id
-        GROUP BY u.user_id, u.user_name, u.email
-        ORDER BY u.user_id;
     """
-    with get_conn() as conn:
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    order = f"{column.format(t='u')} {direction}"
+    if sort != "user_id":
+        order += f", u.user_id {direction}"
+    sql += f"""
+        ORDER BY {order}
+        LIMIT %s;
+    """
+    params.append(limit)
+    return sql, params
+
+
+def _user_row(row) -> Dict:
+    user_id, user_name, email, roles = row
+    return {
+        "user_id": user_id,
+        "user_name": user_name,
+        "email": email,
+        "roles": list(roles) if roles else [],
+    }
+
+
+def list_users_with_roles(
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    role: Optional[str] = None,
+    prefix: Optional[str] = None,
+    sort: str = "user_id",
+    descending: bool = False,
+    conn: Optional[Connection] = None,
+) -> List[Dict]:
+    """
+    列出使用者與角色（demo 用），過濾、排序與分頁都在 SQL 內完成：
+      - role: 只列出具該角色者；prefix: 名稱或 email 前綴
+      - sort / descending: 排序欄位（user_id / user_name / email）與方向
+      - after_id / limit: keyset 分頁（下一頁傳入上一頁最後一筆的 user_id），limit=None 表示全部
+    """
+    sql, params = _users_query(after_id, limit, role, prefix, sort, descending)
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
-            cur.execute(sql)
+            cur.execute(sql, params)
             rows = cur.fetchall()
-    result: List[Dict] = []
-    for row in rows:
-        user_id, user_name, email, roles = row
-        result.append(
-            {
-                "user_id": user_id,
-                "user_name": user_name,
-                "email": email,
-                "roles": list(roles) if roles else [],
-            }
-        )
-    return result
+    return [_user_row(row) for row in rows]
+
+
+def stream_users_with_roles(
+    after_id: Optional[int] = None,
+    role: Optional[str] = None,
+    prefix: Optional[str] = None,
+    sort: str = "user_id",
+    descending: bool = False,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    conn: Optional[Connection] = None,
+) -> Iterator[List[Dict]]:
+    """同 list_users_with_roles，但以 server-side cursor 每次產出一批"""
+    sql, params = _users_query(after_id, None, role, prefix, sort, descending)
+    for rows in stream_rows(sql, params, chunk_size, conn=conn):
+        yield [_user_row(row) for row in rows]
+
+
+def count_users(
+    role: Optional[str] = None,
+    prefix: Optional[str] = None,
+    conn: Optional[Connection] = None,
+) -> int:
+    """符合條件的使用者總數（分頁時顯示「共幾筆」用）"""
+    conditions, params = _users_filters(role, prefix)
+    sql = 'SELECT COUNT(*) FROM "USER" u'
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchone()[0]
 
 
-def add_role(target_user_id: int, role: str) -> None:
+def add_role(target_user_id: int, role: str, conn: Optional[Connection] = None) -> None:
     role = normalize_role(role)
     if role not in ALLOWED_ROLES:
         raise ValueError(f"無效的角色: {role}")
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -156,9 +300,9 @@ def add_role(target_user_id: int, role: str) -> None:
             )
 
 
-def remove_role(target_user_id: int, role: str) -> None:
+def remove_role(target_user_id: int, role: str, conn: Optional[Connection] = None) -> None:
     role = normalize_role(role)
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 "DELETE FROM USER_ROLE WHERE user_id = %s AND role = %s;",
@@ -172,6 +316,7 @@ def update_user_profile(
     email: Optional[str] = None,
     phone: Optional[int] = None,
     password: Optional[str] = None,
+    conn: Optional[Connection] = None,
 ) -> None:
     """更新使用者基本資料（提供哪些欄位就更新哪些）"""
     fields = []
@@ -192,12 +337,12 @@ def update_user_profile(
         return
     params.append(user_id)
     sql = f'UPDATE "USER" SET {", ".join(fields)} WHERE user_id = %s;'
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params)
 
 
-def mark_finished_events() -> int:
+def mark_finished_events(conn: Optional[Connection] = None) -> int:
     """
     將已經結束的活動標記為 Finished
     規則：日期在今天之前，或今天且 end_hour <= 當前小時
@@ -206,7 +351,7 @@ def mark_finished_events() -> int:
     now = datetime.now()
     today = now.date()
     current_hour = now.hour
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -223,34 +368,76 @@ def mark_finished_events() -> int:
             return cur.rowcount
 
 
-def get_event_participants(event_id: int) -> List[Dict]:
-    """列出某任務的參與/候補狀況"""
+def _participants_query(
+    event_id: int, after_id: Optional[int], limit: Optional[int]
+) -> Tuple[str, List]:
+    """依 (join_time, user_id) 排序；after_id 為上一頁最後一位的 user_id"""
     sql = """
         SELECT p.user_id, u.user_name, u.email, u.phone, p.role, p.status, p.join_time
         FROM PARTICIPATION p
         JOIN "USER" u ON u.user_id = p.user_id
         WHERE p.event_id = %s
-        ORDER BY p.join_time;
     """
-    with get_conn() as conn:
+    params: List = [event_id]
+    if after_id is not None:
+        sql += """
+          AND (p.join_time, p.user_id) > (
+              SELECT a.join_time, a.user_id
+              FROM PARTICIPATION a
+              WHERE a.event_id = %s AND a.user_id = %s
+          )
+        """
+        params.extend([event_id, after_id])
+    sql += """
+        ORDER BY p.join_time, p.user_id
+        LIMIT %s;
+    """
+    params.append(limit)
+    return sql, params
+
+
+def _participant_row(r) -> Dict:
+    return {
+        "user_id": r[0],
+        "user_name": r[1],
+        "email": r[2],
+        "phone": r[3],
+        "role": r[4],
+        "status": r[5],
+        "join_time": r[6],
+    }
+
+
+def get_event_participants(
+    event_id: int,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    conn: Optional[Connection] = None,
+) -> List[Dict]:
+    """列出某任務的參與/候補狀況（after_id / limit 為 keyset 分頁）"""
+    sql, params = _participants_query(event_id, after_id, limit)
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, (event_id,))
+            cur.execute(sql, params)
             rows = cur.fetchall()
-    return [
-        {
-            "user_id": r[0],
-            "user_name": r[1],
-            "email": r[2],
-            "phone": r[3],
-            "role": r[4],
-            "status": r[5],
-            "join_time": r[6],
-        }
-        for r in rows
-    ]
+    return [_participant_row(r) for r in rows]
+
+
+def stream_event_participants(
+    event_id: int,
+    after_id: Optional[int] = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    conn: Optional[Connection] = None,
+) -> Iterator[List[Dict]]:
+    """同 get_event_participants，但以 server-side cursor 每次產出一批"""
+    sql, params = _participants_query(event_id, after_id, None)
+    for rows in stream_rows(sql, params, chunk_size, conn=conn):
+        yield [_participant_row(r) for r in rows]
 
 
-def get_venue_bookings(venue_id: int, on_date: date) -> List[Dict]:
+def get_venue_bookings(
+    venue_id: int, on_date: date, conn: Optional[Connection] = None
+) -> List[Dict]:
     """查詢場地在指定日期的已預約時段"""
     sql = """
         SELECT event_id, title, start_hour, end_hour, status
@@ -258,7 +445,7 @@ def get_venue_bookings(venue_id: int, on_date: date) -> List[Dict]:
         WHERE venue_id = %s AND event_date = %s
         ORDER BY start_hour;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (venue_id, on_date))
             rows = cur.fetchall()
@@ -275,11 +462,17 @@ def get_venue_bookings(venue_id: int, on_date: date) -> List[Dict]:
 
 
 def is_venue_available(
-    venue_id: int, on_date: date, start_hour: int, end_hour: int
+    venue_id: int,
+    on_date: date,
+    start_hour: int,
+    end_hour: int,
+    conn: Optional[Connection] = None,
+    for_update: bool = False,
 ) -> bool:
     """
     檢查場地在指定日期與時段是否可用
     規則：無任何重疊 (existing.start < new_end AND existing.end > new_start)
+    for_update=True 時先鎖住 VENUE，讓「檢查 + 建立任務」在同一個交易內不會被插隊
     """
     sql = """
         SELECT 1
@@ -290,8 +483,13 @@ def is_venue_available(
           AND end_hour   > %s
         LIMIT 1;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
+            if for_update:
+                cur.execute(
+                    "SELECT 1 FROM VENUE WHERE venue_id = %s FOR UPDATE;",
+                    (venue_id,),
+                )
             cur.execute(sql, (venue_id, on_date, end_hour, start_hour))
             row = cur.fetchone()
     return row is None
@@ -299,73 +497,86 @@ def is_venue_available(
 
 # ---------- 3. 查詢任務（簡單版） ----------
 
-def search_tasks(
+# search_tasks 可用的排序方式；relevance 依關鍵字相關度（text_search.rank_sql，同 search_index）
+SEARCH_ORDERS = {
+    "relevance": "rank DESC, e.event_date, e.event_id",
+    "date": "e.event_date, e.event_id",
+    "date_desc": "e.event_date DESC, e.event_id DESC",
+    "slots": "(e.capacity - e.active_count) DESC, e.event_date, e.event_id",
+}
+
+
+def _search_conditions(
     event_date: Optional[date] = None,
     location_keyword: Optional[str] = None,
     skill_keyword: Optional[str] = None,
     title_keyword: Optional[str] = None,
-    only_available: bool = True,
     include_finished: bool = False,
     only_finished: bool = False,
     future_only: bool = False,
     past_only: bool = False,
-) -> List[Dict]:
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    hour_from: Optional[int] = None,
+    hour_to: Optional[int] = None,
+    weekdays: Optional[List[int]] = None,
+) -> Tuple[List[str], List, List[str], List]:
     """
-    依照企劃書需求搜尋任務：
-      - event_date: 指定日期 (None = 不限制)
-      - location_keyword: 地點關鍵字 (venue.name / address, None = 不限制)
-      - skill_keyword: 需要技能關鍵字 (None = 不限制)
-      - only_available: True 時只顯示尚未額滿的任務
-
-    回傳: 每個任務是一個 dict
-    """
-    sql = """
-        SELECT
-            e.event_id,
-            e.title,
-            e.event_date,
-            e.start_hour,
-            e.end_hour,
-            e.status,
-            v.name   AS venue_name,
-            v.address,
-            e.capacity,
-            COALESCE(
-              SUM(CASE WHEN p.status = 'Active' THEN 1 ELSE 0 END),
-              0
-            ) AS active_volunteers
-        FROM TASK_EVENT e
-        JOIN VENUE v
-          ON v.venue_id = e.venue_id
-        LEFT JOIN PARTICIPATION p
-          ON p.event_id = e.event_id
-        LEFT JOIN TASK_REQUIRED_SKILL trs
-          ON trs.event_id = e.event_id
-        LEFT JOIN SKILL s
-          ON s.skill_id = trs.skill_id
-        WHERE 1 = 1
+    search_tasks 除了額滿以外的 WHERE 條件（表別名 e / v）：
+    回傳 (conditions, params, rank_terms, rank_params)
     """
-
     conditions = []
     params: List = []
+    # 相關度 = 標題與地點關鍵字的 rank_sql 加總（標題權重高於描述、場地名稱高於地址），
+    # 和 search_index 的算法相同，不論哪一邊回答順序都一樣
+    rank_terms = []
+    rank_params: List = []
 
     if event_date is not None:
         conditions.append("e.event_date = %s")
         params.append(event_date)
 
     if location_keyword:
-        conditions.append("(v.name ILIKE %s OR v.address ILIKE %s)")
-        kw = f"%{location_keyword}%"
-        params.extend([kw, kw])
+        query = to_tsquery(location_keyword)
+        if query is not None:
+            conditions.append("v.search_tsv @@ %s::tsquery")
+            params.append(query)
+            rank, rank_args = rank_sql("v.name", "v.search_tsv", location_keyword)
+            rank_terms.append(rank)
+            rank_params.extend(rank_args)
+        else:
+            conditions.append("(v.name ILIKE %s OR v.address ILIKE %s)")
+            kw = f"%{location_keyword}%"
+            params.extend([kw, kw])
 
     if skill_keyword:
-        conditions.append("s.skill_name ILIKE %s")
-        params.append(f"%{skill_keyword}%")
+        query = to_tsquery(skill_keyword)
+        if query is not None:
+            skill_match, skill_param = "s.search_tsv @@ %s::tsquery", query
+        else:
+            skill_match, skill_param = "s.skill_name ILIKE %s", f"%{skill_keyword}%"
+        conditions.append(
+            f"""EXISTS (
+                SELECT 1
+                FROM TASK_REQUIRED_SKILL trs
+                JOIN SKILL s ON s.skill_id = trs.skill_id
+                WHERE trs.event_id = e.event_id AND {skill_match}
+            )"""
+        )
+        params.append(skill_param)
 
     if title_keyword:
-        conditions.append("(e.title ILIKE %s OR e.description ILIKE %s)")
-        kw = f"%{title_keyword}%"
-        params.extend([kw, kw])
+        query = to_tsquery(title_keyword)
+        if query is not None:
+            conditions.append("e.search_tsv @@ %s::tsquery")
+            params.append(query)
+            rank, rank_args = rank_sql("e.title", "e.search_tsv", title_keyword)
+            rank_terms.append(rank)
+            rank_params.extend(rank_args)
+        else:
+            conditions.append("(e.title ILIKE %s OR e.description ILIKE %s)")
+            kw = f"%{title_keyword}%"
+            params.extend([kw, kw])
 
     if future_only:
         conditions.append("e.event_date >= %s")
@@ -374,22 +585,164 @@ def search_tasks(
         conditions.append("e.event_date < %s")
         params.append(date.today())
 
+    # 日期區間與時段：走 (event_date, start_hour) 複合索引，一次查完整週/整月
+    if date_from is not None:
+        conditions.append("e.event_date >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("e.event_date <= %s")
+        params.append(date_to)
+    if hour_from is not None:
+        conditions.append("e.start_hour >= %s")
+        params.append(hour_from)
+    if hour_to is not None:
+        conditions.append("e.end_hour <= %s")
+        params.append(hour_to)
+    if weekdays:
+        conditions.append("EXTRACT(ISODOW FROM e.event_date)::int = ANY(%s)")
+        params.append(list(weekdays))
+
     if only_finished:
         conditions.append("e.status = 'Finished'")
     elif not include_finished:
         conditions.append("e.status <> 'Finished'")
 
+    return conditions, params, rank_terms, rank_params
+
+
+def build_search_query(
+    event_date: Optional[date] = None,
+    location_keyword: Optional[str] = None,
+    skill_keyword: Optional[str] = None,
+    title_keyword: Optional[str] = None,
+    only_available: bool = True,
+    include_finished: bool = False,
+    only_finished: bool = False,
+    future_only: bool = False,
+    past_only: bool = False,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    hour_from: Optional[int] = None,
+    hour_to: Optional[int] = None,
+    weekdays: Optional[List[int]] = None,
+    order: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Tuple[str, List]:
+    """組出 search_tasks 的 SQL 與參數（參數說明見 search_tasks）"""
+    if order is None:
+        has_keyword = title_keyword or location_keyword or skill_keyword
+        order = "relevance" if has_keyword else "date"
+    if order not in SEARCH_ORDERS:
+        raise ValueError(f"不支援的排序方式: {order}")
+
+    conditions, params, rank_terms, rank_params = _search_conditions(
+        event_date=event_date,
+        location_keyword=location_keyword,
+        skill_keyword=skill_keyword,
+        title_keyword=title_keyword,
+        include_finished=include_finished,
+        only_finished=only_finished,
+        future_only=future_only,
+        past_only=past_only,
+        date_from=date_from,
+        date_to=date_to,
+        hour_from=hour_from,
+        hour_to=hour_to,
+        weekdays=weekdays,
+    )
+    if only_available:
+        conditions.append("e.active_count < e.capacity")
+
+    rank_sql = " + ".join(rank_terms) if rank_terms else "0"
+    sql = f"""
+        SELECT
+            e.event_id,
+            e.title,
+            e.event_date,
+            e.start_hour,
+            e.end_hour,
+            e.status,
+            v.name   AS venue_name,
+            v.address,
+            e.capacity,
+            e.active_count,
+            {rank_sql} AS rank
+        FROM TASK_EVENT e
+        JOIN VENUE v
+          ON v.venue_id = e.venue_id
+        WHERE 1 = 1
+    """
     if conditions:
         sql += " AND " + " AND ".join(conditions)
-
-    sql += """
-        GROUP BY
-            e.event_id, e.title, e.event_date, e.start_hour, e.end_hour, e.status,
-            v.name, v.address, e.capacity
-        ORDER BY e.event_date, e.event_id;
+    sql += f"""
+        ORDER BY {SEARCH_ORDERS[order]}
+        LIMIT %s OFFSET %s;
     """
+    return sql, rank_params + params + [limit, offset]
+
 
-    with get_conn() as conn:
+def search_tasks(
+    event_date: Optional[date] = None,
+    location_keyword: Optional[str] = None,
+    skill_keyword: Optional[str] = None,
+    title_keyword: Optional[str] = None,
+    only_available: bool = True,
+    include_finished: bool = False,
+    only_finished: bool = False,
+    future_only: bool = False,
+    past_only: bool = False,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    hour_from: Optional[int] = None,
+    hour_to: Optional[int] = None,
+    weekdays: Optional[List[int]] = None,
+    order: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    conn: Optional[Connection] = None,
+) -> List[Dict]:
+    """
+    依照企劃書需求搜尋任務：
+      - event_date: 指定日期 (None = 不限制)
+      - location_keyword: 地點關鍵字 (venue.name / address, None = 不限制)
+      - skill_keyword: 需要技能關鍵字 (None = 不限制)
+      - title_keyword: 標題/描述關鍵字 (None = 不限制)
+      - only_available: True 時只顯示尚未額滿的任務
+      - date_from / date_to: 日期區間（含頭尾，None = 不限制）
+      - hour_from / hour_to: 時段，任務需在 hour_from 點之後開始、hour_to 點之前結束
+      - weekdays: 星期幾（ISO：1 = 週一 … 7 = 週日）
+      - order: 排序（relevance / date / date_desc / slots），
+        None 時有關鍵字就依相關度、否則依日期；limit / offset 分頁
+
+    關鍵字以 text_search 切詞後比對 search_tsv（GIN 索引），中文以單字/雙字切詞，
+    切不出詞（例如只有符號）時退回 ILIKE。
+    每個任務只出現一列：技能條件用 EXISTS，不會被 JOIN 成「報名人數 × 技能數」列；
+    報名人數直接讀 TASK_EVENT.active_count（由 join_task / cancel_participation 維護），
+    額滿過濾、排序與分頁都在 SQL 內完成
+    回傳: 每個任務是一個 dict
+    """
+    sql, params = build_search_query(
+        event_date=event_date,
+        location_keyword=location_keyword,
+        skill_keyword=skill_keyword,
+        title_keyword=title_keyword,
+        only_available=only_available,
+        include_finished=include_finished,
+        only_finished=only_finished,
+        future_only=future_only,
+        past_only=past_only,
+        date_from=date_from,
+        date_to=date_to,
+        hour_from=hour_from,
+        hour_to=hour_to,
+        weekdays=weekdays,
+        order=order,
+        limit=limit,
+        offset=offset,
+    )
+
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params)
             rows = cur.fetchall()
@@ -407,15 +760,9 @@ def search_tasks(
             address,
             capacity,
             active_vols,
+            _rank,
         ) = row
 
-        active_vols = active_vols or 0
-        slots_left = capacity - active_vols
-
-        # 如果只看「尚未額滿」的任務，且已滿 → skip
-        if only_available and slots_left <= 0:
-            continue
-
         results.append(
             {
                 "event_id": event_id,
@@ -428,14 +775,122 @@ def search_tasks(
                 "address": address,
                 "capacity": capacity,
                 "active_volunteers": active_vols,
-                "slots_left": slots_left,
+                "slots_left": capacity - active_vols,
             }
         )
 
     return results
 
 
-def get_user_history(user_id: int) -> List[Dict]:
+# GROUPING(venue_id, event_date, skill_id, available) 的值 -> facet 名稱
+# （該組沒被 GROUP BY 的欄位對應的 bit 為 1）
+_FACET_GROUPS = {0b0111: "venue", 0b1011: "date", 0b1101: "skill", 0b1110: "availability"}
+
+
+def search_facets(
+    event_date: Optional[date] = None,
+    location_keyword: Optional[str] = None,
+    skill_keyword: Optional[str] = None,
+    title_keyword: Optional[str] = None,
+    only_available: bool = True,
+    include_finished: bool = False,
+    only_finished: bool = False,
+    future_only: bool = False,
+    past_only: bool = False,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    hour_from: Optional[int] = None,
+    hour_to: Optional[int] = None,
+    weekdays: Optional[List[int]] = None,
+    conn: Optional[Connection] = None,
+) -> Dict:
+    """
+    search_tasks 結果的分類統計（條件同 search_tasks，不分頁），一條 GROUPING SETS 查詢算完：
+      - venue / date / skill: 各場地、日期、需求技能的任務數（已套用 only_available）
+      - availability: 未額滿 / 額滿的任務數（不套用 only_available，方便切換）
+    """
+    conditions, params, _, _ = _search_conditions(
+        event_date=event_date,
+        location_keyword=location_keyword,
+        skill_keyword=skill_keyword,
+        title_keyword=title_keyword,
+        include_finished=include_finished,
+        only_finished=only_finished,
+        future_only=future_only,
+        past_only=past_only,
+        date_from=date_from,
+        date_to=date_to,
+        hour_from=hour_from,
+        hour_to=hour_to,
+        weekdays=weekdays,
+    )
+    where = " AND ".join(conditions) if conditions else "TRUE"
+    sql = f"""
+        WITH matched AS (
+            SELECT
+                e.event_id,
+                e.event_date,
+                e.venue_id,
+                v.name AS venue_name,
+                e.active_count < e.capacity AS available
+            FROM TASK_EVENT e
+            JOIN VENUE v
+              ON v.venue_id = e.venue_id
+            WHERE {where}
+        )
+        SELECT
+            GROUPING(m.venue_id, m.event_date, s.skill_id, m.available) AS grp,
+            m.venue_id,
+            m.venue_name,
+            m.event_date,
+            s.skill_id,
+            s.skill_name,
+            m.available,
+            COUNT(DISTINCT m.event_id) AS total,
+            COUNT(DISTINCT m.event_id) FILTER (WHERE m.available OR NOT %s) AS shown
+        FROM matched m
+        LEFT JOIN TASK_REQUIRED_SKILL trs
+          ON trs.event_id = m.event_id
+        LEFT JOIN SKILL s
+          ON s.skill_id = trs.skill_id
+        GROUP BY GROUPING SETS (
+            (m.venue_id, m.venue_name),
+            (m.event_date),
+            (s.skill_id, s.skill_name),
+            (m.available)
+        );
+    """
+
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params + [only_available])
+            rows = cur.fetchall()
+
+    facets: Dict = {"venue": [], "date": [], "skill": [], "availability": {"available": 0, "full": 0}}
+    for grp, venue_id, venue_name, ev_date, skill_id, skill_name, available, total, shown in rows:
+        facet = _FACET_GROUPS.get(grp)
+        if facet == "availability":
+            facets["availability"]["available" if available else "full"] = total
+        elif not shown:
+            continue
+        elif facet == "venue":
+            facets["venue"].append({"venue_id": venue_id, "name": venue_name, "count": shown})
+        elif facet == "date":
+            facets["date"].append({"date": ev_date, "count": shown})
+        elif facet == "skill" and skill_id is not None:
+            facets["skill"].append({"skill_id": skill_id, "name": skill_name, "count": shown})
+    return sort_facets(facets)
+
+
+def sort_facets(facets: Dict) -> Dict:
+    """場地/技能依任務數多到少（同數依名稱），日期依先後"""
+    facets["venue"].sort(key=lambda f: (-f["count"], f["name"], f["venue_id"]))
+    facets["skill"].sort(key=lambda f: (-f["count"], f["name"], f["skill_id"]))
+    facets["date"].sort(key=lambda f: f["date"])
+    return facets
+
+
+def get_user_history(user_id: int, conn: Optional[Connection] = None) -> List[Dict]:
     """
     依企劃書：查詢某位志工所有參與過的任務
     （包含 Active / Cancelled）
@@ -459,7 +914,7 @@ def get_user_history(user_id: int) -> List[Dict]:
         ORDER BY e.event_date DESC, p.join_time DESC;
     """
 
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (user_id,))
             rows = cur.fetchall()
@@ -493,7 +948,9 @@ def get_user_history(user_id: int) -> List[Dict]:
     return history
 
 
-def get_user_active_participation(user_id: int) -> List[Dict]:
+def get_user_active_participation(
+    user_id: int, conn: Optional[Connection] = None
+) -> List[Dict]:
     """查詢使用者目前已報名且狀態為 Active 的任務"""
     sql = """
         SELECT
@@ -512,7 +969,7 @@ def get_user_active_participation(user_id: int) -> List[Dict]:
           AND p.status = 'Active'
         ORDER BY e.event_date, e.start_hour;
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (user_id,))
             rows = cur.fetchall()
@@ -530,86 +987,333 @@ def get_user_active_participation(user_id: int) -> List[Dict]:
         for r in rows
     ]
 
+
+def recommend_tasks(
+    user_id: int, limit: int = 10, conn: Optional[Connection] = None
+) -> List[Dict]:
+    """
+    依 MATCH_SCORE 推薦任務：尚未開始、未額滿、沒報名過且和已報名任務時段不衝突，
+    分數高的在前（同分依日期、event_id）。
+    回傳格式同 search_tasks，另帶 match_score
+    """
+    now = datetime.now()
+    sql = """
+        SELECT
+            e.event_id,
+            e.title,
+            e.event_date,
+            e.start_hour,
+            e.end_hour,
+            e.status,
+            v.name   AS venue_name,
+            v.address,
+            e.capacity,
+            e.active_count,
+            m.score
+        FROM MATCH_SCORE m
+        JOIN TASK_EVENT e
+          ON e.event_id = m.event_id
+        JOIN VENUE v
+          ON v.venue_id = e.venue_id
+        WHERE m.user_id = %s
+          AND e.status = 'Planned'
+          AND e.event_date >= %s
+          AND e.event_date + e.start_hour * INTERVAL '1 hour' > %s
+          AND e.active_count < e.capacity
+          -- 已報名的任務本身也會和自己重疊，一併排除
+          AND NOT EXISTS (
+              SELECT 1
+              FROM PARTICIPATION p
+              JOIN TASK_EVENT j ON j.event_id = p.event_id
+              WHERE p.user_id = m.user_id
+                AND p.status = 'Active'
+                AND j.event_date = e.event_date
+                AND j.start_hour < e.end_hour
+                AND e.start_hour < j.end_hour
+          )
+        ORDER BY m.score DESC, e.event_date, e.event_id
+        LIMIT %s;
+    """
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (user_id, now.date(), now, limit))
+            rows = cur.fetchall()
+    return [
+        {
+            "event_id": r[0],
+            "title": r[1],
+            "date": r[2],
+            "start_hour": r[3],
+            "end_hour": r[4],
+            "status": r[5],
+            "venue": r[6],
+            "address": r[7],
+            "capacity": r[8],
+            "active_volunteers": r[9],
+            "slots_left": r[8] - r[9],
+            "match_score": float(r[10]),
+        }
+        for r in rows
+    ]
+
 # ---------- 4. 報名任務 (含候補) ----------
 
-def join_task(user_id: int, event_id: int) -> str:
+def join_task(user_id: int, event_id: int, conn: Optional[Connection] = None) -> str:
     """
     報名任務：
-      - 若名額未滿 -> 寫入 PARTICIPATION.status='Active'
-      - 若名額已滿 -> 寫入 WAITLIST，position=最大+1
+      - 若名額未滿 -> 寫入 PARTICIPATION.status='Active'，TASK_EVENT.active_count + 1
+      - 若名額已滿 -> 寫入 WAITLIST（seq 遞增，排在最後），TASK_EVENT.waitlist_count + 1
+    人數直接看 TASK_EVENT 的計數欄位，不再 COUNT(*)：有名額時一個 UPDATE 就佔到位子並鎖住任務。
+    已經是 Active 的人再報名不會重複計算；已在候補的人有名額時直接報名並移出候補，
+    沒名額時保留原本的順位
     回傳字串：'joined' 或 'waitlisted'
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
-            # 鎖住該 event，避免並發超額
+            now = datetime.now()
+            # 有名額就直接佔一個位子（同時鎖住該 event，避免並發超額）
             cur.execute(
-                "SELECT capacity FROM TASK_EVENT WHERE event_id = %s FOR UPDATE;",
+                """
+                UPDATE TASK_EVENT
+                SET active_count = active_count + 1
+                WHERE event_id = %s AND active_count < capacity
+                RETURNING event_id;
+                """,
+                (event_id,),
+            )
+            if cur.fetchone() is None:
+                # 額滿或任務不存在：鎖住後再確認一次（UPDATE 之後可能剛好有人取消）
+                cur.execute(
+                    """
+                    SELECT active_count < capacity, waitlist_count
+                    FROM TASK_EVENT
+                    WHERE event_id = %s
+                    FOR UPDATE;
+                    """,
+                    (event_id,),
+                )
+                row = cur.fetchone()
+                if row is None:
+                    raise ValueError(f"event_id {event_id} not found")
+                has_seat, waitlist_count = row
+                if not has_seat:
+                    return _join_waitlist(cur, user_id, event_id, now)
+                cur.execute(
+                    "UPDATE TASK_EVENT SET active_count = active_count + 1 WHERE event_id = %s;",
+                    (event_id,),
+                )
+
+            cur.execute(
+                """
+                INSERT INTO PARTICIPATION (user_id, event_id, join_time, role, status)
+                VALUES (%s, %s, %s, 'Volunteer', 'Active')
+                ON CONFLICT (user_id, event_id)
+                DO UPDATE SET status = 'Active', join_time = EXCLUDED.join_time
+                WHERE PARTICIPATION.status <> 'Active'
+                RETURNING user_id;
+                """,
+                (user_id, event_id, now),
+            )
+            if cur.fetchone() is None:
+                # 本來就是 Active：把剛佔的位子還回去
+                cur.execute(
+                    "UPDATE TASK_EVENT SET active_count = active_count - 1 WHERE event_id = %s;",
+                    (event_id,),
+                )
+            else:
+                _leave_waitlist(cur, user_id, event_id)
+            return "joined"
+
+
+def _leave_waitlist(cur, user_id: int, event_id: int) -> bool:
+    """把已報名成功的人從候補移除並更新 waitlist_count（呼叫端已鎖住該 event）"""
+    cur.execute(
+        """
+        DELETE FROM WAITLIST
+        WHERE user_id = %s AND event_id = %s
+        RETURNING user_id;
+        """,
+        (user_id, event_id),
+    )
+    if cur.fetchone() is None:
+        return False
+    cur.execute(
+        "UPDATE TASK_EVENT SET waitlist_count = waitlist_count - 1 WHERE event_id = %s;",
+        (event_id,),
+    )
+    return True
+
+
+def _join_waitlist(cur, user_id: int, event_id: int, now: datetime) -> str:
+    """額滿時加入候補（呼叫端已鎖住該 event）；seq 由序列產生，順位在讀取時才算"""
+    cur.execute(
+        """
+        SELECT 1
+        FROM PARTICIPATION
+        WHERE user_id = %s AND event_id = %s AND status = 'Active';
+        """,
+        (user_id, event_id),
+    )
+    if cur.fetchone() is not None:
+        # 已經報名成功的人不用排候補
+        return "joined"
+    cur.execute(
+        """
+        INSERT INTO WAITLIST (user_id, event_id, created_at)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (user_id, event_id) DO NOTHING
+        RETURNING user_id;
+        """,
+        (user_id, event_id, now),
+    )
+    if cur.fetchone() is not None:
+        cur.execute(
+            "UPDATE TASK_EVENT SET waitlist_count = waitlist_count + 1 WHERE event_id = %s;",
+            (event_id,),
+        )
+    return "waitlisted"
+
+
+def get_waitlist_position(
+    user_id: int, event_id: int, conn: Optional[Connection] = None
+) -> Dict:
+    """
+    查詢候補順位：排在自己前面（seq 較小）的人數 + 1，只掃 (event_id, seq) 索引的前段。
+    回傳 {"position": 順位（沒在候補為 None）, "waitlist": 該任務候補總人數}
+    """
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT
+                    e.waitlist_count,
+                    (SELECT COUNT(*)
+                     FROM WAITLIST w
+                     WHERE w.event_id = me.event_id AND w.seq <= me.seq) AS position
+                FROM TASK_EVENT e
+                LEFT JOIN WAITLIST me
+                  ON me.event_id = e.event_id AND me.user_id = %s
+                WHERE e.event_id = %s;
+                """,
+                (user_id, event_id),
+            )
+            row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"event_id {event_id} not found")
+    waitlist_count, position = row
+    return {"position": position or None, "waitlist": waitlist_count}
+
+
+def join_task_batch(
+    event_id: int, user_ids: List[int], conn: Optional[Connection] = None
+) -> List[str]:
+    """
+    同一個任務的多筆報名一次處理：鎖一次任務，依 user_ids 的順序分配剩餘名額，
+    沒分到的依序排入候補；PARTICIPATION / WAITLIST 各用一條多列 INSERT 寫入。
+    每個人的結果和依序逐筆呼叫 join_task 相同：已報名的人不變；已在候補的人輪到時有名額
+    就報名並移出候補，沒名額則保留原本的順位。回傳和 user_ids 對齊的 'joined' / 'waitlisted'
+    """
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT capacity - active_count
+                FROM TASK_EVENT
+                WHERE event_id = %s
+                FOR UPDATE;
+                """,
                 (event_id,),
             )
             row = cur.fetchone()
             if row is None:
                 raise ValueError(f"event_id {event_id} not found")
-            capacity = row[0]
+            seats = row[0]
 
             cur.execute(
                 """
-                SELECT COUNT(*)
+                SELECT user_id, 'waitlisted'
+                FROM WAITLIST
+                WHERE event_id = %(event_id)s AND user_id = ANY(%(users)s)
+                UNION ALL
+                SELECT user_id, 'joined'
                 FROM PARTICIPATION
-                WHERE event_id = %s AND status = 'Active';
+                WHERE event_id = %(event_id)s AND user_id = ANY(%(users)s) AND status = 'Active';
                 """,
-                (event_id,),
+                {"event_id": event_id, "users": list(user_ids)},
             )
-            active_count = cur.fetchone()[0]
+            # 同一人兩種紀錄都有時以後面的 'joined' 為準
+            outcome: Dict[int, str] = dict(cur.fetchall())
+            joined: List[int] = []
+            waitlisted: List[int] = []
+            from_waitlist: List[int] = []  # 原本在候補、這次分到名額的人
+            for user_id in user_ids:
+                if outcome.get(user_id) == "joined" or (user_id in outcome and seats <= 0):
+                    continue
+                if seats > 0:
+                    seats -= 1
+                    if user_id in outcome:
+                        from_waitlist.append(user_id)
+                    outcome[user_id] = "joined"
+                    joined.append(user_id)
+                else:
+                    outcome[user_id] = "waitlisted"
+                    waitlisted.append(user_id)
 
             now = datetime.now()
-
-            if active_count < capacity:
-                # 直接加入 PARTICIPATION
+            if joined:
                 cur.execute(
                     """
                     INSERT INTO PARTICIPATION (user_id, event_id, join_time, role, status)
-                    VALUES (%s, %s, %s, 'Volunteer', 'Active')
+                    SELECT u, %s, %s, 'Volunteer', 'Active'
+                    FROM unnest(%s::bigint[]) AS u
                     ON CONFLICT (user_id, event_id)
                     DO UPDATE SET status = 'Active', join_time = EXCLUDED.join_time;
                     """,
-                    (user_id, event_id, now),
+                    (event_id, now, joined),
                 )
-                return "joined"
-            else:
-                # 加入 WAITLIST
+            if from_waitlist:
+                cur.execute(
+                    "DELETE FROM WAITLIST WHERE event_id = %s AND user_id = ANY(%s);",
+                    (event_id, from_waitlist),
+                )
+            if waitlisted:
+                # 依陣列順序取 seq，候補順位和報名順序一致
                 cur.execute(
                     """
-                    SELECT COALESCE(MAX(position), 0) + 1
-                    FROM WAITLIST
-                    WHERE event_id = %s;
+                    INSERT INTO WAITLIST (user_id, event_id, created_at)
+                    SELECT a.u, %s, %s
+                    FROM unnest(%s::bigint[]) WITH ORDINALITY AS a(u, ord)
+                    ORDER BY a.ord;
                     """,
-                    (event_id,),
+                    (event_id, now, waitlisted),
                 )
-                pos = cur.fetchone()[0]
-
+            if joined or waitlisted:
                 cur.execute(
                     """
-                    INSERT INTO WAITLIST (user_id, event_id, position, created_at)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (user_id, event_id)
-                    DO UPDATE SET position = EXCLUDED.position;
+                    UPDATE TASK_EVENT
+                    SET active_count = active_count + %s,
+                        waitlist_count = waitlist_count + %s
+                    WHERE event_id = %s;
                     """,
-                    (user_id, event_id, pos, now),
+                    (len(joined), len(waitlisted) - len(from_waitlist), event_id),
                 )
-                return "waitlisted"
+    return [outcome[user_id] for user_id in user_ids]
 
 
 # ---------- 5. 取消報名 (含自動遞補) ----------
 
-def cancel_participation(user_id: int, event_id: int) -> bool:
+def cancel_participation(
+    user_id: int, event_id: int, conn: Optional[Connection] = None
+) -> bool:
     """
     志工取消報名：
-      1. 將 PARTICIPATION.status 改為 'Cancelled'
-      2. 從 WAITLIST 中找 position 最小的志工遞補
-      3. 遞補成功後，刪掉他的 WAITLIST 記錄，並把其餘 position 往前移一格
-    回傳 True = 有這筆報名且流程完成；False = 原本就沒有報名紀錄
+      1. 還在候補的人直接移出候補
+      2. 將 PARTICIPATION.status 改為 'Cancelled'
+      3. 取出 WAITLIST 中 seq 最小、且還沒報名成功的志工遞補（只刪他那一筆，其餘候補不用改寫）
+      4. 更新 TASK_EVENT 的 active_count / waitlist_count
+    回傳 True = 有這筆報名或候補且流程完成；False = 原本就沒有報名也沒有候補
     """
-    with get_conn() as conn:
+    with use_conn(conn) as conn:
         with conn.cursor() as cur:
             # 1. 鎖住該 event，避免並發遞補混亂
             cur.execute(
@@ -619,7 +1323,10 @@ def cancel_participation(user_id: int, event_id: int) -> bool:
             if cur.fetchone() is None:
                 return False
 
-            # 2. 確認是否有報名紀錄
+            # 2. 在候補中的人移出候補（和 cancel_participation_batch 的 left_waitlist 相同）
+            left = _leave_waitlist(cur, user_id, event_id)
+
+            # 3. 確認是否有報名紀錄
             cur.execute(
                 """
                 SELECT status
@@ -630,15 +1337,15 @@ def cancel_participation(user_id: int, event_id: int) -> bool:
             )
             row = cur.fetchone()
             if row is None:
-                # 原本就沒報名
-                return False
+                # 原本就沒報名；只在候補的人移出候補即算完成
+                return left
 
             current_status = row[0]
             if current_status == "Cancelled":
                 # 已經取消過了，當作成功
                 return True
 
-            # 3. 將這位志工標記為 Cancelled
+            # 4. 將這位志工標記為 Cancelled
             cur.execute(
                 """
                 UPDATE PARTICIPATION
@@ -648,25 +1355,43 @@ def cancel_participation(user_id: int, event_id: int) -> bool:
                 (user_id, event_id),
             )
 
-            # 4. 從 WAITLIST 中找此 event 的第一順位
+            # 5. 取出此 event 的第一順位並刪除他的 WAITLIST 記錄（走 (event_id, seq) 索引）；
+            #    已經是 Active 的候補紀錄不算，否則會佔掉這次遞補卻沒有人補上
             cur.execute(
                 """
-                SELECT user_id
-                FROM WAITLIST
-                WHERE event_id = %s
-                ORDER BY position
-                LIMIT 1;
+                DELETE FROM WAITLIST
+                WHERE (user_id, event_id) = (
+                    SELECT w.user_id, w.event_id
+                    FROM WAITLIST w
+                    WHERE w.event_id = %s
+                      AND NOT EXISTS (
+                          SELECT 1 FROM PARTICIPATION p
+                          WHERE p.user_id = w.user_id AND p.event_id = w.event_id
+                            AND p.status = 'Active'
+                      )
+                    ORDER BY w.seq
+                    LIMIT 1
+                )
+                RETURNING user_id;
                 """,
                 (event_id,),
             )
             wl_row = cur.fetchone()
             if wl_row is None:
-                # 沒有人在候補，結束
+                # 沒有人在候補，空出一個名額
+                cur.execute(
+                    """
+                    UPDATE TASK_EVENT
+                    SET active_count = active_count - 1
+                    WHERE event_id = %s;
+                    """,
+                    (event_id,),
+                )
                 return True
 
             next_user_id = wl_row[0]
 
-            # 5. 將候補者加入 / 啟用 PARTICIPATION
+            # 6. 將候補者加入 / 啟用 PARTICIPATION
             cur.execute(
                 """
                 INSERT INTO PARTICIPATION (user_id, event_id, join_time, role, status)
@@ -680,24 +1405,158 @@ def cancel_participation(user_id: int, event_id: int) -> bool:
                 (next_user_id, event_id),
             )
 
-            # 6. 刪除他的 WAITLIST 記錄
+            # 7. 名額由候補者遞補，Active 人數不變、候補少一人
             cur.execute(
                 """
-                DELETE FROM WAITLIST
-                WHERE user_id = %s AND event_id = %s;
+                UPDATE TASK_EVENT
+                SET waitlist_count = waitlist_count - 1
+                WHERE event_id = %s;
                 """,
-                (next_user_id, event_id),
+                (event_id,),
+            )
+
+    return True
+
+
+def cancel_participation_batch(
+    event_id: int, user_ids: List[int], conn: Optional[Connection] = None
+) -> Dict:
+    """
+    同一個任務的多筆取消一次處理：鎖一次任務，一條 UPDATE 取消所有 Active 的報名，
+    在候補中的人直接移出候補，再依 seq 一次遞補和取消人數相同的候補者。
+    回傳 {"results": 和 user_ids 對齊的結果, "promoted": 遞補成功的 user_id（依順位）}
+    結果：'cancelled' / 'already_cancelled' / 'left_waitlist' / 'not_joined'
+    """
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT event_id FROM TASK_EVENT WHERE event_id = %s FOR UPDATE;",
+                (event_id,),
             )
+            if cur.fetchone() is None:
+                raise ValueError(f"event_id {event_id} not found")
 
-            # 7. 其餘候補順位往前移一格
             cur.execute(
                 """
-                UPDATE WAITLIST
-                SET position = position - 1
-                WHERE event_id = %s
-                  AND position > 1;
+                UPDATE PARTICIPATION p
+                SET status = 'Cancelled'
+                FROM PARTICIPATION old
+                WHERE p.event_id = %(event_id)s AND p.user_id = ANY(%(users)s)
+                  AND old.event_id = p.event_id AND old.user_id = p.user_id
+                RETURNING p.user_id, old.status;
                 """,
-                (event_id,),
+                {"event_id": event_id, "users": list(user_ids)},
             )
+            outcome: Dict[int, str] = {
+                user_id: "cancelled" if status == "Active" else "already_cancelled"
+                for user_id, status in cur.fetchall()
+            }
+            cancelled = sum(1 for r in outcome.values() if r == "cancelled")
 
-    return True
+            cur.execute(
+                """
+                DELETE FROM WAITLIST
+                WHERE event_id = %s AND user_id = ANY(%s)
+                RETURNING user_id;
+                """,
+                (event_id, list(user_ids)),
+            )
+            left = [r[0] for r in cur.fetchall()]
+            outcome.update(
+                (user_id, "left_waitlist") for user_id in left if outcome.get(user_id) != "cancelled"
+            )
+
+            promoted: List[int] = []
+            if cancelled:
+                # 候補前 cancelled 位（略過已經 Active 的人）一次取出（走 (event_id, seq) 索引）
+                cur.execute(
+                    """
+                    DELETE FROM WAITLIST w
+                    USING (
+                        SELECT w.user_id
+                        FROM WAITLIST w
+                        WHERE w.event_id = %(event_id)s
+                          AND NOT EXISTS (
+                              SELECT 1 FROM PARTICIPATION p
+                              WHERE p.user_id = w.user_id AND p.event_id = w.event_id
+                                AND p.status = 'Active'
+                          )
+                        ORDER BY w.seq
+                        LIMIT %(n)s
+                    ) head
+                    WHERE w.event_id = %(event_id)s AND w.user_id = head.user_id
+                    RETURNING w.user_id, w.seq;
+                    """,
+                    {"event_id": event_id, "n": cancelled},
+                )
+                promoted = [user_id for user_id, _ in sorted(cur.fetchall(), key=lambda r: r[1])]
+            if promoted:
+                cur.execute(
+                    """
+                    INSERT INTO PARTICIPATION (user_id, event_id, join_time, role, status)
+                    SELECT u, %s, NOW(), 'Volunteer', 'Active'
+                    FROM unnest(%s::bigint[]) AS u
+                    ON CONFLICT (user_id, event_id)
+                    DO UPDATE SET
+                        status    = 'Active',
+                        join_time = EXCLUDED.join_time,
+                        role      = 'Volunteer';
+                    """,
+                    (event_id, promoted),
+                )
+            if cancelled or left:
+                cur.execute(
+                    """
+                    UPDATE TASK_EVENT
+                    SET active_count = active_count - %s,
+                        waitlist_count = waitlist_count - %s
+                    WHERE event_id = %s;
+                    """,
+                    (cancelled - len(promoted), len(left) + len(promoted), event_id),
+                )
+    return {
+        "results": [outcome.get(user_id, "not_joined") for user_id in user_ids],
+        "promoted": promoted,
+    }
+
+
+# ---------- 6. 報名/候補人數對帳 ----------
+
+def reconcile_event_counts(
+    event_ids: Optional[List[int]] = None, conn: Optional[Connection] = None
+) -> Dict:
+    """
+    依 PARTICIPATION / WAITLIST 重算 TASK_EVENT 的 active_count / waitlist_count；
+    event_ids 為 None 表示全部任務。先鎖住任務再計算，執行期間的報名/取消會等它完成。
+    回傳 {"events": 人數有誤而修正的 event_id}
+    """
+    event_filter = "" if event_ids is None else "WHERE e.event_id = ANY(%(ids)s)"
+    params = None if event_ids is None else {"ids": list(event_ids)}
+    with use_conn(conn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT e.event_id FROM TASK_EVENT e {event_filter} "
+                "ORDER BY e.event_id FOR UPDATE;",
+                params,
+            )
+            cur.execute(
+                f"""
+                UPDATE TASK_EVENT t
+                SET active_count = c.active_cnt, waitlist_count = c.waitlist_cnt
+                FROM (
+                    SELECT e.event_id,
+                           (SELECT COUNT(*) FROM PARTICIPATION p
+                            WHERE p.event_id = e.event_id AND p.status = 'Active') AS active_cnt,
+                           (SELECT COUNT(*) FROM WAITLIST w
+                            WHERE w.event_id = e.event_id) AS waitlist_cnt
+                    FROM TASK_EVENT e
+                    {event_filter}
+                ) c
+                WHERE t.event_id = c.event_id
+                  AND (t.active_count, t.waitlist_count) IS DISTINCT FROM (c.active_cnt, c.waitlist_cnt)
+                RETURNING t.event_id;
+                """,
+                params,
+            )
+            fixed = sorted(r[0] for r in cur.fetchall())
+    return {"events": fixed}
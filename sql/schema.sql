@@ -13,6 +13,45 @@ DROP TABLE IF EXISTS ORGANIZER_ORG CASCADE;
 DROP TABLE IF EXISTS USER_ROLE CASCADE;
 DROP TABLE IF EXISTS "USER" CASCADE;
 
+-------------------------------------------------
+-- 0. 全文搜尋切詞
+-------------------------------------------------
+-- 中英文混合切詞，規則與 backend/text_search.py 的 tokenize() 一致：
+-- 英數字取整個字，中日韓文字取單字與相鄰兩字（bigram）
+CREATE OR REPLACE FUNCTION cjk_tokens(doc TEXT)
+RETURNS TEXT[]
+LANGUAGE plpgsql
+IMMUTABLE PARALLEL SAFE
+AS $$
+DECLARE
+    run    TEXT;
+    tokens TEXT[] := '{}';
+    n      INT;
+BEGIN
+    FOR run IN
+        SELECT m[1]
+        FROM regexp_matches(
+            lower(COALESCE(doc, '')),
+            '([a-z0-9]+|[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+)',
+            'g'
+        ) AS m
+    LOOP
+        n := char_length(run);
+        IF run ~ '^[a-z0-9]' THEN
+            tokens := tokens || run;
+        ELSE
+            FOR i IN 1..n LOOP
+                tokens := tokens || substr(run, i, 1);
+                IF i < n THEN
+                    tokens := tokens || substr(run, i, 2);
+                END IF;
+            END LOOP;
+        END IF;
+    END LOOP;
+    RETURN tokens;
+END;
+$$;
+
 -------------------------------------------------
 -- 1. USER
 -------------------------------------------------
@@ -72,6 +111,11 @@ CREATE TABLE VENUE (
     name     VARCHAR(50)  NOT NULL,
     address  VARCHAR(200) NOT NULL,
     capacity INT          NOT NULL,
+    -- 關鍵字搜尋用（名稱權重高於地址）
+    search_tsv TSVECTOR GENERATED ALWAYS AS (
+        setweight(array_to_tsvector(cjk_tokens(name)), 'A') ||
+        setweight(array_to_tsvector(cjk_tokens(address)), 'B')
+    ) STORED,
     CONSTRAINT chk_venue_capacity CHECK (capacity > 0)
 );
 
@@ -91,12 +135,21 @@ CREATE TABLE TASK_EVENT (
     status         VARCHAR(10) NOT NULL,
     title          VARCHAR(80),
     description    VARCHAR(300),
+    -- 報名/候補人數：由 join_task / cancel_participation 維護，reconcile_counts.py 可重算
+    active_count   INT    NOT NULL DEFAULT 0,
+    waitlist_count INT    NOT NULL DEFAULT 0,
+    -- 關鍵字搜尋用（標題權重高於描述）
+    search_tsv     TSVECTOR GENERATED ALWAYS AS (
+        setweight(array_to_tsvector(cjk_tokens(title)), 'A') ||
+        setweight(array_to_tsvector(cjk_tokens(description)), 'B')
+    ) STORED,
 
     CONSTRAINT chk_event_capacity       CHECK (capacity > 0),
     CONSTRAINT chk_event_duration_hours CHECK (duration_hours BETWEEN 1 AND 3),
     CONSTRAINT chk_event_hours          CHECK (start_hour BETWEEN 0 AND 23 AND end_hour BETWEEN 1 AND 23 AND end_hour > start_hour),
     CONSTRAINT chk_event_status         CHECK (status IN ('Planned','Ongoing','Finished')),
     CONSTRAINT chk_event_duration_match CHECK (end_hour - start_hour = duration_hours),
+    CONSTRAINT chk_event_counts         CHECK (active_count >= 0 AND waitlist_count >= 0),
 
     CONSTRAINT fk_task_event_owner
         FOREIGN KEY (owner_id)
@@ -161,7 +214,8 @@ CREATE TABLE PARTICIPATION (
 -------------------------------------------------
 CREATE TABLE SKILL (
     skill_id   BIGSERIAL PRIMARY KEY,
-    skill_name VARCHAR(60) NOT NULL UNIQUE
+    skill_name VARCHAR(60) NOT NULL UNIQUE,
+    search_tsv TSVECTOR GENERATED ALWAYS AS (array_to_tsvector(cjk_tokens(skill_name))) STORED
 );
 
 -------------------------------------------------
@@ -234,10 +288,10 @@ CREATE TABLE MATCH_SCORE (
 CREATE TABLE WAITLIST (
     user_id    BIGINT NOT NULL,
     event_id   BIGINT NOT NULL,
-    position   INT    NOT NULL,
+    -- 加入順序（全域遞增、可有空號）；順位 = 同任務 seq 較小的人數 + 1，讀取時才算
+    seq        BIGSERIAL NOT NULL,
     created_at TIMESTAMP NOT NULL,
     PRIMARY KEY (user_id, event_id),
-    CONSTRAINT chk_waitlist_position CHECK (position >= 1),
     CONSTRAINT fk_wait_user
         FOREIGN KEY (user_id)
         REFERENCES "USER"(user_id)
@@ -249,3 +303,23 @@ CREATE TABLE WAITLIST (
         ON DELETE CASCADE
         ON UPDATE CASCADE
 );
+
+-------------------------------------------------
+-- 13. 索引（列表的 keyset 分頁、逐筆計數與 admin 使用者搜尋用）
+-------------------------------------------------
+CREATE INDEX idx_task_event_date ON TASK_EVENT (event_date, event_id);
+-- search_tasks 的日期區間 + 時段條件（date_from/date_to、hour_from/hour_to）
+CREATE INDEX idx_task_event_date_hour ON TASK_EVENT (event_date, start_hour);
+CREATE INDEX idx_participation_event_join ON PARTICIPATION (event_id, join_time, user_id);
+-- 搜尋時逐任務計算 Active 報名人數（index-only scan）
+CREATE INDEX idx_participation_active ON PARTICIPATION (event_id) WHERE status = 'Active';
+CREATE INDEX idx_waitlist_event ON WAITLIST (event_id, seq);
+CREATE INDEX idx_user_role_role ON USER_ROLE (role, user_id);
+CREATE INDEX idx_user_name_prefix ON "USER" (lower(user_name) text_pattern_ops);
+CREATE INDEX idx_user_email_prefix ON "USER" (lower(email) text_pattern_ops);
+-- admin_list_users 依 email 排序的 keyset 分頁（運算式需與 USER_SORT_COLUMNS["email"] 相同）
+CREATE INDEX idx_user_email_sort ON "USER" ((COALESCE(email, '')), user_id);
+-- 關鍵字搜尋（search_tsv @@ tsquery）
+CREATE INDEX idx_task_event_search ON TASK_EVENT USING GIN (search_tsv);
+CREATE INDEX idx_venue_search ON VENUE USING GIN (search_tsv);
+CREATE INDEX idx_skill_search ON SKILL USING GIN (search_tsv);